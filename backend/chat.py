@@ -0,0 +1,174 @@
+import json
+import random
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ml.cache import LRUCache
+
+PROMPT = "Ans in brief,I am a farmer,{question}"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class ChatError(Exception):
+    pass
+
+
+class ChatBusy(ChatError):
+    """All upstream slots are in use; the caller should answer 503."""
+
+
+class ChatNotConfigured(ChatError):
+    """No API key is set; the caller should answer 503."""
+
+
+def normalize_question(text):
+    """Cache key for a question: case, punctuation and spacing are ignored."""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+class GeminiChat:
+    """
+    Gemini REST client for the /chat endpoint.
+
+    One keep-alive session per process with a bounded connection pool, hard
+    connect/read timeouts, a semaphore capping concurrent upstream calls,
+    retries with exponential backoff on connection errors/429/5xx, and an
+    LRU cache of answers keyed by the normalized question.
+    """
+
+    def __init__(self, api_key, base_url, model, connect_timeout=3.0, read_timeout=20.0,
+                 max_concurrency=8, acquire_timeout=2.0, retries=2, backoff=0.5,
+                 cache_size=512, cache_ttl=86400):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.acquire_timeout = acquire_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl or None)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # key in a header rather than the query string so it stays out of access logs
+        self.session.headers.update({"Content-Type": "application/json", "x-goog-api-key": api_key})
+
+    @classmethod
+    def from_config(cls, cfg):
+        return cls(
+            api_key=cfg["GEMINI_API_KEY"],
+            base_url=cfg["GEMINI_API_URL"],
+            model=cfg["GEMINI_MODEL"],
+            connect_timeout=cfg["CHAT_CONNECT_TIMEOUT"],
+            read_timeout=cfg["CHAT_READ_TIMEOUT"],
+            max_concurrency=cfg["CHAT_MAX_CONCURRENCY"],
+            retries=cfg["CHAT_RETRIES"],
+            cache_size=cfg["CHAT_CACHE_SIZE"],
+            cache_ttl=cfg["CHAT_CACHE_TTL"],
+        )
+
+    def _url(self, method):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    @staticmethod
+    def _payload(question):
+        return {"contents": [{"parts": [{"text": PROMPT.format(question=question)}]}]}
+
+    @staticmethod
+    def _text(output):
+        try:
+            return "".join(p.get("text", "") for p in output["candidates"][0]["content"]["parts"])
+        except (KeyError, IndexError, TypeError):
+            raise ChatError("Unexpected response from model")
+
+    def _acquire(self):
+        if not self.api_key:
+            raise ChatNotConfigured("Chat assistant is not configured (GEMINI_API_KEY is not set)")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise ChatBusy("Assistant is busy, please try again shortly")
+
+    def _post(self, method, question, **kwargs):
+        """POST with retries; returns the open response."""
+        last = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * (2 ** (attempt - 1)) * (1 + random.random() * 0.25))
+            try:
+                res = self.session.post(self._url(method), json=self._payload(question),
+                                        timeout=self.timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last = e
+                continue
+            if res.status_code in RETRY_STATUS:
+                last = ChatError(f"Upstream returned {res.status_code}")
+                res.close()
+                continue
+            try:
+                res.raise_for_status()
+            except requests.HTTPError as e:
+                res.close()
+                raise ChatError(str(e))
+            return res
+        raise ChatError(str(last))
+
+    def ask(self, question):
+        key = normalize_question(question)
+        reply = self.cache.get(key)
+        if reply is not None:
+            return reply
+        self._acquire()
+        try:
+            res = self._post("generateContent", question)
+            try:
+                output = res.json()
+            except ValueError:
+                raise ChatError("Unexpected response from model")
+            reply = self._text(output)
+        finally:
+            self._slots.release()
+        self.cache.put(key, reply)
+        return reply
+
+    def stream(self, question):
+        """
+        Yields the answer in chunks as the model produces them (server-sent
+        events from streamGenerateContent). Cached answers are yielded whole.
+        ChatBusy is raised before the first chunk, so callers can still send 503.
+        """
+        key = normalize_question(question)
+        reply = self.cache.get(key)
+        if reply is not None:
+            return iter([reply])
+        self._acquire()
+        try:
+            res = self._post("streamGenerateContent", question, params={"alt": "sse"}, stream=True)
+        except Exception:
+            self._slots.release()
+            raise
+        return self._iter_stream(key, res)
+
+    def _iter_stream(self, key, res):
+        parts = []
+        try:
+            for line in res.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data:"):
+                    continue
+                try:
+                    output = json.loads(line[5:])
+                except ValueError:
+                    raise ChatError("Unexpected response from model")
+                chunk = self._text(output)
+                if chunk:
+                    parts.append(chunk)
+                    yield chunk
+            self.cache.put(key, "".join(parts))
+        finally:
+            res.close()
+            self._slots.release()
@@ -1,10 +1,85 @@
 import os
 basedir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 
+def _engine_options(uri):
+    """SQLAlchemy engine/pool settings from the environment."""
+    opts = {"pool_pre_ping": os.environ.get("DB_POOL_PRE_PING", "1") == "1"}
+    if uri.startswith("sqlite"):
+        # sqlite3's own lock wait, in seconds; PRAGMA busy_timeout is set on connect as well
+        opts["connect_args"] = {"timeout": int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000)) / 1000.0}
+    else:
+        opts["pool_size"] = int(os.environ.get("DB_POOL_SIZE", 5))
+        opts["max_overflow"] = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+        opts["pool_timeout"] = int(os.environ.get("DB_POOL_TIMEOUT", 30))
+        opts["pool_recycle"] = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+    return opts
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY", "dev-secret-key")
     SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///" + os.path.join(basedir, "app.db"))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = _engine_options(SQLALCHEMY_DATABASE_URI)
+    # SQLite only: WAL lets readers run alongside a writer across gunicorn workers
+    SQLITE_WAL = os.environ.get("SQLITE_WAL", "1") == "1"
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    # create missing tables/indexes at startup; set to 0 and run `flask --app app init-db` on deploy instead
+    DB_AUTO_CREATE = os.environ.get("DB_AUTO_CREATE", "1") == "1"
     UPLOAD_FOLDER = os.path.join(basedir, "uploads")
-    MODEL_FOLDER = os.path.join(basedir, "..", "models")
-    LANG_FOLDER = os.path.join(basedir, "..", "frontend", "lang")
+    # uploads are inferred from memory; keeping a copy on disk is optional and done off the request thread
+    SAVE_UPLOADS = os.environ.get("SAVE_UPLOADS", "1") == "1"
+    UPLOAD_WRITER_THREADS = int(os.environ.get("UPLOAD_WRITER_THREADS", 2))
+    # background jobs (bulk soil imports): state, uploads and result files
+    JOB_FOLDER = os.environ.get("JOB_FOLDER", os.path.join(basedir, "jobs"))
+    JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+    JOB_RETENTION_HOURS = int(os.environ.get("JOB_RETENTION_HOURS", 24))
+    SOIL_IMPORT_CHUNKSIZE = int(os.environ.get("SOIL_IMPORT_CHUNKSIZE", 5000))
+    MODEL_FOLDER = os.path.join(basedir, "models")
+    LANG_FOLDER = os.environ.get("LANG_FOLDER", os.path.join(basedir, "frontend", "lang"))
+    CROP_SCHEDULES_PATH = os.environ.get("CROP_SCHEDULES_PATH",
+                                         os.path.join(basedir, "frontend", "static", "js", "crop_schedules.json"))
+    RAINFALL_CSV = os.environ.get("RAINFALL_CSV", os.path.join(basedir, "data", "Sub_Division_IMD_2017.csv"))
+    # most (crop, sowing date) plots accepted by one /api/calendar/batch request
+    CALENDAR_BATCH_MAX = int(os.environ.get("CALENDAR_BATCH_MAX", 5000))
+    # how often language/schedule files are checked for changes (seconds)
+    REFDATA_CHECK_SECONDS = float(os.environ.get("REFDATA_CHECK_SECONDS", 5.0))
+    # weight of market scores (price level, trend, stability from market_prices) in crop
+    # rankings: the largest relative boost/penalty applied to a crop's probability; 0 disables
+    MARKET_WEIGHT = float(os.environ.get("MARKET_WEIGHT", 0.2))
+    # "similar plots" k-NN index over soil_records: file it is persisted to, how often a worker
+    # picks up new records (seconds), how many new records trigger a save, and the largest k served
+    SIMILAR_INDEX_PATH = os.environ.get("SIMILAR_INDEX_PATH", os.path.join(basedir, "cache", "similar_index.joblib"))
+    SIMILAR_SYNC_SECONDS = float(os.environ.get("SIMILAR_SYNC_SECONDS", 5.0))
+    SIMILAR_SAVE_ROWS = int(os.environ.get("SIMILAR_SAVE_ROWS", 1000))
+    SIMILAR_MAX_K = int(os.environ.get("SIMILAR_MAX_K", 50))
+    # load ML models when the app starts instead of on the first request
+    MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "0") == "1"
+    # cached responses for read-mostly routes; backend is memory, filesystem or redis. The memory
+    # backend keeps its generation counters in RESPONSE_CACHE_DIR so invalidations reach every worker
+    RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "1") == "1"
+    RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")
+    RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", 300))
+    RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR", os.path.join(basedir, "cache", "responses"))
+    RESPONSE_CACHE_REDIS_URL = os.environ.get("RESPONSE_CACHE_REDIS_URL", "redis://localhost:6379/0")
+    # how often the filesystem backend sweeps expired and invalidated entries (seconds)
+    RESPONSE_CACHE_PRUNE_SECONDS = float(os.environ.get("RESPONSE_CACHE_PRUNE_SECONDS", 60.0))
+    # Prometheus metrics at METRICS_PATH; Server-Timing response header with per-stage times
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+    METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+    SERVER_TIMING = os.environ.get("SERVER_TIMING", "0") == "1"
+    # sampling profiler for slow requests: 0 disables; PROFILE_SAMPLE_RATE of requests are sampled
+    PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", 0))
+    PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", 0.05))
+    PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+    PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(basedir, "cache", "profiles"))
+    # Gemini chat assistant; GEMINI_API_URL can point at a local stub (scripts/gemini_stub.py)
+    # /chat answers 503 until GEMINI_API_KEY is set (any value works with the stub)
+    GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+    GEMINI_API_URL = os.environ.get("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta")
+    GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+    CHAT_CONNECT_TIMEOUT = float(os.environ.get("CHAT_CONNECT_TIMEOUT", 3.0))
+    CHAT_READ_TIMEOUT = float(os.environ.get("CHAT_READ_TIMEOUT", 20.0))
+    CHAT_MAX_CONCURRENCY = int(os.environ.get("CHAT_MAX_CONCURRENCY", 8))
+    CHAT_RETRIES = int(os.environ.get("CHAT_RETRIES", 2))
+    CHAT_CACHE_SIZE = int(os.environ.get("CHAT_CACHE_SIZE", 512))
+    CHAT_CACHE_TTL = int(os.environ.get("CHAT_CACHE_TTL", 86400))
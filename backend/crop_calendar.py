@@ -0,0 +1,187 @@
+import csv
+import datetime
+import hashlib
+import io
+import uuid
+from collections import namedtuple
+from functools import lru_cache
+
+from sqlalchemy import insert, select
+
+from db import db, CropHistory
+from refdata import refdata, GENERIC_SCHEDULE
+
+Plan = namedtuple("Plan", "plot crop sow_date duration_days")
+CSV_COLUMNS = ("plot", "crop", "sowing_date", "day", "date", "task")
+# longest season accepted (two years covers perennial first harvests)
+MAX_DURATION_DAYS = 730
+
+
+class InvalidPlan(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1024)
+def _template(schedule, duration):
+    """
+    (day offset, timedelta, task) from sowing to harvest: weekly irrigation for
+    the crop's watering weeks, fertilizer applications and harvest. Keyed by the
+    immutable Schedule, so edited schedules get new templates on reload.
+    """
+    tasks = [(0, "Sowing")]
+    tasks += [(7 * w, "Irrigation") for w in range(1, schedule.watering_weeks + 1)]
+    tasks += [(d, "Apply fertilizer") for d in schedule.fertilizer_days]
+    tasks = [(d, t) for d, t in tasks if d < duration] + [(duration, "Harvest")]
+    tasks.sort(key=lambda x: x[0])
+    return tuple((d, datetime.timedelta(days=d), t) for d, t in tasks)
+
+
+def schedule_for(crop):
+    return refdata.schedule(crop) or GENERIC_SCHEDULE
+
+
+def template(crop, duration_days=None):
+    schedule = schedule_for(crop)
+    return _template(schedule, int(duration_days or schedule.duration_days))
+
+
+def crop_calendar(sow_date, crop, duration_days=None):
+    """Tasks for a crop sown on sow_date; duration_days overrides the crop's season length."""
+    return [{"day": d, "date": (sow_date + delta).isoformat(), "task": t}
+            for d, delta, t in template(crop, duration_days)]
+
+
+def parse_plan(data, index=None):
+    """A Plan from {"crop", "sowing_date" (ISO, default today), "duration_days", "plot"}."""
+    where = "" if index is None else "plots[%d]: " % index
+    if not isinstance(data, dict):
+        raise InvalidPlan(where + "expected an object")
+    crop = data.get("crop") or "GenericCrop"
+    if not isinstance(crop, str):
+        raise InvalidPlan(where + "crop must be a string")
+    try:
+        sow = datetime.date.fromisoformat(data["sowing_date"]) if data.get("sowing_date") else datetime.date.today()
+    except (TypeError, ValueError):
+        raise InvalidPlan(where + "sowing_date must be an ISO date (YYYY-MM-DD)")
+    try:
+        duration = int(data.get("duration_days") or schedule_for(crop).duration_days)
+    except (TypeError, ValueError):
+        raise InvalidPlan(where + "duration_days must be an integer")
+    if not 1 <= duration <= MAX_DURATION_DAYS:
+        raise InvalidPlan(where + "duration_days must be between 1 and %d" % MAX_DURATION_DAYS)
+    try:
+        # the harvest's iCal event ends the day after
+        sow + datetime.timedelta(days=duration + 1)
+    except OverflowError:
+        raise InvalidPlan(where + "harvest date is out of range")
+    plot = data.get("plot")
+    return Plan(None if plot is None else str(plot), crop, sow, duration)
+
+
+def plan_calendar(plan):
+    return {"plot": plan.plot, "crop": plan.crop, "sowing_date": plan.sow_date.isoformat(),
+            "harvest_date": (plan.sow_date + datetime.timedelta(days=plan.duration_days)).isoformat(),
+            "schedule": crop_calendar(plan.sow_date, plan.crop, plan.duration_days)}
+
+
+def _notes(plan):
+    lines = ["%s: %s" % ((plan.sow_date + delta).isoformat(), t) for _, delta, t in template(plan.crop, plan.duration_days)]
+    if plan.plot is not None:
+        lines.insert(0, "Plot: %s" % plan.plot)
+    return "\n".join(lines)
+
+
+def save_plans(user_id, plans):
+    """Adds one CropHistory row per plan in a single executemany; the caller commits."""
+    if not plans:
+        return 0
+    db.session.execute(insert(CropHistory), [
+        {"user_id": user_id, "crop": p.crop, "sow_date": p.sow_date,
+         "harvest_date": p.sow_date + datetime.timedelta(days=p.duration_days), "notes": _notes(p)}
+        for p in plans])
+    return len(plans)
+
+
+def saved_plans(user_id):
+    """The user's CropHistory calendars as Plans, oldest sowing first (streamed from the database)."""
+    q = (select(CropHistory.id, CropHistory.crop, CropHistory.sow_date, CropHistory.harvest_date)
+         .where(CropHistory.user_id == user_id, CropHistory.sow_date.is_not(None))
+         .order_by(CropHistory.sow_date, CropHistory.id))
+    for rid, crop, sow, harvest in db.session.execute(q.execution_options(yield_per=1000)):
+        duration = (harvest - sow).days if harvest and harvest > sow else None
+        yield Plan(str(rid), crop or "GenericCrop", sow, duration or schedule_for(crop).duration_days)
+
+
+def csv_chunks(plans, rows_per_chunk=500):
+    """CSV (header plus one row per task) in chunks of about rows_per_chunk rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(CSV_COLUMNS)
+    rows = 0
+    for plan in plans:
+        sow = plan.sow_date.isoformat()
+        for d, delta, t in template(plan.crop, plan.duration_days):
+            writer.writerow((plan.plot or "", plan.crop, sow, d, (plan.sow_date + delta).isoformat(), t))
+            rows += 1
+        if rows >= rows_per_chunk:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            rows = 0
+    yield buf.getvalue()
+
+
+def _ical_text(value):
+    return (value.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _ical_line(line):
+    # RFC 5545: lines longer than 75 octets are folded with CRLF + space
+    data = line.encode("utf-8")
+    if len(data) <= 75:
+        return line + "\r\n"
+    parts, start, limit = [], 0, 75
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and (data[end] & 0xC0) == 0x80:  # don't split a UTF-8 sequence
+            end -= 1
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, 74
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _uid_prefix(user_id, plan, export, i):
+    """
+    Per-plan UID part: the owner plus the plot, so re-exporting a plot updates
+    its events. Plans without a plot fall back to their position in this export
+    and a token unique to the export, so separate exports never overwrite each other.
+    """
+    owner = "u%d" % user_id if user_id is not None else "anon"
+    if plan.plot is not None:
+        where = "plot" + hashlib.sha1(plan.plot.encode("utf-8")).hexdigest()[:16]
+    else:
+        where = "%s.%d" % (export, i)
+    return "%s-%s-%s-%s" % (owner, where, plan.sow_date.strftime("%Y%m%d"),
+                            "".join(c for c in plan.crop.lower() if c.isalnum()))
+
+
+def ical_chunks(plans, name="AgriNext crop calendar", user_id=None):
+    """iCalendar with one all-day event per task, one chunk per plan."""
+    stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    export = uuid.uuid4().hex[:12]
+    yield "".join(_ical_line(line) for line in (
+        "BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//AgriNext//Crop Calendar//EN",
+        "CALSCALE:GREGORIAN", "X-WR-CALNAME:" + _ical_text(name)))
+    for i, plan in enumerate(plans):
+        label = plan.crop if plan.plot is None else "%s (%s)" % (plan.crop, plan.plot)
+        uid = _uid_prefix(user_id, plan, export, i)
+        lines = []
+        for d, delta, t in template(plan.crop, plan.duration_days):
+            day = plan.sow_date + delta
+            lines += ["BEGIN:VEVENT", "UID:%s-%d-%s@agrinext" % (uid, d, t.split()[0].lower()),
+                      "DTSTAMP:" + stamp, "DTSTART;VALUE=DATE:" + day.strftime("%Y%m%d"),
+                      "DTEND;VALUE=DATE:" + (day + datetime.timedelta(days=1)).strftime("%Y%m%d"),
+                      "SUMMARY:" + _ical_text("%s: %s" % (t, label)), "END:VEVENT"]
+        yield "".join(_ical_line(line) for line in lines)
+    yield _ical_line("END:VCALENDAR")
@@ -1,8 +1,77 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+import logging
+from sqlalchemy import event, text
+from sqlalchemy.exc import IntegrityError, OperationalError
 from datetime import datetime
 
 db = SQLAlchemy()
+log = logging.getLogger(__name__)
+
+# indexes added after the first release; create_all() does not add them to existing tables
+_LATE_INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_market_prices_crop_date_source ON market_prices (crop, date, source)",
+    "CREATE INDEX IF NOT EXISTS ix_market_prices_date_crop_price ON market_prices (date, crop, price)",
+    "CREATE INDEX IF NOT EXISTS ix_soil_records_user_recorded ON soil_records (user_id, recorded_at, id)",
+]
+
+def configure_engine(app):
+    """Applies per-connection SQLite pragmas (WAL, busy timeout, synchronous)."""
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name != "sqlite":
+            return
+        wal = app.config.get("SQLITE_WAL", True)
+        busy_ms = int(app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000))
+        synchronous = app.config.get("SQLITE_SYNCHRONOUS", "NORMAL")
+
+        @event.listens_for(engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _record):
+            cur = dbapi_conn.cursor()
+            if wal:
+                cur.execute("PRAGMA journal_mode=WAL")
+                cur.execute("PRAGMA synchronous=%s" % synchronous)
+            cur.execute("PRAGMA busy_timeout=%d" % busy_ms)
+            cur.close()
+
+def init_db():
+    """Creates missing tables and indexes. Safe to run repeatedly and from several workers."""
+    try:
+        db.create_all()
+        if db.engine.dialect.name in ("sqlite", "postgresql"):
+            for stmt in _LATE_INDEXES:
+                _create_late_index(stmt)
+    except OperationalError as e:
+        # another worker created the same table first
+        db.session.rollback()
+        if "already exists" not in str(e):
+            raise
+
+def _create_late_index(stmt):
+    try:
+        db.session.execute(text(stmt))
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        if "uq_market_prices_crop_date_source" not in stmt:
+            raise
+        # rows from the old append-only ingester repeat the key. Deleting them is left to
+        # the operator; market ingestion fails until then, the rest of the app works
+        log.error("Could not create unique index on market_prices, it holds duplicate (crop, date, source) "
+                  "rows: run 'flask --app app dedupe-market-prices' or "
+                  "'python scripts/ingest_market_csv.py --dedupe' (%s)", e)
+
+def dedupe_market_prices():
+    """
+    Deletes repeated (crop, date, source) rows from market_prices, keeping the
+    newest (highest id) of each, so the unique key the ingester upserts on can
+    be created on databases written by the old append-only ingester. Returns
+    the number of rows deleted; the caller commits.
+    """
+    res = db.session.execute(text(
+        "DELETE FROM market_prices WHERE id NOT IN "
+        "(SELECT MAX(id) FROM market_prices GROUP BY crop, date, source)"))
+    return res.rowcount
 
 class User(db.Model, UserMixin):
     __tablename__ = "users"
@@ -16,6 +85,10 @@ class User(db.Model, UserMixin):
 
 class SoilRecord(db.Model):
     __tablename__ = "soil_records"
+    # serves the dashboard and keyset-paginated history (newest first per user)
+    __table_args__ = (
+        db.Index("ix_soil_records_user_recorded", "user_id", "recorded_at", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     n = db.Column(db.Float)
@@ -30,6 +103,34 @@ class SoilRecord(db.Model):
 
     user = db.relationship("User", backref="soil_records")
 
+class UserSoilStats(db.Model):
+    """
+    Running per-user sums over soil_records, kept in step with inserts and
+    deletes by history.apply_soil_records. Means and least-squares trends are
+    derived from the sums; t is days since history.EPOCH.
+    """
+    __tablename__ = "user_soil_stats"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+    sum_t = db.Column(db.Float, default=0.0, nullable=False)
+    sum_tt = db.Column(db.Float, default=0.0, nullable=False)
+    sum_n = db.Column(db.Float, default=0.0, nullable=False)
+    sum_p = db.Column(db.Float, default=0.0, nullable=False)
+    sum_k = db.Column(db.Float, default=0.0, nullable=False)
+    sum_ph = db.Column(db.Float, default=0.0, nullable=False)
+    sum_tn = db.Column(db.Float, default=0.0, nullable=False)
+    sum_tp = db.Column(db.Float, default=0.0, nullable=False)
+    sum_tk = db.Column(db.Float, default=0.0, nullable=False)
+    sum_tph = db.Column(db.Float, default=0.0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class UserCropCount(db.Model):
+    """How often each crop was recommended to a user (soil_records.crop_predicted)."""
+    __tablename__ = "user_crop_counts"
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    crop = db.Column(db.String(200), primary_key=True)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
 class CropHistory(db.Model):
     __tablename__ = "crop_history"
     id = db.Column(db.Integer, primary_key=True)
@@ -43,12 +144,42 @@ class CropHistory(db.Model):
 
 class MarketPrice(db.Model):
     __tablename__ = "market_prices"
+    # one price per crop, day and source; the ingester upserts on this key and it
+    # also serves per-crop date lookups. (date, crop, price) covers window scans.
+    __table_args__ = (
+        db.UniqueConstraint("crop", "date", "source", name="uq_market_prices_crop_date_source"),
+        db.Index("ix_market_prices_date_crop_price", "date", "crop", "price"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     crop = db.Column(db.String(200))
     price = db.Column(db.Float)
     date = db.Column(db.Date)
     source = db.Column(db.String(200))
 
+class LatestMarketPrice(db.Model):
+    """Latest MarketPrice row per crop, maintained by the market ingester."""
+    __tablename__ = "market_latest_prices"
+    crop = db.Column(db.String(200), primary_key=True)
+    price = db.Column(db.Float)
+    date = db.Column(db.Date, index=True)
+    source = db.Column(db.String(200))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class MarketScore(db.Model):
+    """
+    Per-crop price statistics over the recent window (see market.refresh_market_scores),
+    refreshed for the crops touched by each ingestion.
+    """
+    __tablename__ = "market_scores"
+    crop = db.Column(db.String(200), primary_key=True)
+    price_level = db.Column(db.Float)   # mean daily price over the window
+    trend = db.Column(db.Float)         # fitted relative price change per 30 days
+    volatility = db.Column(db.Float)    # std of daily log returns
+    days = db.Column(db.Integer)        # days with prices in the window
+    as_of = db.Column(db.Date)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 
 class CropSchedule(db.Model):
     __tablename__ = "crop_schedule"
@@ -0,0 +1,168 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import defaultdict
+
+from sqlalchemy import and_, delete, or_, select
+
+from db import db, SoilRecord, UserSoilStats, UserCropCount
+from market import upsert_statement
+
+# trend time axis: days since this date (keeps the squared sums small)
+EPOCH = datetime.datetime(2020, 1, 1)
+FIELDS = ("n", "p", "k", "ph")
+MAX_PAGE_SIZE = 200
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _days(ts):
+    return (ts - EPOCH).total_seconds() / 86400.0
+
+
+def _get(rec, name):
+    return rec.get(name) if isinstance(rec, dict) else getattr(rec, name)
+
+
+def apply_soil_records(records, sign=1, backfill=True):
+    """
+    Adds (sign=1) or removes (sign=-1) soil records from the per-user
+    aggregates in the current transaction; the caller commits. Records are
+    SoilRecord objects or dicts with the same attribute names, and must be in
+    soil_records when this runs: inserted (objects flushed first, so
+    recorded_at has its default) and not yet deleted. Users without
+    aggregates yet (e.g. records that predate them) are first backfilled from
+    soil_records, which already counts inserted records.
+    """
+    skip = set()
+    if backfill:
+        uids = {_get(rec, "user_id") for rec in records} - {None}
+        have = set(db.session.execute(
+            select(UserSoilStats.user_id).where(UserSoilStats.user_id.in_(uids))).scalars()) if uids else set()
+        missing = uids - have
+        if missing:
+            _recompute_soil_stats(missing)
+            if sign > 0:
+                skip = missing
+    stats = defaultdict(lambda: defaultdict(float))
+    crops = defaultdict(int)
+    now = datetime.datetime.utcnow()
+    for rec in records:
+        uid = _get(rec, "user_id")
+        if uid is None or uid in skip:
+            continue
+        t = _days(_get(rec, "recorded_at") or now)
+        s = stats[uid]
+        s["count"] += sign
+        s["sum_t"] += sign * t
+        s["sum_tt"] += sign * t * t
+        for f in FIELDS:
+            v = _get(rec, f) or 0.0
+            s["sum_" + f] += sign * v
+            s["sum_t" + f] += sign * t * v
+        crop = _get(rec, "crop_predicted")
+        if crop:
+            crops[(uid, crop)] += sign
+    if not stats:
+        return
+    cols = ["count", "sum_t", "sum_tt"] + ["sum_" + f for f in FIELDS] + ["sum_t" + f for f in FIELDS]
+    stmt = upsert_statement(UserSoilStats.__table__, ["user_id"], ["updated_at"], cols)
+    db.session.execute(stmt, [dict({c: s[c] for c in cols}, user_id=uid, updated_at=now)
+                              for uid, s in stats.items()])
+    if crops:
+        stmt = upsert_statement(UserCropCount.__table__, ["user_id", "crop"], [], ["count"])
+        db.session.execute(stmt, [{"user_id": uid, "crop": crop, "count": n} for (uid, crop), n in crops.items()])
+        db.session.execute(delete(UserCropCount).where(UserCropCount.user_id.in_({uid for uid, _ in crops}),
+                                                       UserCropCount.count <= 0))
+
+
+def _recompute_soil_stats(users):
+    db.session.execute(delete(UserSoilStats).where(UserSoilStats.user_id.in_(users)))
+    db.session.execute(delete(UserCropCount).where(UserCropCount.user_id.in_(users)))
+    q = select(SoilRecord.user_id, SoilRecord.recorded_at, SoilRecord.n, SoilRecord.p, SoilRecord.k,
+               SoilRecord.ph, SoilRecord.crop_predicted).where(SoilRecord.user_id.in_(users))
+    total = 0
+    rows = db.session.execute(q.execution_options(yield_per=5000))
+    for chunk in rows.partitions():
+        apply_soil_records([r._asdict() for r in chunk], backfill=False)
+        total += len(chunk)
+    return total
+
+
+def rebuild_soil_stats(user_ids=None):
+    """Recomputes the aggregates from soil_records (for data that predates them)."""
+    users = select(SoilRecord.user_id).distinct() if user_ids is None else list(user_ids)
+    total = _recompute_soil_stats(users)
+    db.session.commit()
+    return total
+
+
+def _slope(count, st, stt, sx, stx):
+    denom = count * stt - st * st
+    if count < 2 or abs(denom) < 1e-9:
+        return None
+    return (count * stx - st * sx) / denom
+
+
+def soil_stats(user_id):
+    """Means, per-day least-squares trends and crop frequencies for one user."""
+    s = db.session.get(UserSoilStats, user_id)
+    crops = db.session.execute(
+        select(UserCropCount.crop, UserCropCount.count)
+        .where(UserCropCount.user_id == user_id).order_by(UserCropCount.count.desc(), UserCropCount.crop)
+    ).all()
+    out = {"count": 0, "mean": {}, "trend_per_day": {}, "crops": [{"crop": c, "count": n} for c, n in crops]}
+    if s is None or s.count <= 0:
+        return out
+    out["count"] = s.count
+    for f in FIELDS:
+        sx, stx = getattr(s, "sum_" + f), getattr(s, "sum_t" + f)
+        out["mean"][f] = round(sx / s.count, 3)
+        slope = _slope(s.count, s.sum_t, s.sum_tt, sx, stx)
+        out["trend_per_day"][f] = round(slope, 5) if slope is not None else None
+    return out
+
+
+def encode_cursor(rec):
+    raw = json.dumps([rec.recorded_at.isoformat(), rec.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        ts, rid = json.loads(raw)
+        return datetime.datetime.fromisoformat(ts), int(rid)
+    except (binascii.Error, ValueError, TypeError):
+        raise InvalidCursor("invalid cursor")
+
+
+def history_page(user_id, limit=50, cursor=None):
+    """
+    One page of a user's soil records, newest first. Keyset pagination on
+    (recorded_at, id) walks ix_soil_records_user_recorded, so deep pages cost
+    the same as the first. Returns (records, next_cursor or None).
+    """
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    q = select(SoilRecord).where(SoilRecord.user_id == user_id, SoilRecord.recorded_at.isnot(None))
+    if cursor:
+        ts, rid = decode_cursor(cursor)
+        q = q.where(or_(SoilRecord.recorded_at < ts,
+                        and_(SoilRecord.recorded_at == ts, SoilRecord.id < rid)))
+    q = q.order_by(SoilRecord.recorded_at.desc(), SoilRecord.id.desc()).limit(limit + 1)
+    rows = db.session.execute(q).scalars().all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def record_to_dict(rec):
+    return {
+        "id": rec.id,
+        "recorded_at": rec.recorded_at.isoformat() if rec.recorded_at else None,
+        "N": rec.n, "P": rec.p, "K": rec.k, "pH": rec.ph,
+        "temp": rec.weather_temp, "humidity": rec.weather_humidity, "rainfall": rec.rainfall,
+        "crop_predicted": rec.crop_predicted,
+    }
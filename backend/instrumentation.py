@@ -0,0 +1,212 @@
+import collections
+import logging
+import os
+import random
+import sys
+import threading
+import time
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+from ml.metrics import REGISTRY, StaticFamily, begin_stage_collection, end_stage_collection
+
+log = logging.getLogger(__name__)
+
+SIZE_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+REQUEST_SECONDS = REGISTRY.histogram("agrinext_http_request_seconds", "Request latency by route",
+                                     ["endpoint", "method"])
+REQUESTS = REGISTRY.counter("agrinext_http_requests_total", "Requests by route and status",
+                            ["endpoint", "method", "status"])
+IN_FLIGHT = REGISTRY.gauge("agrinext_http_requests_in_flight", "Requests being handled").labels()
+SQL_SECONDS = REGISTRY.histogram("agrinext_sql_query_seconds", "Duration of individual SQL statements").labels()
+REQUEST_SQL_QUERIES = REGISTRY.histogram("agrinext_request_sql_queries", "SQL statements per request",
+                                         ["endpoint"], buckets=SIZE_BUCKETS)
+REQUEST_SQL_SECONDS = REGISTRY.histogram("agrinext_request_sql_seconds", "Total SQL time per request",
+                                         ["endpoint"])
+SLOW_PROFILES = REGISTRY.counter("agrinext_slow_request_profiles_total", "Slow requests profiled",
+                                 ["endpoint"])
+
+
+def _model_families():
+    # imported lazily so /metrics works in processes without the ML stack
+    from ml.registry import registry
+    stats = registry.stats()
+    return [
+        StaticFamily("gauge", "agrinext_model_loaded", "1 when the model is loaded in this process",
+                     [({"model": n}, int(s["loaded"])) for n, s in stats.items()]),
+        StaticFamily("counter", "agrinext_model_loads_total", "Model (re)loads",
+                     [({"model": n}, s["loads"]) for n, s in stats.items()]),
+        StaticFamily("gauge", "agrinext_model_load_seconds", "Duration of the last model load",
+                     [({"model": n}, s["load_seconds"] or 0.0) for n, s in stats.items()]),
+    ]
+
+
+class StackSampler:
+    """
+    Sampling profiler: one background thread snapshots the stacks of the
+    threads currently being profiled every interval seconds. Overhead is paid
+    only while at least one request is being sampled.
+    """
+
+    def __init__(self, interval=0.005, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._targets = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # threads do not survive fork (gunicorn preload), so start per process
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def start(self, thread_id):
+        with self._lock:
+            self._ensure_thread()
+            self._targets[thread_id] = collections.Counter()
+        self._wakeup.set()
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, collections.Counter())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                targets = list(self._targets.items())
+            if not targets:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            for tid, counts in targets:
+                frame = frames.get(tid)
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append("%s (%s:%d)" % (code.co_name, os.path.basename(code.co_filename), frame.f_lineno))
+                    frame = frame.f_back
+                if stack:
+                    counts[";".join(reversed(stack))] += 1
+            time.sleep(self.interval)
+
+
+class Instrumentation:
+    """
+    Request metrics for the Flask app: per-route latency and status counts,
+    SQL statement counts and time per request, per-stage timers from the ML
+    modules (ml.metrics.stage) and cache/model state, all exposed in the
+    Prometheus text format at METRICS_PATH. Metrics are per process; with
+    several gunicorn workers each one is scraped separately.
+
+    PROFILE_SLOW_REQUESTS_MS > 0 turns on the sampling profiler for a
+    PROFILE_SAMPLE_RATE fraction of requests; samples of requests slower than
+    the threshold are written as folded stacks (flamegraph.pl / speedscope
+    input) to PROFILE_DIR. SERVER_TIMING=1 adds a Server-Timing header with
+    the per-stage breakdown.
+    """
+
+    def __init__(self, app=None):
+        self.profile_threshold = 0.0
+        self.profile_rate = 0.0
+        self.profile_dir = None
+        self.server_timing = False
+        self.sampler = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg = app.config
+        if not cfg.get("METRICS_ENABLED", True):
+            return
+        self.server_timing = cfg.get("SERVER_TIMING", False)
+        self.profile_threshold = cfg.get("PROFILE_SLOW_REQUESTS_MS", 0) / 1000.0
+        self.profile_rate = cfg.get("PROFILE_SAMPLE_RATE", 0.05)
+        self.profile_dir = cfg.get("PROFILE_DIR")
+        if self.profile_threshold > 0:
+            self.sampler = StackSampler(interval=cfg.get("PROFILE_INTERVAL_MS", 5) / 1000.0)
+            os.makedirs(self.profile_dir, exist_ok=True)
+
+        app.before_request(self._before)
+        app.after_request(self._after)
+        with app.app_context():
+            from db import db
+            event.listen(db.engine, "before_cursor_execute", self._before_sql)
+            event.listen(db.engine, "after_cursor_execute", self._after_sql)
+        REGISTRY.register_collector(_model_families)
+        app.add_url_rule(cfg.get("METRICS_PATH", "/metrics"), "metrics", self.metrics_view)
+        app.extensions["instrumentation"] = self
+
+    @staticmethod
+    def metrics_view():
+        return Response(REGISTRY.expose(), mimetype="text/plain; version=0.0.4")
+
+    def _before(self):
+        g._metrics_start = time.perf_counter()
+        g._metrics_stages = begin_stage_collection()
+        g._metrics_sql = [0, 0.0]
+        IN_FLIGHT.inc()
+        if self.sampler is not None and random.random() < self.profile_rate:
+            g._metrics_profiled = threading.get_ident()
+            self.sampler.start(g._metrics_profiled)
+
+    def _after(self, response):
+        start = g.pop("_metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        IN_FLIGHT.dec()
+        stages = end_stage_collection(g.pop("_metrics_stages"))
+        queries, sql_seconds = g.pop("_metrics_sql")
+        endpoint = request.endpoint or "unmatched"
+        REQUEST_SECONDS.labels(endpoint, request.method).observe(elapsed)
+        REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        REQUEST_SQL_QUERIES.labels(endpoint).observe(queries)
+        REQUEST_SQL_SECONDS.labels(endpoint).observe(sql_seconds)
+
+        tid = g.pop("_metrics_profiled", None)
+        if tid is not None:
+            samples = self.sampler.stop(tid)
+            if elapsed >= self.profile_threshold and samples:
+                self._write_profile(endpoint, elapsed, samples)
+        if self.server_timing:
+            parts = ["total;dur=%.2f" % (elapsed * 1000), "db;dur=%.2f;desc=\"%d queries\"" % (sql_seconds * 1000, queries)]
+            parts += ["%s;dur=%.2f" % (name.replace(".", "-"), s * 1000) for name, s in stages.items()]
+            response.headers["Server-Timing"] = ", ".join(parts)
+        return response
+
+    def _write_profile(self, endpoint, elapsed, samples):
+        SLOW_PROFILES.labels(endpoint).inc()
+        name = "%s-%s-%dms-%d.folded" % (time.strftime("%Y%m%d-%H%M%S"), endpoint, elapsed * 1000, os.getpid())
+        path = os.path.join(self.profile_dir, name)
+        with open(path, "w") as f:
+            for stack, count in samples.most_common():
+                f.write("%s %d\n" % (stack, count))
+        log.warning("Slow request %s %s took %.0f ms; profile written to %s",
+                    request.method, request.path, elapsed * 1000, path)
+
+    @staticmethod
+    def _before_sql(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_metrics_query_start", []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_sql(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_metrics_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        SQL_SECONDS.observe(elapsed)
+        if has_request_context():
+            totals = g.get("_metrics_sql")
+            if totals is not None:
+                totals[0] += 1
+                totals[1] += elapsed
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,169 @@
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+def _process_alive(pid):
+    # job files are local to the host, so its pid table decides
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class Job:
+    """Progress of one background job. The runner persists it as <id>.json."""
+
+    def __init__(self, kind, user_id=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = "queued"
+        self.total = None
+        self.processed = 0
+        self.summary = {}
+        self.error = None
+        self.result_file = None
+        # process running the job, so a restarted runner can tell abandoned jobs from live ones
+        self.pid = None
+        self.created_at = datetime.datetime.utcnow().isoformat()
+        self.started_at = None
+        self.finished_at = None
+
+    @property
+    def done(self):
+        return self.status in ("done", "failed")
+
+    def to_dict(self):
+        d = {k: v for k, v in vars(self).items() if not k.startswith("_")}
+        d["progress"] = round(self.processed / self.total, 4) if self.total else None
+        return d
+
+    @classmethod
+    def from_dict(cls, d):
+        job = cls(d["kind"], d.get("user_id"), d["id"])
+        for k, v in d.items():
+            if k != "progress":
+                setattr(job, k, v)
+        return job
+
+
+class JobRunner:
+    """
+    Local background job runner: a thread pool inside the web process, no
+    broker. Job state is written to <folder>/<id>.json on every progress
+    update so any worker process can answer status requests; result files
+    live next to it. Jobs and files older than retention_hours are pruned
+    when new jobs are submitted. Jobs whose process died before they
+    finished are marked failed when a runner starts.
+    """
+
+    def __init__(self, folder, max_workers=2, retention_hours=24, app=None):
+        self.folder = folder
+        self.retention = retention_hours * 3600
+        self.app = app
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self.recover()
+
+    def path(self, job_id, suffix):
+        return os.path.join(self.folder, job_id + suffix)
+
+    def save(self, job):
+        tmp = self.path(job.id, ".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp, self.path(job.id, ".json"))
+
+    def submit(self, kind, fn, *args, user_id=None, job=None, **kwargs):
+        """Queues fn(job, *args, **kwargs); fn updates job.total/processed and calls runner.save(job)."""
+        self.prune()
+        job = job or Job(kind, user_id)
+        job.pid = os.getpid()
+        with self._lock:
+            self._jobs[job.id] = job
+        self.save(job)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = "running"
+        job.started_at = datetime.datetime.utcnow().isoformat()
+        self.save(job)
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    fn(job, *args, **kwargs)
+            else:
+                fn(job, *args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            log.error("Job %s (%s) failed:\n%s", job.id, job.kind, traceback.format_exc())
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.datetime.utcnow().isoformat()
+        self.save(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        # started by another worker process
+        try:
+            with open(self.path(os.path.basename(job_id), ".json")) as f:
+                return Job.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def recover(self):
+        """Marks queued or running jobs of processes that no longer exist as failed; returns how many."""
+        failed = 0
+        for entry in os.scandir(self.folder):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path) as f:
+                    job = Job.from_dict(json.load(f))
+            except (OSError, ValueError, KeyError):
+                continue
+            # a job recorded under this process's pid is not one of ours (e.g. a container restart)
+            if job.done or (job.pid != os.getpid() and _process_alive(job.pid)):
+                continue
+            job.status = "failed"
+            job.error = "Interrupted: the worker running this job exited"
+            job.finished_at = datetime.datetime.utcnow().isoformat()
+            self.save(job)
+            failed += 1
+        if failed:
+            log.warning("Marked %d interrupted job(s) in %s as failed", failed, self.folder)
+        return failed
+
+    def prune(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.done and os.path.exists(self.path(job_id, ".json")) \
+                        and os.path.getmtime(self.path(job_id, ".json")) < cutoff:
+                    del self._jobs[job_id]
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.is_file() and entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,33 @@
+import importlib
+import threading
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access, so
+    heavy subsystems (pandas, scikit-learn, TensorFlow) cost nothing at boot
+    for workers that never use them. Thread-safe; load() imports eagerly
+    (e.g. in a preloading gunicorn master before workers fork).
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        return "<lazy module %r%s>" % (self._name, "" if self.loaded else " (not loaded)")
@@ -0,0 +1,245 @@
+import datetime
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from db import db, MarketPrice, LatestMarketPrice, MarketScore
+
+DEFAULT_WINDOWS = (7, 30, 90)
+# market score: days of prices behind each crop's statistics, and how the
+# components (each in [0, 1]) are weighted
+SCORE_WINDOW_DAYS = 30
+SCORE_WEIGHTS = {"level": 0.5, "trend": 0.3, "stability": 0.2}
+# a 10% rise over 30 days maps to a trend score of ~0.88; 3% daily volatility to ~0.37 stability
+TREND_SCALE = 0.1
+VOLATILITY_SCALE = 0.03
+
+
+def upsert_statement(table, keys, update_cols, increment_cols=()):
+    """
+    INSERT ... ON CONFLICT (keys) DO UPDATE for the bound database, used with
+    executemany. update_cols are overwritten; increment_cols are added to the
+    stored value (running counters).
+    """
+    dialect = db.engine.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        ins = (sqlite if dialect == "sqlite" else postgresql).insert(table)
+        set_ = {c: ins.excluded[c] for c in update_cols}
+        set_.update({c: table.c[c] + ins.excluded[c] for c in increment_cols})
+        return ins.on_conflict_do_update(index_elements=keys, set_=set_)
+    if dialect in ("mysql", "mariadb"):
+        ins = mysql.insert(table)
+        set_ = {c: ins.inserted[c] for c in update_cols}
+        set_.update({c: table.c[c] + ins.inserted[c] for c in increment_cols})
+        return ins.on_duplicate_key_update(set_)
+    raise RuntimeError(f"Upsert not supported for database dialect '{dialect}'")
+
+
+def refresh_latest_prices(crops=None):
+    """
+    Recomputes market_latest_prices for the given crops (all crops when None)
+    with one window-function query. Ties on the latest date go to the most
+    recently inserted row.
+    """
+    crops = list(crops) if crops is not None else None
+    if crops == []:
+        return 0
+    ranked = select(
+        MarketPrice.crop, MarketPrice.price, MarketPrice.date, MarketPrice.source,
+        func.row_number().over(partition_by=MarketPrice.crop,
+                               order_by=(MarketPrice.date.desc(), MarketPrice.id.desc())).label("rn"),
+    )
+    if crops is not None:
+        ranked = ranked.where(MarketPrice.crop.in_(crops))
+    ranked = ranked.subquery()
+    rows = db.session.execute(
+        select(ranked.c.crop, ranked.c.price, ranked.c.date, ranked.c.source).where(ranked.c.rn == 1)
+    ).all()
+    if rows:
+        now = datetime.datetime.utcnow()
+        stmt = upsert_statement(LatestMarketPrice.__table__, ["crop"], ["price", "date", "source", "updated_at"])
+        db.session.execute(stmt, [{"crop": r.crop, "price": r.price, "date": r.date,
+                                   "source": r.source, "updated_at": now} for r in rows])
+    db.session.commit()
+    return len(rows)
+
+
+def latest_prices(limit=20):
+    rows = LatestMarketPrice.query.order_by(LatestMarketPrice.price.desc()).limit(limit).all()
+    return [{"crop": r.crop, "price": r.price, "date": r.date.isoformat(), "source": r.source} for r in rows]
+
+
+def price_aggregates(crops, windows=DEFAULT_WINDOWS):
+    """
+    Moving averages and volatility per crop over the last N days of data.
+
+    Daily prices (mean across sources) are fetched with one GROUP BY query,
+    pivoted to a crops x days matrix and reduced with NumPy. Volatility is the
+    standard deviation of daily log returns within the window. Windows end at
+    the latest date present for any of the crops.
+    """
+    # imported here so importing market (for upsert_statement) stays cheap at boot
+    import pandas as pd
+    if not crops:
+        return {}
+    windows = sorted(set(int(w) for w in windows))
+    end = db.session.execute(
+        select(func.max(LatestMarketPrice.date)).where(LatestMarketPrice.crop.in_(crops))
+    ).scalar()
+    if end is None:
+        return {}
+    start = end - datetime.timedelta(days=windows[-1] - 1)
+    rows = db.session.execute(
+        select(MarketPrice.crop, MarketPrice.date, func.avg(MarketPrice.price))
+        .where(MarketPrice.crop.in_(crops), MarketPrice.date >= start, MarketPrice.date <= end)
+        .group_by(MarketPrice.crop, MarketPrice.date)
+    ).all()
+    if not rows:
+        return {}
+    daily = pd.DataFrame(rows, columns=["crop", "date", "price"])
+    offsets = (pd.to_datetime(daily["date"]) - pd.Timestamp(start)).dt.days.to_numpy()
+    names = sorted(daily["crop"].unique())
+    row_of = {c: i for i, c in enumerate(names)}
+    matrix = np.full((len(names), windows[-1]), np.nan)
+    matrix[daily["crop"].map(row_of).to_numpy(), offsets] = daily["price"].to_numpy(dtype=np.float64)
+    log_returns = np.diff(np.log(matrix), axis=1)
+
+    out = {c: {} for c in names}
+    with np.errstate(all="ignore"):
+        for w in windows:
+            ma = np.nanmean(matrix[:, -w:], axis=1)
+            vol = np.nanstd(log_returns[:, -(w - 1):], axis=1) if w > 1 else np.full(len(names), np.nan)
+            for c, i in row_of.items():
+                out[c][f"ma_{w}"] = None if np.isnan(ma[i]) else round(float(ma[i]), 2)
+                out[c][f"volatility_{w}"] = None if np.isnan(vol[i]) else round(float(vol[i]), 4)
+    return out
+
+
+def _crop_statistics(dates, prices):
+    """(price level, trend per 30 days, volatility) from one crop's daily prices, oldest first."""
+    logs = np.log(prices)
+    days = np.array([(d - dates[0]).days for d in dates], dtype=np.float64)
+    trend = float(np.polyfit(days, logs, 1)[0]) * 30 if len(days) > 1 else 0.0
+    returns = np.diff(logs)
+    volatility = float(returns.std()) if len(returns) > 1 else 0.0
+    return float(prices.mean()), trend, volatility
+
+
+def refresh_market_scores(crops=None, window=SCORE_WINDOW_DAYS):
+    """
+    Recomputes market_scores rows for the given crops (all crops with a latest
+    price when None) from the last `window` days of each crop's prices, with
+    one query. Called after ingestion for the crops it touched.
+    """
+    latest = select(LatestMarketPrice.crop, LatestMarketPrice.date)
+    if crops is not None:
+        crops = list(crops)
+        if not crops:
+            return 0
+        latest = latest.where(LatestMarketPrice.crop.in_(crops))
+    ends = {r.crop: r.date for r in db.session.execute(latest) if r.date is not None}
+    if not ends:
+        return 0
+    start = min(ends.values()) - datetime.timedelta(days=window - 1)
+    rows = db.session.execute(
+        select(MarketPrice.crop, MarketPrice.date, func.avg(MarketPrice.price))
+        .where(MarketPrice.crop.in_(list(ends)), MarketPrice.date >= start)
+        .group_by(MarketPrice.crop, MarketPrice.date)
+        .order_by(MarketPrice.crop, MarketPrice.date)
+    ).all()
+    series = {}
+    for crop, date, price in rows:
+        if price and price > 0 and date > ends[crop] - datetime.timedelta(days=window):
+            series.setdefault(crop, ([], []))
+            series[crop][0].append(date)
+            series[crop][1].append(price)
+    now = datetime.datetime.utcnow()
+    values = []
+    for crop, (dates, prices) in series.items():
+        level, trend, volatility = _crop_statistics(dates, np.asarray(prices, dtype=np.float64))
+        values.append({"crop": crop, "price_level": level, "trend": trend, "volatility": volatility,
+                       "days": len(dates), "as_of": ends[crop], "updated_at": now})
+    if values:
+        stmt = upsert_statement(MarketScore.__table__, ["crop"],
+                                ["price_level", "trend", "volatility", "days", "as_of", "updated_at"])
+        db.session.execute(stmt, values)
+    db.session.commit()
+    scores.invalidate()
+    return len(values)
+
+
+class MarketScores:
+    """
+    Per-crop market scores in [0, 1] built from market_scores rows: the crop's
+    price level as a percentile among all crops, its trend and its stability
+    (low volatility), combined with SCORE_WEIGHTS.
+    """
+
+    def __init__(self, rows):
+        rows = [r for r in rows if r.price_level and r.price_level > 0]
+        self.crops = [r.crop for r in rows]
+        self.index = {c.lower(): i for i, c in enumerate(self.crops)}
+        n = len(rows)
+        level = np.log([r.price_level for r in rows]) if n else np.zeros(0)
+        # percentile rank of the (log) price level; a single crop sits in the middle
+        self.level = (level.argsort().argsort() / (n - 1)) if n > 1 else np.full(n, 0.5)
+        self.trend = 0.5 + 0.5 * np.tanh(np.array([r.trend or 0.0 for r in rows]) / TREND_SCALE)
+        self.stability = np.exp(-np.array([r.volatility or 0.0 for r in rows]) / VOLATILITY_SCALE)
+        self.score = (SCORE_WEIGHTS["level"] * self.level + SCORE_WEIGHTS["trend"] * self.trend
+                      + SCORE_WEIGHTS["stability"] * self.stability)
+        self.default = float(self.score.mean()) if n else 0.5
+        self._vectors = {}
+
+    def __len__(self):
+        return len(self.crops)
+
+    def vector(self, classes):
+        """Scores aligned with a model's class order; crops without prices get the mean score."""
+        key = tuple(str(c) for c in classes)
+        vec = self._vectors.get(key)
+        if vec is None:
+            idx = [self.index.get(c.lower()) for c in key]
+            vec = np.array([self.default if i is None else self.score[i] for i in idx])
+            vec.flags.writeable = False
+            self._vectors[key] = vec
+        return vec
+
+    def to_dict(self):
+        return {c: {"score": round(float(self.score[i]), 4), "level": round(float(self.level[i]), 4),
+                    "trend": round(float(self.trend[i]), 4), "stability": round(float(self.stability[i]), 4)}
+                for i, c in enumerate(self.crops)}
+
+
+class MarketScoreCache:
+    """
+    The MarketScores table held in memory by each process and re-read from
+    the database at most every ttl seconds, so recommendations never query it
+    per request. Ingestion in this process invalidates it immediately; other
+    processes (workers, the ingester script) pick changes up within ttl.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._table = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        table = self._table
+        if table is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return table
+        with self._lock:
+            if self._table is None or time.monotonic() - self._loaded_at >= self.ttl:
+                self._table = MarketScores(MarketScore.query.all())
+                self._loaded_at = time.monotonic()
+            return self._table
+
+    def invalidate(self):
+        self._loaded_at = 0.0
+
+
+scores = MarketScoreCache(ttl=float(os.environ.get("MARKET_SCORE_TTL", 300)))
@@ -0,0 +1,122 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from ml.metrics import Counter, Gauge, Histogram, StaticFamily
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from concurrent request threads and runs them
+    through fn(list_of_items) -> list_of_results in one call.
+
+    A batch is flushed when it reaches max_batch_size or when max_wait_ms has
+    passed since its first item arrived. Each caller gets back the result at its
+    own position in the batch; if fn raises, every caller in the batch sees the
+    exception.
+    """
+
+    def __init__(self, fn, max_batch_size=16, max_wait_ms=5.0, name="batcher"):
+        self.fn = fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+        self.queue_depth = Gauge()
+        self.batches = Counter()
+        self.items = Counter()
+        self.errors = Counter()
+        self.batch_size = Histogram(buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+        self.queue_wait_seconds = Histogram()
+        self.run_seconds = Histogram()
+
+    def _ensure_worker(self):
+        # threads do not survive fork (gunicorn preload), so start per process
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((item, fut, time.perf_counter()))
+        self.queue_depth.set(self._queue.qsize())
+        return fut
+
+    def __call__(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.queue_depth.set(self._queue.qsize())
+            start = time.perf_counter()
+            for _, _, enqueued in batch:
+                self.queue_wait_seconds.observe(start - enqueued)
+            self.batches.inc()
+            self.items.inc(len(batch))
+            self.batch_size.observe(len(batch))
+            try:
+                results = self.fn([item for item, _, _ in batch])
+            except Exception as e:
+                self.errors.inc()
+                for _, fut, _ in batch:
+                    fut.set_exception(e)
+                continue
+            finally:
+                self.run_seconds.observe(time.perf_counter() - start)
+            for (_, fut, _), res in zip(batch, results):
+                fut.set_result(res)
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": self._queue.qsize(),
+            "batches": self.batches.value,
+            "items": self.items.value,
+            "errors": self.errors.value,
+            "batch_size": self.batch_size.snapshot(),
+            "queue_wait_seconds": self.queue_wait_seconds.snapshot(),
+            "run_seconds": self.run_seconds.snapshot(),
+        }
+
+    def metric_families(self):
+        """Prometheus families for this batcher (see ml.metrics.REGISTRY.register_collector)."""
+        labels = {"batcher": self.name}
+        return [
+            StaticFamily("gauge", "agrinext_batch_queue_depth", "Items waiting for a micro-batch",
+                         [(labels, self.queue_depth)]),
+            StaticFamily("counter", "agrinext_batch_errors_total", "Micro-batches whose function raised",
+                         [(labels, self.errors)]),
+            StaticFamily("histogram", "agrinext_batch_size", "Items per micro-batch", [(labels, self.batch_size)]),
+            StaticFamily("histogram", "agrinext_batch_queue_wait_seconds", "Time items waited for their batch",
+                         [(labels, self.queue_wait_seconds)]),
+            StaticFamily("histogram", "agrinext_batch_run_seconds", "Time to run one micro-batch",
+                         [(labels, self.run_seconds)]),
+        ]
@@ -1,42 +1,248 @@
+import io
 import os
+import hashlib
 import json
-from tensorflow.keras.models import load_model
-from tensorflow.keras.preprocessing import image
+import threading
+import time
 import numpy as np
+from PIL import Image
+from ml.registry import registry
+from ml.batching import MicroBatcher
+from ml.metrics import Histogram, Counter, REGISTRY, stage, record_stage
+from ml.cache import LRUCache
 
 # Paths
 BASE_DIR = os.path.dirname(__file__)
-MODEL_PATH = os.path.join(BASE_DIR, "..", "..", "models", "disease_cnn.h5")
-CLASS_MAP_PATH = os.path.join(BASE_DIR, "..", "..", "models", "class_indices.json")
+MODEL_DIR = os.environ.get("MODEL_DIR", os.path.join(BASE_DIR, "..", "..", "models"))
+MODEL_PATH = os.path.join(MODEL_DIR, "disease_cnn.h5")
+CLASS_MAP_PATH = os.path.join(MODEL_DIR, "class_indices.json")
+# quantized artifact written by export_disease_model.py
+TFLITE_PATH = os.path.join(MODEL_DIR, "disease_cnn.tflite")
+MODEL_NAME = "disease_cnn"
+IMG_SIZE = (224, 224)
 
-# Load mapping once
-if not os.path.exists(CLASS_MAP_PATH):
-    raise FileNotFoundError("Class mapping not found. Run save_class_map.py first.")
-with open(CLASS_MAP_PATH, "r") as f:
-    class_indices = json.load(f)
+# auto: use the .tflite artifact when present, else the Keras .h5; or force keras / tflite
+MODEL_RUNTIME = os.environ.get("DISEASE_MODEL_RUNTIME", "auto")
+TFLITE_THREADS = int(os.environ.get("DISEASE_TFLITE_THREADS", os.cpu_count() or 1))
+# share the .tflite weights between worker processes: the interpreter memory-maps
+# model_path, and without the default XNNPACK delegate (which repacks weights into
+# private buffers) float32/int8 weights are read straight from that mapping
+TFLITE_SHARED = os.environ.get("DISEASE_TFLITE_SHARED", "0") == "1"
 
-# Reverse the dictionary so we can go idx -> class_name
-CLASS_MAP = {v: k for k, v in class_indices.items()}
+# Concurrent requests are grouped into one forward pass; DISEASE_BATCHING=0 disables it
+BATCHING_ENABLED = os.environ.get("DISEASE_BATCHING", "1") == "1"
+BATCH_MAX_SIZE = int(os.environ.get("DISEASE_BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("DISEASE_BATCH_MAX_WAIT_MS", 5.0))
+
+# Results are cached by sha256(image bytes) + model version. With DISEASE_CACHE_PHASH=1,
+# images whose 64-bit difference hash is within DISEASE_CACHE_PHASH_DISTANCE bits of a
+# cached one (re-encoded / resized copies of the same photo) also count as hits.
+CACHE_SIZE = int(os.environ.get("DISEASE_CACHE_SIZE", 1024))
+CACHE_TTL = float(os.environ.get("DISEASE_CACHE_TTL", 3600))
+CACHE_PHASH = os.environ.get("DISEASE_CACHE_PHASH", "0") == "1"
+CACHE_PHASH_DISTANCE = int(os.environ.get("DISEASE_CACHE_PHASH_DISTANCE", 4))
+
+PREPROCESS_SECONDS = Histogram()
+
+
+class InvalidImage(ValueError):
+    """The upload could not be decoded as an image."""
+
+result_cache = LRUCache(maxsize=CACHE_SIZE, ttl=CACHE_TTL or None)
+near_duplicate_hits = Counter()
+
+def load_class_map():
+    if not os.path.exists(CLASS_MAP_PATH):
+        raise FileNotFoundError("Class mapping not found. Run save_class_map.py first.")
+    with open(CLASS_MAP_PATH, "r") as f:
+        class_indices = json.load(f)
+    # Reverse the dictionary so we can go idx -> class_name
+    return {v: k for k, v in class_indices.items()}
 
 def load_disease_model():
     if not os.path.exists(MODEL_PATH):
         raise FileNotFoundError("Disease model not found. Train it with train_disease_model.py")
+    from tensorflow.keras.models import load_model
     return load_model(MODEL_PATH)
 
-def predict_disease(img_path, top_k=3):
-    model = load_disease_model()
+class TFLiteModel:
+    """
+    Wraps a TFLite interpreter with the model.predict(x) interface used here.
+    Handles int8-quantized inputs/outputs; the interpreter is not thread-safe,
+    so invocations are serialized (the micro-batcher already runs on one thread).
+    """
+
+    def __init__(self, path, num_threads=TFLITE_THREADS, shared=TFLITE_SHARED):
+        try:
+            from tflite_runtime.interpreter import Interpreter, OpResolverType
+        except ImportError:
+            from tensorflow.lite import Interpreter
+            from tensorflow.lite.experimental import OpResolverType
+        self.path = path
+        kwargs = {}
+        if shared:
+            kwargs["experimental_op_resolver_type"] = OpResolverType.BUILTIN_WITHOUT_DEFAULT_DELEGATES
+        self.interpreter = Interpreter(model_path=path, num_threads=num_threads, **kwargs)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch = self._input["shape"][0]
+        self._lock = threading.Lock()
+
+    def predict(self, x, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        inp, out = self._input, self._output
+        if inp["dtype"] in (np.int8, np.uint8):
+            scale, zero = inp["quantization"]
+            x = np.clip(np.round(x / scale + zero), np.iinfo(inp["dtype"]).min,
+                        np.iinfo(inp["dtype"]).max).astype(inp["dtype"])
+        with self._lock:
+            if x.shape[0] != self._batch:
+                self.interpreter.resize_tensor_input(inp["index"], list(x.shape))
+                self.interpreter.allocate_tensors()
+                self._output = out = self.interpreter.get_output_details()[0]
+                self._batch = x.shape[0]
+            self.interpreter.set_tensor(inp["index"], x)
+            self.interpreter.invoke()
+            y = self.interpreter.get_tensor(out["index"])
+        if out["dtype"] in (np.int8, np.uint8):
+            scale, zero = out["quantization"]
+            y = (y.astype(np.float32) - zero) * scale
+        return y
+
+def load_inference_model(runtime=None):
+    """Picks the serving artifact according to DISEASE_MODEL_RUNTIME."""
+    runtime = runtime or MODEL_RUNTIME
+    if runtime == "tflite" or (runtime == "auto" and os.path.exists(TFLITE_PATH)):
+        if not os.path.exists(TFLITE_PATH):
+            raise FileNotFoundError("TFLite model not found. Create it with export_disease_model.py")
+        return TFLiteModel(TFLITE_PATH)
+    return load_disease_model()
+
+def _load_bundle():
+    # model and class map are swapped together so a reload never pairs
+    # a new model with a stale class mapping
+    return load_inference_model(), load_class_map()
+
+registry.register(MODEL_NAME, _load_bundle, watch_paths=[MODEL_PATH, TFLITE_PATH, CLASS_MAP_PATH])
+
+def _on_model_reload(name, version):
+    if name == MODEL_NAME:
+        result_cache.clear()
+
+registry.on_reload(_on_model_reload)
+
+def get_disease_model():
+    """Returns the shared (model, class_map) pair, loading it on first use."""
+    return registry.get(MODEL_NAME)
+
+def preprocess_image(source):
+    """
+    source is a file path, raw image bytes or a file-like object (e.g. the
+    upload stream). Returns a (224,224,3) float32 array scaled to [0, 1].
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    try:
+        with Image.open(source) as img:
+            # JPEG only: let libjpeg decode at the smallest 1/2, 1/4 or 1/8 scale
+            # that is still >= 224x224 instead of decoding full-size camera photos
+            img.draft("RGB", IMG_SIZE)
+            # nearest matches keras load_img, which the model was trained with
+            img = img.convert("RGB").resize(IMG_SIZE, Image.NEAREST)
+            return np.asarray(img, dtype=np.float32) / 255.0
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # unknown format, truncated data, oversized image ...
+        raise InvalidImage(str(e)) from e
+
+def predict_batch(arrays):
+    """
+    Runs one forward pass over a list of preprocessed (224,224,3) arrays.
+    Returns a (probabilities, class_map) pair per input.
+    """
+    model, class_map = get_disease_model()
+    with stage("disease.forward"):
+        preds = model.predict(np.stack(arrays), verbose=0)
+    return [(p, class_map) for p in preds]
+
+batcher = MicroBatcher(predict_batch, max_batch_size=BATCH_MAX_SIZE,
+                       max_wait_ms=BATCH_MAX_WAIT_MS, name="disease-batcher")
+REGISTRY.register_collector(batcher.metric_families)
+REGISTRY.register_cache("disease_results", result_cache)
+
+def batching_stats():
+    stats = batcher.stats()
+    stats["enabled"] = BATCHING_ENABLED
+    stats["preprocess_seconds"] = PREPROCESS_SECONDS.snapshot()
+    return stats
+
+def cache_stats():
+    stats = result_cache.stats()
+    stats["phash_enabled"] = CACHE_PHASH
+    stats["near_duplicate_hits"] = near_duplicate_hits.value
+    return stats
+
+def image_dhash(x):
+    """64-bit difference hash of a preprocessed (224,224,3) array."""
+    gray = Image.fromarray((x * 255).astype(np.uint8)).convert("L").resize((9, 8), Image.BILINEAR)
+    px = np.asarray(gray, dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def _find_near_duplicate(phash, version):
+    for entry in result_cache.values():
+        if entry["version"] == version and entry["phash"] is not None \
+                and bin(entry["phash"] ^ phash).count("1") <= CACHE_PHASH_DISTANCE:
+            return entry
+    return None
+
+def _infer(x):
+    if BATCHING_ENABLED:
+        return batcher(x)
+    return predict_batch([x])[0]
+
+def predict_disease(img, top_k=3):
+    """img is a file path, image bytes or a file-like object. InvalidImage if it does not decode."""
+    if isinstance(img, str):
+        with open(img, "rb") as f:
+            img = f.read()
+    elif not isinstance(img, (bytes, bytearray, memoryview)):
+        img = img.read()
+
+    # make sure the model is current before keying on its version
+    get_disease_model()
+    version = registry.version(MODEL_NAME)
+    key = (hashlib.sha256(img).hexdigest(), version)
+    entry = result_cache.get(key)
+
+    if entry is None:
+        # Preprocess image
+        start = time.perf_counter()
+        x = preprocess_image(img)
+        elapsed = time.perf_counter() - start
+        PREPROCESS_SECONDS.observe(elapsed)
+        record_stage("disease.preprocess", elapsed)
+
+        phash = image_dhash(x) if CACHE_PHASH else None
+        if phash is not None:
+            entry = _find_near_duplicate(phash, version)
+            if entry is not None:
+                near_duplicate_hits.inc()
 
-    # Preprocess image
-    img = image.load_img(img_path, target_size=(224,224))
-    x = image.img_to_array(img)/255.0
-    x = np.expand_dims(x, axis=0)
+        if entry is None:
+            # Predict (includes time queued for a micro-batch)
+            with stage("disease.inference"):
+                preds, class_map = _infer(x)
+            entry = {"preds": preds, "class_map": class_map, "phash": phash, "version": version}
+        # skip caching if the model was swapped while this request was in flight
+        if registry.version(MODEL_NAME) == version:
+            result_cache.put(key, entry)
 
-    # Predict
-    preds = model.predict(x)[0]
+    preds, class_map = entry["preds"], entry["class_map"]
     idxs = np.argsort(preds)[::-1][:top_k]
 
     result = []
     for idx in idxs:
-        cls = CLASS_MAP.get(idx, f"class_{idx}")   # Use real class name
+        cls = class_map.get(idx, f"class_{idx}")   # Use real class name
         result.append({"class": cls, "prob": float(preds[idx])})
     return result
@@ -0,0 +1,115 @@
+"""
+Exports disease_cnn.h5 to a TFLite artifact for CPU-only serving and compares
+it against the original on the held-out PlantVillage validation split.
+
+    python backend/ml/export_disease_model.py [--mode float16|int8|dynamic] [--eval-samples 2000]
+
+Writes models/disease_cnn.tflite (picked up by disease_detector when present)
+and models/disease_export_report.json with accuracy, latency and size for both.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ml.disease_detector import MODEL_PATH, TFLITE_PATH, TFLiteModel  # noqa: E402
+from ml.train_disease_model import DATA_DIR, class_indices, split_files, make_dataset  # noqa: E402
+
+REPORT_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "models", "disease_export_report.json")
+
+
+def validation_batches(limit, batch_size=32):
+    """(images, labels) batches from the validation split training holds out."""
+    indices = class_indices(DATA_DIR)
+    _, (paths, labels) = split_files(DATA_DIR, indices)
+    # files are grouped by class: take an evenly spaced subset so every class is represented
+    pick = np.unique(np.linspace(0, len(paths) - 1, min(limit, len(paths))).astype(int))
+    ds = make_dataset([paths[i] for i in pick], [labels[i] for i in pick], len(indices),
+                      training=False, batch_size=batch_size)
+    for x, y in ds.as_numpy_iterator():
+        yield x.astype(np.float32), np.argmax(y, axis=1)
+
+
+def convert(model, mode, calibration_samples=200):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if mode == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif mode == "int8":
+        def representative():
+            for x, _ in validation_batches(calibration_samples, batch_size=1):
+                yield [x]
+        converter.representative_dataset = representative
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    # "dynamic": int8 weights, float activations (DEFAULT optimizations only)
+    return converter.convert()
+
+
+def evaluate(predict, limit):
+    correct = total = 0
+    latencies = []
+    for x, y in validation_batches(limit):
+        for i in range(len(x)):
+            # batch of one, like a single /api/detect_disease request
+            t = time.perf_counter()
+            p = predict(x[i:i + 1])
+            latencies.append(time.perf_counter() - t)
+            correct += int(np.argmax(p[0]) == y[i])
+            total += 1
+    lat = np.array(latencies) * 1000
+    return {
+        "samples": total,
+        "accuracy": correct / total if total else None,
+        "latency_ms_p50": float(np.percentile(lat, 50)) if total else None,
+        "latency_ms_p95": float(np.percentile(lat, 95)) if total else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--mode", choices=["float16", "int8", "dynamic"], default="float16")
+    ap.add_argument("--eval-samples", type=int, default=2000)
+    ap.add_argument("--skip-eval", action="store_true")
+    args = ap.parse_args()
+
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError("Disease model not found. Train it with train_disease_model.py")
+    model = tf.keras.models.load_model(MODEL_PATH)
+    start = time.perf_counter()
+    flatbuffer = convert(model, args.mode)
+    tmp = TFLITE_PATH + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(flatbuffer)
+    # atomic swap so a running server's registry never loads a partial file
+    os.replace(tmp, TFLITE_PATH)
+    print(f"Saved {args.mode} TFLite model to {TFLITE_PATH} ({time.perf_counter() - start:.1f}s)")
+
+    report = {
+        "mode": args.mode,
+        "keras": {"path": MODEL_PATH, "size_bytes": os.path.getsize(MODEL_PATH)},
+        "tflite": {"path": TFLITE_PATH, "size_bytes": os.path.getsize(TFLITE_PATH)},
+    }
+    if not args.skip_eval and os.path.exists(DATA_DIR):
+        report["keras"].update(evaluate(lambda x: model(x, training=False).numpy(), args.eval_samples))
+        report["tflite"].update(evaluate(TFLiteModel(TFLITE_PATH).predict, args.eval_samples))
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'':8}{'size MB':>10}{'accuracy':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name in ("keras", "tflite"):
+        r = report[name]
+        acc, p50, p95 = r.get("accuracy"), r.get("latency_ms_p50"), r.get("latency_ms_p95")
+        print(f"{name:8}{r['size_bytes'] / 1e6:>10.1f}"
+              f"{acc if acc is not None else float('nan'):>10.4f}"
+              f"{p50 if p50 is not None else float('nan'):>10.1f}"
+              f"{p95 if p95 is not None else float('nan'):>10.1f}")
+    print("Report written to", REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Exports crop_recommender.pkl to the flat, memory-mapped forest format
+(models/crop_recommender.forest/) and checks it against the pickle.
+
+    python backend/ml/export_recommender.py [--samples 5000]
+
+train_recommender.py already exports after training; this is for existing
+models. With RECOMMENDER_RUNTIME=auto (default) the app serves the export
+whenever it matches crop_recommender.pkl.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import load
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ml import forest  # noqa: E402
+from ml.recommender import DEFAULT_MODEL_FILE, FEATURES, FOREST_DIR, class_names  # noqa: E402
+
+
+def _timed(fn, *args, repeat=20):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(*args)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--samples", type=int, default=5000)
+    args = ap.parse_args()
+
+    start = time.perf_counter()
+    pipeline = load(DEFAULT_MODEL_FILE)
+    pickle_load = time.perf_counter() - start
+    meta = forest.export_forest(pipeline, FOREST_DIR, class_names(pipeline), source=DEFAULT_MODEL_FILE)
+    start = time.perf_counter()
+    flat = forest.load_forest(FOREST_DIR)
+    flat_load = time.perf_counter() - start
+
+    # inputs spread around the training distribution
+    scaler = pipeline.named_steps["preprocessor"].transformers_[0][1].named_steps["scaler"]
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(scaler.mean_ + rng.standard_normal((args.samples, len(FEATURES))) * scaler.scale_,
+                     columns=FEATURES)
+    expected = pipeline.predict_proba(X)
+    got = flat.predict_proba(X)
+    print(f"Exported {meta['nodes']} nodes of {len(meta['roots'])} trees to {FOREST_DIR} "
+          f"({flat.nbytes / 1e6:.1f}MB)")
+    print(f"Max probability difference {np.abs(expected - got).max():.2e}, "
+          f"top-1 agreement {(expected.argmax(1) == got.argmax(1)).mean():.4%}")
+    print(f"Load: pickle {pickle_load:.3f}s, flat {flat_load * 1000:.2f}ms")
+    one = X.iloc[:1]
+    print(f"Single row: pickle {_timed(pipeline.predict_proba, one):.2f}ms, flat {_timed(flat.predict_proba, one):.2f}ms")
+    print(f"Batch of {len(X)}: pickle {_timed(pipeline.predict_proba, X, repeat=3):.1f}ms, "
+          f"flat {_timed(flat.predict_proba, X, repeat=3):.1f}ms")
@@ -0,0 +1,176 @@
+# backend/ml/fertilizer.py
+import json
+import os
+
+import numpy as np
+
+from ml.metrics import stage
+from ml.registry import registry
+
+BASE_DIR = os.path.dirname(__file__)
+# per-crop target ranges; "default" applies to unknown crops and fills missing nutrients
+TARGETS_PATH = os.environ.get("FERTILIZER_TARGETS", os.path.join(BASE_DIR, "fertilizer_targets.json"))
+RULES_NAME = "fertilizer_rules"
+
+NUTRIENTS = ("N", "P", "K", "pH")
+LOW, OK, HIGH = -1, 0, 1
+STATUS_NAMES = {LOW: "low", OK: "ok", HIGH: "high"}
+UNITS = {"N": " kg/ha", "P": " kg/ha", "K": " kg/ha", "pH": ""}
+# (nutrient, status) -> (finding, action)
+MESSAGES = {
+    ("N", LOW): ("Nitrogen is low", "apply urea or another nitrogen-rich fertilizer."),
+    ("N", HIGH): ("Nitrogen is high", "skip nitrogen fertilizer this season."),
+    ("P", LOW): ("Phosphorus is low", "apply DAP or single super phosphate."),
+    ("P", HIGH): ("Phosphorus is high", "avoid phosphate fertilizers."),
+    ("K", LOW): ("Potassium is low", "apply muriate of potash (MOP)."),
+    ("K", HIGH): ("Potassium is high", "avoid potash fertilizers."),
+    ("pH", LOW): ("Soil is acidic", "apply agricultural lime."),
+    ("pH", HIGH): ("Soil is alkaline", "apply gypsum or organic matter."),
+}
+BALANCED = "Soil nutrients are balanced%s: maintain with compost or farmyard manure."
+
+# a row's statuses packed into one integer in [0, 3**4): the key of its advice
+_PATTERN_WEIGHTS = 3 ** np.arange(len(NUTRIENTS))
+PATTERNS = 3 ** len(NUTRIENTS)
+_ALL_OK = int((_PATTERN_WEIGHTS * (OK + 1)).sum())
+_PATTERN_STATUS = [tuple(int(p // w % 3) - 1 for w in _PATTERN_WEIGHTS) for p in range(PATTERNS)]
+_STATUS_DICTS = [{n: STATUS_NAMES[s] for n, s in zip(NUTRIENTS, st)} for st in _PATTERN_STATUS]
+
+
+class FertilizerRules:
+    """
+    Target ranges compiled into (crops x nutrients) low/high arrays; row 0 is
+    the default table. A sample is low/ok/high per nutrient against its crop's
+    row, so a batch is evaluated with two array comparisons. The advice text
+    depends only on the crop and the resulting status pattern, so it is built
+    for every (crop, pattern) pair at load time and looked up afterwards.
+    """
+
+    def __init__(self, targets):
+        targets = {str(c).strip().lower(): spec for c, spec in targets.items()}
+        default = targets.pop("default", None) or {}
+        missing = [n for n in NUTRIENTS if n not in default]
+        if missing:
+            raise ValueError("Default fertilizer targets lack %s" % ", ".join(missing))
+        self.crops = ["default"] + sorted(targets)
+        self.crop_idx = {c: i for i, c in enumerate(self.crops)}
+        specs = [default] + [targets[c] for c in self.crops[1:]]
+        table = np.array([[spec.get(n, default[n]) for n in NUTRIENTS] for spec in specs], dtype=np.float64)
+        self.low = np.ascontiguousarray(table[:, :, 0])
+        self.high = np.ascontiguousarray(table[:, :, 1])
+        bad = np.argwhere(self.low > self.high)
+        if len(bad):
+            c, n = bad[0]
+            raise ValueError("Fertilizer target for %s %s has low > high" % (self.crops[c], NUTRIENTS[n]))
+        # plain tuples for single samples, where NumPy call overhead would dominate
+        self._low_rows = [tuple(r) for r in self.low.tolist()]
+        self._high_rows = [tuple(r) for r in self.high.tolist()]
+        # flat table: advice for crop row c and pattern p is at c * PATTERNS + p
+        self._advice = [self._build(c, statuses, self.crops[c] if c else None)
+                        for c in range(len(self.crops)) for statuses in _PATTERN_STATUS]
+        # one compiled comparison function per crop row for single samples
+        self._evaluators = [_row_evaluator(lo, hi, self._advice, c * PATTERNS)
+                            for c, (lo, hi) in enumerate(zip(self._low_rows, self._high_rows))]
+
+    def crop_index(self, crop):
+        return self.crop_idx.get(str(crop).strip().lower(), 0) if crop else 0
+
+    def status_matrix(self, X, crop_idx):
+        """(n, 4) int8 array of LOW/OK/HIGH for samples X (N, P, K, pH columns)."""
+        return (X > self.high[crop_idx]).astype(np.int8) - (X < self.low[crop_idx])
+
+    def advice(self, crop_i, pattern, crop=None):
+        """Advice lines for a crop row and status pattern."""
+        if crop and not crop_i and pattern == _ALL_OK:
+            # the only line that mentions a crop name not in the table
+            return (BALANCED % (" for " + str(crop)),)
+        return self._advice[crop_i * PATTERNS + pattern]
+
+    def _build(self, crop_i, statuses, label):
+        lines = []
+        for j, (nutrient, status) in enumerate(zip(NUTRIENTS, statuses)):
+            if status == OK:
+                continue
+            finding, action = MESSAGES[nutrient, status]
+            if crop_i:
+                finding += " for %s (target %g-%g%s)" % (label, self.low[crop_i, j], self.high[crop_i, j],
+                                                          UNITS[nutrient])
+            lines.append("%s: %s" % (finding, action))
+        if not lines:
+            lines.append(BALANCED % (" for " + label if label else ""))
+        return tuple(lines)
+
+    def advise(self, n, p, k, ph, crop=None):
+        crop_i = self.crop_idx.get(str(crop).strip().lower(), 0) if crop else 0
+        advice = self._evaluators[crop_i](n, p, k, ph)
+        if crop and not crop_i and advice is self._advice[_ALL_OK]:
+            return self.advice(0, _ALL_OK, crop)
+        return advice
+
+    def advise_matrix(self, X, crops=None):
+        """
+        X is an (n, 4) array of N, P, K, pH; crops a sequence of n crop names
+        (or None). Returns (advice, patterns): one tuple of lines per row and
+        the rows' status patterns.
+        """
+        X = np.asarray(X, dtype=np.float64).reshape(-1, len(NUTRIENTS))
+        if crops is None:
+            crop_i = np.zeros(len(X), dtype=np.intp)
+        else:
+            names = {c: self.crop_index(c) for c in set(crops)}
+            crop_i = np.fromiter(map(names.__getitem__, crops), dtype=np.intp, count=len(crops))
+        with stage("fertilizer.evaluate"):
+            patterns = (self.status_matrix(X, crop_i) + 1) @ _PATTERN_WEIGHTS
+            keys = crop_i * PATTERNS + patterns
+        table = self._advice
+        advice = [table[k] for k in keys.tolist()]
+        if crops is not None:
+            for i in np.flatnonzero((crop_i == 0) & (patterns == _ALL_OK)).tolist():
+                if crops[i]:
+                    advice[i] = self.advice(0, _ALL_OK, crops[i])
+        return advice, patterns
+
+
+def _row_evaluator(lo, hi, table, base):
+    """
+    advise(n, p, k, ph) against one crop's targets, with the bounds held as
+    closure constants so a sample costs four pairs of comparisons. Each
+    nutrient adds its status times its pattern weight to the row's offset.
+    """
+    lo_n, lo_p, lo_k, lo_ph = lo
+    hi_n, hi_p, hi_k, hi_ph = hi
+
+    def advise(n, p, k, ph):
+        return table[base + (2 if n > hi_n else 0 if n < lo_n else 1)
+                     + (6 if p > hi_p else 0 if p < lo_p else 3)
+                     + (18 if k > hi_k else 0 if k < lo_k else 9)
+                     + (54 if ph > hi_ph else 0 if ph < lo_ph else 27)]
+    return advise
+
+
+def load_rules(path=TARGETS_PATH):
+    with open(path, encoding="utf-8") as f:
+        return FertilizerRules(json.load(f))
+
+
+registry.register(RULES_NAME, load_rules, watch_paths=[TARGETS_PATH])
+
+
+def get_rules():
+    return registry.get(RULES_NAME)
+
+
+def fertilizer_advice(n, p, k, ph, crop=None):
+    """Advice lines for one sample, against the crop's targets (defaults for unknown crops)."""
+    return registry.get(RULES_NAME).advise(n, p, k, ph, crop)
+
+
+def advise_batch(X, crops=None):
+    """
+    Advice for many samples in one pass. X is an (n, 4) array of N, P, K, pH;
+    returns a list of {"crop", "status", "advice"} dicts.
+    """
+    advice, patterns = get_rules().advise_matrix(X, crops)
+    crops = crops if crops is not None else [None] * len(advice)
+    return [{"crop": c, "status": _STATUS_DICTS[p], "advice": a}
+            for c, p, a in zip(crops, patterns.tolist(), advice)]
@@ -0,0 +1,178 @@
+# backend/ml/forest.py
+"""
+Flat, memory-mapped form of the crop recommender's random forest.
+
+A pickled scikit-learn forest cannot be shared between processes: every
+tree copies its node arrays into private memory on unpickling, even with
+joblib's mmap_mode. Here all trees are concatenated into a handful of plain
+.npy arrays that are opened with np.load(mmap_mode="r"), so every worker on
+a host maps the same page-cache pages, and prediction walks all trees at
+once with NumPy indexing.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+ARRAYS = ("feature", "threshold", "children", "proba")
+META_FILE = "meta.json"
+# rows per traversal chunk: bounds the (rows x trees x classes) leaf gather
+CHUNK_ROWS = 1024
+
+
+def _signature(path):
+    st = os.stat(path)
+    return [st.st_mtime_ns, st.st_size]
+
+
+class FlatForest:
+    """
+    predict_proba-compatible view over flat forest arrays. Node ids are global
+    and children[2 * node + went_left] is the next node; leaves point at
+    themselves. Inputs are scaled like the pipeline's StandardScaler and cast
+    to float32 as scikit-learn does; thresholds are stored as the largest
+    float32 not above the original float64 threshold, so every comparison and
+    therefore every prediction matches the pipeline exactly.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.features = meta["features"]
+        self.crop_classes_ = np.array(meta["classes"])
+        self.roots = np.asarray(meta["roots"], dtype=np.int32)
+        self.depth = int(meta["depth"])
+        self.mean = np.asarray(meta["scaler_mean"], dtype=np.float64)
+        self.scale = np.asarray(meta["scaler_scale"], dtype=np.float64)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in ARRAYS)
+
+    def apply(self, Xs):
+        """Leaf id per (row, tree) for scaled float32 rows Xs."""
+        n, width = Xs.shape
+        pairs = n * self.n_trees
+        node = np.tile(self.roots, n)
+        base = np.repeat(np.arange(n, dtype=np.int32) * width, self.n_trees)
+        flat = Xs.ravel()
+        leaves = np.empty(pairs, dtype=np.int32)
+        pending = np.arange(pairs)
+        # (row, tree) pairs that reached a leaf are dropped, so each step only
+        # touches the pairs still descending
+        for _ in range(self.depth + 1):
+            went_left = flat[base + self.feature[node]] <= self.threshold[node]
+            nxt = self.children[2 * node + went_left]
+            done = nxt == node
+            if done.any():
+                leaves[pending[done]] = node[done]
+                keep = ~done
+                node, base, pending = nxt[keep], base[keep], pending[keep]
+                if not len(node):
+                    break
+            else:
+                node = nxt
+        return leaves.reshape(n, self.n_trees)
+
+    def predict_proba(self, X):
+        if hasattr(X, "columns"):
+            X = X[self.features]
+        X = np.asarray(X, dtype=np.float64)
+        # NaN would silently take every right branch; reject it as scikit-learn does
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity.")
+        Xs = ((X - self.mean) / self.scale).astype(np.float32)
+        out = np.empty((len(Xs), self.proba.shape[1]), dtype=np.float64)
+        for start in range(0, len(Xs), CHUNK_ROWS):
+            leaves = self.apply(Xs[start:start + CHUNK_ROWS])
+            out[start:start + CHUNK_ROWS] = self.proba[leaves].sum(axis=1, dtype=np.float64) / self.n_trees
+        return out
+
+
+def export_forest(pipeline, path, classes, source=None):
+    """
+    Writes the pipeline (StandardScaler + RandomForest/ExtraTrees classifier)
+    as flat arrays into directory `path`. meta.json is written last and
+    records the source model file's signature, so a stale export is detected.
+    """
+    clf = pipeline.named_steps["classifier"]
+    if not hasattr(clf, "estimators_") or not all(hasattr(t, "tree_") for t in clf.estimators_):
+        raise ValueError("Only scikit-learn tree forests can be flattened, got %s" % type(clf).__name__)
+    prep = pipeline.named_steps["preprocessor"]
+    name, transformer, columns = prep.transformers_[0]
+    scaler = transformer.named_steps["scaler"]
+
+    feature, threshold, children, proba, roots = [], [], [], [], []
+    offset, depth = 0, 0
+    for est in clf.estimators_:
+        tree = est.tree_
+        ids = np.arange(tree.node_count, dtype=np.int64) + offset
+        leaf = tree.children_left < 0
+        roots.append(offset)
+        feature.append(np.where(leaf, 0, tree.feature).astype(np.int32))
+        thr = tree.threshold.astype(np.float32)
+        above = thr.astype(np.float64) > tree.threshold
+        thr[above] = np.nextafter(thr[above], np.float32(-np.inf))
+        threshold.append(thr)
+        # (right, left) pairs: indexed by 2 * node + went_left
+        children.append(np.column_stack([np.where(leaf, ids, tree.children_right + offset),
+                                         np.where(leaf, ids, tree.children_left + offset)]).astype(np.int32))
+        values = tree.value[:, 0, :].astype(np.float64)
+        proba.append((values / values.sum(axis=1, keepdims=True)).astype(np.float32))
+        offset += tree.node_count
+        depth = max(depth, tree.max_depth)
+    if 2 * offset >= np.iinfo(np.int32).max:
+        raise ValueError("Forest too large for int32 node ids")
+
+    arrays = {"feature": np.concatenate(feature), "threshold": np.concatenate(threshold),
+              "children": np.concatenate(children).ravel(), "proba": np.concatenate(proba)}
+    os.makedirs(path, exist_ok=True)
+    # new files per export: readers only see them once meta.json points at them
+    stamp = "%d-%d" % (time.time() * 1000, os.getpid())
+    files = {key: "%s-%s.npy" % (key, stamp) for key in arrays}
+    for key, arr in arrays.items():
+        np.save(os.path.join(path, files[key]), np.ascontiguousarray(arr))
+    meta = {
+        "files": files,
+        "features": list(columns),
+        "classes": [str(c) for c in classes],
+        "roots": roots,
+        "depth": depth,
+        "scaler_mean": scaler.mean_.tolist(),
+        "scaler_scale": scaler.scale_.tolist(),
+        "nodes": offset,
+        "source": _signature(source) if source else None,
+        "exported_at": time.time(),
+    }
+    tmp = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, META_FILE))
+    for name in os.listdir(path):
+        if name.endswith(".npy") and name not in files.values():
+            # processes that mapped an old file keep their (unlinked) copy
+            os.remove(os.path.join(path, name))
+    return meta
+
+
+def load_forest(path, mmap=True):
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {key: np.load(os.path.join(path, meta["files"][key]), mmap_mode="r" if mmap else None)
+              for key in ARRAYS}
+    return FlatForest(arrays, meta)
+
+
+def is_current(path, source):
+    """True when the export in path was made from the current source model file."""
+    try:
+        with open(os.path.join(path, META_FILE)) as f:
+            return json.load(f).get("source") == _signature(source)
+    except (OSError, ValueError):
+        return False
@@ -0,0 +1,233 @@
+import contextlib
+import contextvars
+import threading
+import time
+
+# default latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+
+class Gauge:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def set(self, v):
+        self.value = v
+
+    def inc(self, n=1):
+        with self._lock:
+            self.value += n
+
+    def dec(self, n=1):
+        with self._lock:
+            self.value -= n
+
+
+class Histogram:
+    """Fixed-bucket histogram; bucket counts are non-cumulative internally."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, v):
+        i = 0
+        while i < len(self.buckets) and v > self.buckets[i]:
+            i += 1
+        with self._lock:
+            self._counts[i] += 1
+            self.sum += v
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, s = self.count, self.sum
+        cumulative, running = [], 0
+        for le, c in zip(self.buckets + (float("inf"),), counts):
+            running += c
+            cumulative.append((le, running))
+        return {"buckets": cumulative, "sum": s, "count": total}
+
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+class MetricFamily:
+    """One named metric with label dimensions; labels(...) returns the child for a label set."""
+
+    def __init__(self, kind, name, help, labelnames=(), **kwargs):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._kwargs = kwargs
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, _KINDS[self.kind](**self._kwargs))
+        return child
+
+    def samples(self):
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels, extra=None):
+    items = list(labels.items()) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join('%s="%s"' % (k, _escape(v)) for k, v in items) + "}"
+
+
+def _number(v):
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class MetricsRegistry:
+    """
+    Process-wide metric families plus collectors evaluated at scrape time
+    (for state that already lives elsewhere, e.g. cache hit counters).
+    expose() renders the Prometheus text format.
+    """
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def _family(self, kind, name, help, labels, **kwargs):
+        with self._lock:
+            if name not in self._families:
+                self._families[name] = MetricFamily(kind, name, help, labels, **kwargs)
+            return self._families[name]
+
+    def counter(self, name, help, labels=()):
+        return self._family("counter", name, help, labels)
+
+    def gauge(self, name, help, labels=()):
+        return self._family("gauge", name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._family("histogram", name, help, labels, buckets=buckets)
+
+    def register_collector(self, fn):
+        """fn() returns MetricFamily-like objects (kind, name, help, samples()) built on the fly."""
+        self._collectors.append(fn)
+        return fn
+
+    def register_cache(self, name, cache):
+        """Exposes a cache's stats() hits/misses/evictions/size as agrinext_cache_*{cache=name}."""
+        self._caches[name] = cache
+
+    def _cache_families(self):
+        stats = {name: c.stats() for name, c in list(self._caches.items())}
+        for metric, key, kind in (("hits_total", "hits", "counter"), ("misses_total", "misses", "counter"),
+                                  ("evictions_total", "evictions", "counter"), ("entries", "size", "gauge")):
+            yield StaticFamily(kind, "agrinext_cache_" + metric, "Cache " + key,
+                               [({"cache": name}, s.get(key) or 0) for name, s in stats.items()])
+
+    def collect(self):
+        families = list(self._families.values())
+        if self._caches:
+            families.extend(self._cache_families())
+        for fn in self._collectors:
+            try:
+                families.extend(fn())
+            except Exception:
+                # a broken collector must not take the whole endpoint down
+                continue
+        return families
+
+    def expose(self):
+        lines = []
+        for fam in self.collect():
+            lines.append("# HELP %s %s" % (fam.name, fam.help))
+            lines.append("# TYPE %s %s" % (fam.name, fam.kind))
+            for labels, child in fam.samples():
+                if fam.kind == "histogram":
+                    snap = child.snapshot()
+                    for le, count in snap["buckets"]:
+                        lines.append("%s_bucket%s %d" % (fam.name, _labels(labels, {"le": _number(le)}), count))
+                    lines.append("%s_sum%s %s" % (fam.name, _labels(labels), _number(snap["sum"])))
+                    lines.append("%s_count%s %d" % (fam.name, _labels(labels), snap["count"]))
+                else:
+                    value = child.value if hasattr(child, "value") else child
+                    lines.append("%s%s %s" % (fam.name, _labels(labels), _number(value)))
+        return "\n".join(lines) + "\n"
+
+
+class StaticFamily(MetricFamily):
+    """Family whose samples are given up front; used by scrape-time collectors."""
+
+    def __init__(self, kind, name, help, samples):
+        super().__init__(kind, name, help)
+        self._samples = samples
+
+    def samples(self):
+        return self._samples
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "agrinext_stage_seconds", "Time spent in named processing stages (model load, preprocessing, inference...)",
+    ["stage"])
+
+# per-request stage totals, set by the web layer while a request is being handled
+_request_stages = contextvars.ContextVar("request_stages", default=None)
+
+
+def begin_stage_collection():
+    return _request_stages.set({})
+
+
+def end_stage_collection(token):
+    stages = _request_stages.get()
+    _request_stages.reset(token)
+    return stages or {}
+
+
+def record_stage(name, seconds):
+    STAGE_SECONDS.labels(name).observe(seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Times a block into agrinext_stage_seconds{stage=name} and the current request's breakdown."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
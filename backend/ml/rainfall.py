@@ -1,8 +1,18 @@
 # backend/ml/rainfall.py
-import pandas as pd
+import os
 from datetime import datetime
+import numpy as np
+import pandas as pd
+from ml.registry import registry
+from ml.metrics import stage
 
-df = pd.read_csv('..\data\Sub_Division_IMD_2017.csv')  # keep your path
+BASE_DIR = os.path.dirname(__file__)
+DATA_PATH = os.environ.get("RAINFALL_CSV", os.path.join(BASE_DIR, "..", "..", "data", "Sub_Division_IMD_2017.csv"))
+# compact per-region/per-period statistics, rebuilt whenever the CSV changes
+INDEX_PATH = os.environ.get("RAINFALL_INDEX", os.path.join(BASE_DIR, "..", "..", "data", "rainfall_index.npz"))
+INDEX_NAME = "rainfall_index"
+# trend is the least-squares slope over the most recent TREND_YEARS years
+TREND_YEARS = 30
 
 month_map = {1:'JAN', 2:'FEB', 3:'MAR', 4:'APR', 5:'MAY', 6:'JUN',
              7:'JUL', 8:'AUG', 9:'SEP', 10:'OCT', 11:'NOV', 12:'DEC'}
@@ -14,25 +24,148 @@ season_months = {
     'Post-Monsoon': [10, 11]
 }
 
-def predict_rainfall(region: str):
-    df_region = df[df['SUBDIVISION'] == region].copy()
-    if df_region.empty:
-        return {"error": f"No data found for region '{region}'"}
+# every queryable period: the four seasons, then the twelve months
+PERIODS = list(season_months) + [month_map[m] for m in range(1, 13)]
+PERIOD_MONTHS = {**season_months, **{month_map[m]: [m] for m in range(1, 13)}}
+STATS = ["mean", "median", "p10", "p25", "p75", "p90", "min", "max", "trend_mm_per_year", "years"]
+
+
+class RainfallIndex:
+    """stats[region_idx, period_idx, stat_idx] lookup table."""
+
+    def __init__(self, regions, stats):
+        self.regions = list(regions)
+        self.stats = stats
+        self.region_idx = {r: i for i, r in enumerate(self.regions)}
+        self.period_idx = {p: i for i, p in enumerate(PERIODS)}
+
+    def lookup(self, region, period):
+        row = self.stats[self.region_idx[region], self.period_idx[period]]
+        return dict(zip(STATS, row.tolist()))
+
+
+def _trend(years, totals):
+    recent = years >= years.max() - TREND_YEARS + 1
+    if recent.sum() < 2:
+        return 0.0
+    return float(np.polyfit(years[recent], totals[recent], 1)[0])
+
+
+def build_index(csv_path=DATA_PATH):
+    df = pd.read_csv(csv_path, usecols=["SUBDIVISION", "YEAR"] + list(month_map.values()))
+    regions = sorted(df["SUBDIVISION"].dropna().unique())
+    stats = np.zeros((len(regions), len(PERIODS), len(STATS)), dtype=np.float64)
+    month_cols = [month_map[m] for m in range(1, 13)]
+    for r_i, (region, g) in enumerate(df.groupby("SUBDIVISION", sort=True)):
+        years = g["YEAR"].to_numpy(dtype=np.float64)
+        monthly = g[month_cols].to_numpy(dtype=np.float64)
+        for p_i, period in enumerate(PERIODS):
+            # missing months count as 0, as the original pandas row sum did
+            totals = np.nansum(monthly[:, [m - 1 for m in PERIOD_MONTHS[period]]], axis=1)
+            p10, p25, p75, p90 = np.percentile(totals, [10, 25, 75, 90])
+            stats[r_i, p_i] = [totals.mean(), np.median(totals), p10, p25, p75, p90,
+                               totals.min(), totals.max(), _trend(years, totals), len(totals)]
+    return RainfallIndex(regions, stats)
+
+
+def _source_signature(csv_path):
+    st = os.stat(csv_path)
+    return np.array([st.st_mtime_ns, st.st_size], dtype=np.int64)
+
 
+def load_index(csv_path=DATA_PATH, index_path=INDEX_PATH):
+    """Loads the cached index file if it matches the CSV, otherwise rebuilds and rewrites it."""
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"Rainfall data not found at {csv_path}")
+    signature = _source_signature(csv_path)
+    if os.path.exists(index_path):
+        try:
+            with np.load(index_path, allow_pickle=False) as z:
+                if np.array_equal(z["source"], signature) and list(z["periods"]) == PERIODS \
+                        and list(z["stat_names"]) == STATS:
+                    return RainfallIndex(z["regions"].tolist(), z["stats"])
+        except (OSError, KeyError, ValueError):
+            pass
+    index = build_index(csv_path)
+    try:
+        tmp = index_path + ".tmp.npz"
+        np.savez_compressed(tmp, regions=np.array(index.regions), stats=index.stats,
+                            periods=np.array(PERIODS), stat_names=np.array(STATS), source=signature)
+        os.replace(tmp, index_path)
+    except OSError:
+        # read-only data dir: keep the in-memory index
+        pass
+    return index
+
+
+registry.register(INDEX_NAME, load_index, watch_paths=[DATA_PATH])
+
+
+def current_season():
     current_month = datetime.now().month
     if current_month in [2,5,9,11]:
-        current_month += 1 
+        current_month += 1
     for season, months in season_months.items():
         if current_month in months:
-            current_season = season
-            break
-
-    season_columns = [month_map[m] for m in season_months[current_season]]
-    df_region['SeasonTotal'] = df_region[season_columns].sum(axis=1)
-    average_rainfall = df_region['SeasonTotal'].mean()
-
-    return {
-        "region": region,
-        "season": current_season,
-        "average_rainfall_mm": round(average_rainfall, 2)
-    }
+            return season
+
+
+def _resolve_period(season=None, month=None):
+    if month is not None:
+        if isinstance(month, str) and not month.isdigit():
+            name = month.strip().upper()[:3]
+            if name not in PERIOD_MONTHS:
+                raise ValueError(f"Unknown month '{month}'")
+            return name
+        try:
+            m = int(month)
+        except (TypeError, ValueError):
+            raise ValueError(f"Month must be 1-12 or a month name, got {month!r}")
+        if m not in month_map:
+            raise ValueError(f"Month must be 1-12, got {month}")
+        return month_map[m]
+    if season is not None:
+        for name in season_months:
+            if name.lower() == str(season).strip().lower():
+                return name
+        raise ValueError(f"Unknown season '{season}', expected one of {list(season_months)}")
+    return current_season()
+
+
+class RainfallUnavailable(RuntimeError):
+    """The IMD data (or its index) could not be loaded; callers answer 503."""
+
+
+def predict_rainfall_many(regions, season=None, month=None):
+    try:
+        period = _resolve_period(season, month)
+    except (TypeError, ValueError) as e:
+        return [{"region": r, "error": str(e)} for r in regions]
+    try:
+        index = registry.get(INDEX_NAME)
+    except Exception as e:
+        raise RainfallUnavailable(f"Rainfall data unavailable: {e}") from e
+    out = []
+    with stage("rainfall.lookup"):
+        for region in regions:
+            if region not in index.region_idx:
+                out.append({"error": f"No data found for region '{region}'"})
+                continue
+            s = index.lookup(region, period)
+            res = {"region": region}
+            if period in season_months:
+                res["season"] = period
+            else:
+                res["month"] = period
+            res["average_rainfall_mm"] = round(s["mean"], 2)
+            res["median_mm"] = round(s["median"], 2)
+            res["percentiles_mm"] = {k: round(s[k], 2) for k in ("p10", "p25", "p75", "p90")}
+            res["range_mm"] = [round(s["min"], 2), round(s["max"], 2)]
+            res["trend_mm_per_year"] = round(s["trend_mm_per_year"], 3)
+            res["years"] = int(s["years"])
+            out.append(res)
+    return out
+
+
+def predict_rainfall(region: str, season=None, month=None):
+    return predict_rainfall_many([region], season=season, month=month)[0]
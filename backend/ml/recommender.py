@@ -1,21 +1,147 @@
 import os
+import json
+import time
+import pickle
+import shutil
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
+import sklearn
 from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import StandardScaler, OneHotEncoder
+from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from joblib import dump, load
+from ml.registry import registry
+from ml.metrics import stage
+from ml import forest
 
-MODELPATH = os.path.join(os.path.dirname(__file__), "..", "..", "models")
+MODELPATH = os.environ.get("MODEL_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "models"))
 DEFAULT_MODEL_FILE = os.path.join(MODELPATH, "crop_recommender.pkl")
 PIPE_FILE = os.path.join(MODELPATH, "recommender_pipeline.pkl")
+METADATA_FILE = os.path.join(MODELPATH, "crop_recommender.json")
+# flat memory-mapped export of the forest (ml/forest.py), shared by all workers on a host
+FOREST_DIR = os.path.join(MODELPATH, "crop_recommender.forest")
+MODEL_NAME = "crop_recommender"
+# auto: the flat export when it matches crop_recommender.pkl, else the pickle; or force sklearn / flat
+MODEL_RUNTIME = os.environ.get("RECOMMENDER_RUNTIME", "auto")
 
-def train_recommender(npk_csv_path, target_column="best_crop"):
+FEATURES = ["N", "P", "K", "pH", "temp", "humidity", "rainfall"]
+# used for missing inputs when scoring
+FEATURE_DEFAULTS = {"N": 0.0, "P": 0.0, "K": 0.0, "pH": 7.0, "temp": 25.0, "humidity": 60.0, "rainfall": 0.0}
+
+
+def build_pipeline(n_estimators=200, classifier=None):
+    numeric_transformer = Pipeline(steps=[("scaler", StandardScaler())])
+    preprocessor = ColumnTransformer(
+        transformers=[("num", numeric_transformer, FEATURES)]
+    )
+    if classifier is None:
+        classifier = RandomForestClassifier(n_estimators=n_estimators, random_state=42, n_jobs=-1)
+    return Pipeline(
+        steps=[
+            ("preprocessor", preprocessor),
+            ("classifier", classifier),
+        ]
+    )
+
+# hyperparameter grid for train_recommender(search=True)
+SEARCH_SPACE = {
+    "rf": [{"n_estimators": n, "max_depth": d, "min_samples_leaf": leaf}
+           for n in (50, 100, 200) for d in (None, 16) for leaf in (1, 2)],
+    "xgb": [{"n_estimators": n, "max_depth": d, "learning_rate": lr}
+            for n in (100, 300) for d in (4, 6) for lr in (0.1, 0.3)],
+}
+
+def _make_classifier(kind, params, n_jobs=1):
+    if kind == "rf":
+        return RandomForestClassifier(random_state=42, n_jobs=n_jobs, **params)
+    from xgboost import XGBClassifier
+    return XGBClassifier(random_state=42, n_jobs=n_jobs, tree_method="hist", **params)
+
+def _serving_cost(clf, X_sample):
+    """(pickled size in bytes, ms per single-row call, ms per row in a batch)."""
+    size = len(pickle.dumps(clf, protocol=pickle.HIGHEST_PROTOCOL))
+    one = X_sample.iloc[:1]
+    clf.predict_proba(one)
+    start = time.perf_counter()
+    for _ in range(20):
+        clf.predict_proba(one)
+    single_ms = (time.perf_counter() - start) / 20 * 1000
+    start = time.perf_counter()
+    clf.predict_proba(X_sample)
+    batch_ms = (time.perf_counter() - start) / len(X_sample) * 1000
+    return size, single_ms, batch_ms
+
+def _evaluate_candidate(kind, params, X, y, cv):
+    """Runs in a worker process: CV accuracy plus serving cost of one fit."""
+    from sklearn.model_selection import cross_val_score
+    clf = build_pipeline(classifier=_make_classifier(kind, params))
+    scores = cross_val_score(clf, X, y, cv=cv, scoring="accuracy", n_jobs=1)
+    clf.fit(X, y)
+    size, single_ms, batch_ms = _serving_cost(clf, X.iloc[:1000])
+    return {"kind": kind, "params": params, "cv_accuracy": float(scores.mean()),
+            "cv_std": float(scores.std()), "size_bytes": size,
+            "single_row_ms": single_ms, "batch_row_ms": batch_ms}
+
+def search_candidates(X, y, cv=5, n_jobs=None, kinds=("rf", "xgb")):
+    """Cross-validates every grid point in parallel worker processes."""
+    jobs = []
+    for kind in kinds:
+        if kind == "xgb":
+            try:
+                import xgboost  # noqa: F401
+            except ImportError:
+                print("xgboost not installed, skipping XGBoost candidates")
+                continue
+        jobs += [(kind, params) for params in SEARCH_SPACE[kind]]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(_evaluate_candidate, kind, params, X, y, cv) for kind, params in jobs]
+        return [f.result() for f in futures]
+
+def select_candidate(results, max_accuracy_drop=0.005):
+    """
+    Among candidates within max_accuracy_drop of the best CV accuracy, pick the
+    cheapest to serve: fastest single-row scoring, then smallest artifact.
+    """
+    best = max(r["cv_accuracy"] for r in results)
+    eligible = [r for r in results if r["cv_accuracy"] >= best - max_accuracy_drop]
+    return min(eligible, key=lambda r: (round(r["single_row_ms"], 2), r["size_bytes"]))
+
+def save_artifact(clf, metadata, compress=3):
+    """
+    Writes a compressed, versioned copy (crop_recommender-<version>.pkl plus
+    .json metadata) and atomically replaces crop_recommender.pkl, which the
+    model registry hot-reloads. Tree forests are also exported flat for
+    memory-mapped serving.
+    """
+    os.makedirs(MODELPATH, exist_ok=True)
+    version = metadata["version"]
+    versioned = os.path.join(MODELPATH, f"crop_recommender-{version}.pkl")
+    dump(clf, versioned, compress=compress)
+    with open(os.path.join(MODELPATH, f"crop_recommender-{version}.json"), "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    tmp = DEFAULT_MODEL_FILE + ".tmp"
+    shutil.copyfile(versioned, tmp)
+    try:
+        # os.replace keeps the file's signature, so the export matches the final pickle
+        forest.export_forest(clf, FOREST_DIR, class_names(clf), source=tmp)
+    except ValueError as e:
+        print("Not exporting a flat forest:", e)
+    os.replace(tmp, DEFAULT_MODEL_FILE)
+    with open(METADATA_FILE, "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    return versioned
+
+def train_recommender(npk_csv_path, target_column="best_crop", search=False, n_jobs=None, cv=5,
+                      max_accuracy_drop=0.005):
     """
     Train a RandomForest classifier on the provided CSV.
     CSV must include N,P,K,pH,temp,humidity,rainfall,best_crop target.
+    With search=True, RandomForest and XGBoost grids are cross-validated in
+    parallel and the cheapest-to-serve model near the best accuracy is kept.
     """
     df = pd.read_csv(npk_csv_path)
 
@@ -23,35 +149,38 @@ def train_recommender(npk_csv_path, target_column="best_crop"):
     df = df.dropna(subset=[target_column, "N", "P", "K", "pH"])
 
     # features and target
-    numeric_features = ["N", "P", "K", "pH", "temp", "humidity", "rainfall"]
+    numeric_features = FEATURES
     for col in numeric_features:
         if col not in df.columns:
             df[col] = 0.0
 
     X = df[numeric_features]
     y = df[target_column].astype(str)
+    # XGBoost needs integer labels; crop names are restored via crop_classes_
+    encoder = LabelEncoder().fit(y)
+    y_enc = encoder.transform(y)
 
     # split
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.15, random_state=42, stratify=y
+        X, y_enc, test_size=0.15, random_state=42, stratify=y_enc
     )
 
     # preprocessing + model
-    numeric_transformer = Pipeline(steps=[("scaler", StandardScaler())])
-    preprocessor = ColumnTransformer(
-        transformers=[("num", numeric_transformer, numeric_features)]
-    )
-    clf = Pipeline(
-        steps=[
-            ("preprocessor", preprocessor),
-            ("classifier", RandomForestClassifier(
-                n_estimators=200, random_state=42, n_jobs=-1
-            )),
-        ]
-    )
+    chosen = {"kind": "rf", "params": {"n_estimators": 200}}
+    if search:
+        start = time.perf_counter()
+        results = search_candidates(X_train, y_train, cv=cv, n_jobs=n_jobs)
+        chosen = select_candidate(results, max_accuracy_drop)
+        print(f"\n=== Search: {len(results)} candidates in {time.perf_counter() - start:.1f}s ===")
+        for r in sorted(results, key=lambda r: -r["cv_accuracy"])[:10]:
+            print(f"{r['kind']:4} {r['params']} acc={r['cv_accuracy']:.4f} "
+                  f"size={r['size_bytes'] / 1e6:.1f}MB row={r['single_row_ms']:.2f}ms")
+        print("Selected:", chosen["kind"], chosen["params"])
+    clf = build_pipeline(classifier=_make_classifier(chosen["kind"], chosen["params"], n_jobs=-1))
 
     # fit
     clf.fit(X_train, y_train)
+    clf.crop_classes_ = encoder.classes_
 
     # --- EVALUATION PATCH ---
     from sklearn.metrics import accuracy_score, classification_report
@@ -59,37 +188,159 @@ def train_recommender(npk_csv_path, target_column="best_crop"):
     acc = accuracy_score(y_test, y_pred)
     print("\n=== Evaluation Results ===")
     print(f"Accuracy on test set: {acc:.4f}")
-    print("Classification report:\n", classification_report(y_test, y_pred))
+    print("Classification report:\n", classification_report(
+        y_test, y_pred, labels=range(len(encoder.classes_)), target_names=encoder.classes_))
     # --- END PATCH ---
 
     # persist pipeline (contains preprocessing + model)
-    os.makedirs(MODELPATH, exist_ok=True)
-    dump(clf, DEFAULT_MODEL_FILE)
-    print("Saved model to", DEFAULT_MODEL_FILE)
+    with open(npk_csv_path, "rb") as f:
+        data_hash = hashlib.sha256(f.read()).hexdigest()
+    metadata = {
+        "version": time.strftime("%Y%m%d%H%M%S", time.gmtime()) + "-" + data_hash[:8],
+        "features": FEATURES,
+        "classes": encoder.classes_.tolist(),
+        "model": chosen["kind"],
+        "params": chosen["params"],
+        "cv_accuracy": chosen.get("cv_accuracy"),
+        "test_accuracy": acc,
+        "training_rows": len(X_train),
+        "training_data_sha256": data_hash,
+        "sklearn_version": sklearn.__version__,
+    }
+    path = save_artifact(clf, metadata)
+
+    # serving cost of the saved artifact
+    start = time.perf_counter()
+    loaded = load(DEFAULT_MODEL_FILE)
+    load_seconds = time.perf_counter() - start
+    _, single_ms, batch_ms = _serving_cost(loaded, X_test)
+    metadata.update({"artifact_bytes": os.path.getsize(DEFAULT_MODEL_FILE), "load_seconds": load_seconds,
+                     "single_row_ms": single_ms, "batch_row_ms": batch_ms})
+    with open(METADATA_FILE, "w") as f:
+        json.dump(metadata, f, indent=2, default=str)
+    print("Saved model to", DEFAULT_MODEL_FILE, "(version %s, copy at %s)" % (metadata["version"], path))
+    print(f"Artifact {metadata['artifact_bytes'] / 1e6:.1f}MB, load {load_seconds:.2f}s, "
+          f"{single_ms:.2f}ms per single-row call, {batch_ms * 1000:.1f}us per row batched")
 
     return clf
 
 
-def load_model():
+def load_model(runtime=None):
+    """The pickled pipeline, or its memory-mapped flat forest (see RECOMMENDER_RUNTIME)."""
+    runtime = runtime or MODEL_RUNTIME
+    if runtime == "flat" or (runtime == "auto" and forest.is_current(FOREST_DIR, DEFAULT_MODEL_FILE)):
+        if not os.path.exists(os.path.join(FOREST_DIR, forest.META_FILE)):
+            raise FileNotFoundError(f"Flat forest not found at {FOREST_DIR}. Create it with export_recommender.py")
+        return forest.load_forest(FOREST_DIR)
     if os.path.exists(DEFAULT_MODEL_FILE):
         return load(DEFAULT_MODEL_FILE)
     else:
         raise FileNotFoundError(f"Model not found at {DEFAULT_MODEL_FILE}. Train it first with train_recommender.py")
 
-def predict_recommendation(input_dict):
+registry.register(MODEL_NAME, load_model,
+                  watch_paths=[DEFAULT_MODEL_FILE, os.path.join(FOREST_DIR, forest.META_FILE)])
+
+def get_model():
+    """Returns the shared pipeline, loading it on first use."""
+    return registry.get(MODEL_NAME)
+
+def class_names(model):
+    """Crop names in predict_proba column order (label-encoded models keep them in crop_classes_)."""
+    names = getattr(model, "crop_classes_", None)
+    return names if names is not None else model.named_steps["classifier"].classes_
+
+def to_feature_matrix(samples):
     """
-    input_dict must contain N,P,K,pH,temp,humidity,rainfall,market_score optional
-    Returns predicted crop and top-n probabilities.
+    Converts a list of input dicts (or a DataFrame) into an (n, 7) float array
+    in FEATURES order, filling missing values with FEATURE_DEFAULTS.
     """
-    model = load_model()
-    df = pd.DataFrame([input_dict])
-    # ensure columns
-    for col in ["N", "P", "K", "pH", "temp", "humidity", "rainfall"]:
-        if col not in df.columns:
-            df[col] = 0.0
-    preds = model.predict(df)
-    probs = model.predict_proba(df)
-    classes = model.named_steps["classifier"].classes_
-    top_indices = np.argsort(probs[0])[::-1]
-    ranked = [{"crop": classes[i], "prob": float(probs[0][i])} for i in top_indices]
-    return {"prediction": preds[0], "ranking": ranked}
+    if isinstance(samples, pd.DataFrame):
+        df = samples.reindex(columns=FEATURES)
+        for col in FEATURES:
+            df[col] = pd.to_numeric(df[col], errors="raise").fillna(FEATURE_DEFAULTS[col])
+        return df.to_numpy(dtype=np.float64)
+    X = np.empty((len(samples), len(FEATURES)), dtype=np.float64)
+    for i, s in enumerate(samples):
+        for j, col in enumerate(FEATURES):
+            v = s.get(col)
+            X[i, j] = FEATURE_DEFAULTS[col] if v is None else float(v)
+    return X
+
+def fuse_market(probs, classes, market, weight):
+    """
+    Profit-aware scores: each class probability scaled by 1 + weight * (2m - 1),
+    where m in [0, 1] is the crop's market score, so weight is the largest
+    relative boost or penalty and agronomically unsuitable crops stay unlikely.
+    Returns (scores, per-class market vector).
+    """
+    vec = market.vector(classes)
+    return probs * (1.0 + weight * (2.0 * vec - 1.0)), vec
+
+def _rank(X, top_k=None, model=None, market=None, market_weight=0.0):
+    model = model or get_model()
+    with stage("recommender.frame"):
+        # the ColumnTransformer selects columns by name, so wrap the array without copying
+        frame = pd.DataFrame(X, columns=FEATURES, copy=False)
+    with stage("recommender.predict_proba"):
+        probs = model.predict_proba(frame)
+    with stage("recommender.rank"):
+        classes = np.asarray(class_names(model))
+        scores, vec = probs, None
+        if market is not None and market_weight > 0:
+            scores, vec = fuse_market(probs, classes, market, market_weight)
+        k = scores.shape[1] if not top_k else min(int(top_k), scores.shape[1])
+        if k < scores.shape[1]:
+            top = np.argpartition(scores, -k, axis=1)[:, -k:]
+            order = np.argsort(np.take_along_axis(scores, top, axis=1), axis=1)[:, ::-1]
+            top = np.take_along_axis(top, order, axis=1)
+        else:
+            top = np.argsort(scores, axis=1)[:, ::-1]
+        return (classes[top], np.take_along_axis(probs, top, axis=1),
+                None if vec is None else np.take_along_axis(scores, top, axis=1),
+                None if vec is None else vec[top])
+
+def rank_matrix(X, top_k=None, model=None, market=None, market_weight=0.0):
+    """
+    Scores an (n, 7) feature matrix with one predict_proba call and returns
+    (crops, probs): (n, k) arrays of crop names and probabilities, best first.
+    With a market score table (market.MarketScores) and market_weight > 0 the
+    order follows fuse_market instead of the raw probabilities.
+    """
+    crops, probs, _, _ = _rank(X, top_k, model, market, market_weight)
+    return crops, probs
+
+def score_matrix(X, top_k=None, model=None, market=None, market_weight=0.0):
+    """
+    Scores an (n, 7) feature matrix with one predict_proba call.
+    Returns one {"prediction", "ranking"} dict per row, ranking cut to top_k;
+    market-aware rankings also carry each crop's market_score and fused score.
+    """
+    crops, probs, fused, vec = _rank(X, top_k, model, market, market_weight)
+    results = []
+    for i, (row_crops, row_probs) in enumerate(zip(crops, probs)):
+        ranked = [{"crop": str(c), "prob": float(p)} for c, p in zip(row_crops, row_probs)]
+        if fused is not None:
+            for r, s, m in zip(ranked, fused[i].tolist(), vec[i].tolist()):
+                r["market_score"] = round(m, 4)
+                r["score"] = s
+        results.append({"prediction": ranked[0]["crop"], "ranking": ranked})
+    return results
+
+def predict_recommendation_batch(samples, top_k=None, model=None, market=None, market_weight=0.0):
+    """
+    samples is a list of input dicts (same keys as predict_recommendation) or a DataFrame.
+    All rows are scored in a single vectorized call.
+    """
+    if len(samples) == 0:
+        return []
+    with stage("recommender.features"):
+        X = to_feature_matrix(samples)
+    return score_matrix(X, top_k=top_k, model=model, market=market, market_weight=market_weight)
+
+def predict_recommendation(input_dict, top_k=None, market=None, market_weight=0.0):
+    """
+    input_dict must contain N,P,K,pH,temp,humidity,rainfall
+    Returns predicted crop and top-n probabilities (re-ranked by market scores when given).
+    """
+    return predict_recommendation_batch([input_dict], top_k=top_k, market=market,
+                                        market_weight=market_weight)[0]
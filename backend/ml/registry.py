@@ -0,0 +1,171 @@
+import os
+import threading
+import time
+import zlib
+
+from ml.metrics import record_stage
+
+
+def _rss_bytes():
+    # resident set size of this process (Linux only, None elsewhere)
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _file_signature(paths):
+    sig = []
+    for p in paths:
+        try:
+            st = os.stat(p)
+            sig.append((p, st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append((p, None, None))
+    return tuple(sig)
+
+
+class _Entry:
+    def __init__(self, name, loader, watch_paths):
+        self.name = name
+        self.loader = loader
+        # a callable is re-evaluated on every check (e.g. a glob, so new files are noticed)
+        self._watch = watch_paths if callable(watch_paths) else list(watch_paths)
+        self.lock = threading.Lock()
+        self.value = None
+        self.signature = None
+        self.version = 0
+        self.loads = 0
+        self.load_seconds = None
+        self.rss_delta_bytes = None
+        self.loaded_at = None
+        self.last_used = None
+        self.last_checked = 0.0
+        self.last_error = None
+
+    @property
+    def watch_paths(self):
+        return list(self._watch()) if callable(self._watch) else self._watch
+
+
+class ModelRegistry:
+    """
+    Holds one instance of each registered model per process.
+    Models are loaded lazily on first get() (or eagerly via warm_up()) and shared
+    across threads. When any watched file changes on disk, the first get() that
+    notices it reloads the model and swaps it in atomically; concurrent requests
+    keep using the old instance until the new one is fully loaded.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.check_interval = check_interval
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._reload_callbacks = []
+
+    def register(self, name, loader, watch_paths=()):
+        with self._lock:
+            if name not in self._entries:
+                self._entries[name] = _Entry(name, loader, watch_paths)
+        return self._entries[name]
+
+    def on_reload(self, callback):
+        """callback(name, version) is invoked after a model is (re)loaded."""
+        self._reload_callbacks.append(callback)
+
+    def _load(self, entry):
+        signature = _file_signature(entry.watch_paths)
+        rss_before = _rss_bytes()
+        start = time.perf_counter()
+        try:
+            value = entry.loader()
+        except Exception as e:
+            entry.last_error = str(e)
+            raise
+        entry.load_seconds = time.perf_counter() - start
+        record_stage("model_load." + entry.name, entry.load_seconds)
+        rss_after = _rss_bytes()
+        if rss_before is not None and rss_after is not None:
+            entry.rss_delta_bytes = rss_after - rss_before
+        # single reference assignment: readers see either the old or the new model
+        entry.value = value
+        entry.signature = signature
+        entry.version += 1
+        entry.loads += 1
+        entry.loaded_at = entry.last_used = time.time()
+        entry.last_error = None
+        for cb in self._reload_callbacks:
+            cb(entry.name, entry.version)
+
+    def _stale(self, entry):
+        # last_used is refreshed with each file check, so it is accurate to check_interval
+        now = time.monotonic()
+        if now - entry.last_checked < self.check_interval:
+            return False
+        entry.last_checked = now
+        entry.last_used = time.time()
+        return _file_signature(entry.watch_paths) != entry.signature
+
+    def get(self, name):
+        entry = self._entries[name]
+        value = entry.value
+        if value is not None and time.monotonic() - entry.last_checked < self.check_interval:
+            # per-sample callers (fertilizer advice) come through here on every call
+            return value
+        if value is None:
+            with entry.lock:
+                if entry.value is None:
+                    self._load(entry)
+        elif self._stale(entry) and entry.lock.acquire(blocking=False):
+            # only one thread reloads; the others keep serving the current model
+            try:
+                if _file_signature(entry.watch_paths) != entry.signature:
+                    try:
+                        self._load(entry)
+                    except Exception:
+                        # half-written files etc.: keep the old model, retry on next check
+                        pass
+            finally:
+                entry.lock.release()
+        return entry.value
+
+    def version(self, name):
+        """Identifier of the currently loaded artifact, changes on every reload."""
+        entry = self._entries[name]
+        return "%s:%d:%08x" % (name, entry.version, zlib.crc32(repr(entry.signature).encode()))
+
+    def reload(self, name):
+        entry = self._entries[name]
+        with entry.lock:
+            self._load(entry)
+        return entry.value
+
+    def warm_up(self, names=None):
+        """Load models up front (e.g. at worker start). Missing artifacts are reported, not raised."""
+        errors = {}
+        for name in names or list(self._entries):
+            try:
+                self.get(name)
+            except Exception as e:
+                errors[name] = str(e)
+        return errors
+
+    def stats(self):
+        out = {}
+        for name, e in self._entries.items():
+            out[name] = {
+                "loaded": e.value is not None,
+                "version": e.version,
+                "loads": e.loads,
+                "load_seconds": e.load_seconds,
+                "rss_delta_bytes": e.rss_delta_bytes,
+                "loaded_at": e.loaded_at,
+                "last_used": e.last_used,
+                "last_error": e.last_error,
+                "files": [{"path": p, "mtime_ns": m, "size": s} for p, m, s in (e.signature or ())],
+            }
+        return out
+
+
+registry = ModelRegistry(check_interval=float(os.environ.get("MODEL_RELOAD_CHECK_SECONDS", 5.0)))
@@ -1,11 +1,23 @@
 import os
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
+import json
+import argparse
+import random
+import time
+import tensorflow as tf
 from tensorflow.keras import layers, models, optimizers
 from tensorflow.keras.callbacks import ModelCheckpoint
 
 DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "plantvillage")
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "models", "disease_cnn.h5")
 CLASS_MAP_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "models", "class_indices.json")
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "data", "tfdata_cache")
+
+IMG_SIZE = (224, 224)
+BATCH_SIZE = 32
+VALIDATION_SPLIT = 0.15
+SEED = 42
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+AUTOTUNE = tf.data.AUTOTUNE
 
 def build_model(num_classes):
     model = models.Sequential([
@@ -24,20 +36,197 @@ def build_model(num_classes):
     model.compile(optimizer=optimizers.Adam(1e-4), loss="categorical_crossentropy", metrics=["accuracy"])
     return model
 
-def train():
-    if not os.path.exists(DATA_DIR):
-        raise FileNotFoundError("Download PlantVillage dataset and put under data/plantvillage/")
-    datagen = ImageDataGenerator(rescale=1./255, validation_split=0.15,
+def class_indices(data_dir=DATA_DIR):
+    """Class name -> index from the sorted class folder names (same order flow_from_directory used)."""
+    classes = sorted(e.name for e in os.scandir(data_dir) if e.is_dir())
+    return {c: i for i, c in enumerate(classes)}
+
+def write_class_map(indices, path=CLASS_MAP_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(indices, f)
+    os.replace(path + ".tmp", path)
+
+def split_files(data_dir, indices, validation_split=VALIDATION_SPLIT):
+    """
+    (paths, labels) for training and validation. Like ImageDataGenerator's
+    validation_split, the first fraction of each class's sorted files is
+    held out, so the split is deterministic and matches earlier models.
+    """
+    train, val = ([], []), ([], [])
+    for cls, idx in indices.items():
+        folder = os.path.join(data_dir, cls)
+        files = sorted(f for f in os.listdir(folder) if f.lower().endswith(IMAGE_EXTENSIONS))
+        n_val = int(validation_split * len(files))
+        for i, f in enumerate(files):
+            target = val if i < n_val else train
+            target[0].append(os.path.join(folder, f))
+            target[1].append(idx)
+    return train, val
+
+def _shuffled(paths, labels, seed=SEED):
+    """
+    (paths, labels) in one seeded random order. split_files groups them by
+    class, and the shuffle buffer after decoding only mixes ~2048 neighbours,
+    so without this each batch would hold one to three classes.
+    """
+    pairs = list(zip(paths, labels))
+    random.Random(seed).shuffle(pairs)
+    return [p for p, _ in pairs], [y for _, y in pairs]
+
+def _decode(path, label):
+    img = tf.io.decode_image(tf.io.read_file(path), channels=3, expand_animations=False)
+    # nearest matches the keras image loading used before (and at inference)
+    img = tf.image.resize(img, IMG_SIZE, method="nearest")
+    return tf.cast(img, tf.uint8), label
+
+def _augmenter():
+    return tf.keras.Sequential([
+        layers.RandomFlip("horizontal", seed=SEED),
+        layers.RandomRotation(20 / 360, seed=SEED),
+        layers.RandomTranslation(0.1, 0.1, seed=SEED),
+    ])
+
+def _finish(ds, num_classes, training, batch_size):
+    """uint8 (image, label) pairs -> shuffled, batched, scaled, augmented, prefetched."""
+    if training:
+        ds = ds.shuffle(2048, seed=SEED, reshuffle_each_iteration=True)
+    ds = ds.batch(batch_size)
+    augment = _augmenter() if training else None
+
+    def prepare(x, y):
+        x = tf.cast(x, tf.float32) / 255.0
+        if augment is not None:
+            x = augment(x, training=True)
+        return x, tf.one_hot(y, num_classes)
+
+    return ds.map(prepare, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+def make_dataset(paths, labels, num_classes, training, batch_size=BATCH_SIZE, cache=None):
+    """
+    Parallel decode/resize of image files. Decoded uint8 images are cached
+    (cache="" in memory, a path prefix on disk, None to skip) so epochs after
+    the first skip JPEG decoding entirely. Training files are shuffled once up
+    front; the buffer in _finish reshuffles them each epoch.
+    """
+    if training:
+        paths, labels = _shuffled(paths, labels)
+    ds = tf.data.Dataset.from_tensor_slices((list(paths), list(labels)))
+    ds = ds.map(_decode, num_parallel_calls=AUTOTUNE, deterministic=not training)
+    if cache is not None:
+        ds = ds.cache(cache)
+    return _finish(ds, num_classes, training, batch_size)
+
+def _tfrecord_example(img, label):
+    return tf.train.Example(features=tf.train.Features(feature={
+        "image": tf.train.Feature(bytes_list=tf.train.BytesList(value=[img.tobytes()])),
+        "label": tf.train.Feature(int64_list=tf.train.Int64List(value=[int(label)])),
+    })).SerializeToString()
+
+def export_tfrecords(paths, labels, out_dir, prefix, shards=16):
+    """Writes pre-resized raw uint8 images, in shuffled order, into sharded TFRecord files."""
+    os.makedirs(out_dir, exist_ok=True)
+    paths, labels = _shuffled(paths, labels)
+    ds = tf.data.Dataset.from_tensor_slices((list(paths), list(labels))).map(_decode, num_parallel_calls=AUTOTUNE)
+    writers = [tf.io.TFRecordWriter(os.path.join(out_dir, f"{prefix}-{i:05d}-of-{shards:05d}.tfrecord"))
+               for i in range(shards)]
+    for i, (img, label) in enumerate(ds.as_numpy_iterator()):
+        writers[i % shards].write(_tfrecord_example(img, label))
+    for w in writers:
+        w.close()
+
+def tfrecord_dataset(out_dir, prefix, num_classes, training, batch_size=BATCH_SIZE):
+    files = tf.data.Dataset.list_files(os.path.join(out_dir, f"{prefix}-*.tfrecord"), shuffle=training, seed=SEED)
+    spec = {"image": tf.io.FixedLenFeature([], tf.string), "label": tf.io.FixedLenFeature([], tf.int64)}
+
+    def parse(record):
+        ex = tf.io.parse_single_example(record, spec)
+        img = tf.reshape(tf.io.decode_raw(ex["image"], tf.uint8), IMG_SIZE + (3,))
+        return img, tf.cast(ex["label"], tf.int32)
+
+    ds = files.interleave(tf.data.TFRecordDataset, num_parallel_calls=AUTOTUNE, deterministic=not training)
+    ds = ds.map(parse, num_parallel_calls=AUTOTUNE)
+    return _finish(ds, num_classes, training, batch_size)
+
+def datasets(data_dir=DATA_DIR, batch_size=BATCH_SIZE, cache_dir=CACHE_DIR, tfrecord_dir=None):
+    """Returns (train_ds, val_ds, class_indices); reads TFRecords when tfrecord_dir is given."""
+    if tfrecord_dir:
+        with open(os.path.join(tfrecord_dir, "class_indices.json")) as f:
+            indices = json.load(f)
+        n = len(indices)
+        return (tfrecord_dataset(tfrecord_dir, "train", n, True, batch_size),
+                tfrecord_dataset(tfrecord_dir, "val", n, False, batch_size), indices)
+    indices = class_indices(data_dir)
+    (tp, tl), (vp, vl) = split_files(data_dir, indices)
+    n = len(indices)
+    train_cache = val_cache = None
+    if cache_dir is not None:
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        train_cache = os.path.join(cache_dir, "train") if cache_dir else ""
+        val_cache = os.path.join(cache_dir, "val") if cache_dir else ""
+    return (make_dataset(tp, tl, n, True, batch_size, train_cache),
+            make_dataset(vp, vl, n, False, batch_size, val_cache), indices)
+
+def benchmark(batches=50, batch_size=BATCH_SIZE, data_dir=DATA_DIR, tfrecord_dir=None):
+    """Images/sec of the input pipelines alone (no training), old generator vs tf.data."""
+    from tensorflow.keras.preprocessing.image import ImageDataGenerator
+    results = {}
+    datagen = ImageDataGenerator(rescale=1./255, validation_split=VALIDATION_SPLIT,
                                  rotation_range=20, width_shift_range=0.1, height_shift_range=0.1,
                                  horizontal_flip=True)
-    train_gen = datagen.flow_from_directory(DATA_DIR, target_size=(224,224), batch_size=32, class_mode="categorical", subset="training")
-    val_gen = datagen.flow_from_directory(DATA_DIR, target_size=(224,224), batch_size=32, class_mode="categorical", subset="validation")
-    num_classes = train_gen.num_classes
+    gen = datagen.flow_from_directory(data_dir, target_size=IMG_SIZE, batch_size=batch_size,
+                                      class_mode="categorical", subset="training")
+    start = time.perf_counter()
+    for _ in range(batches):
+        next(gen)
+    results["image_data_generator"] = batches * batch_size / (time.perf_counter() - start)
+
+    train_ds, _, _ = datasets(data_dir, batch_size, cache_dir=None, tfrecord_dir=tfrecord_dir)
+    start = time.perf_counter()
+    for _ in train_ds.take(batches):
+        pass
+    key = "tf_data_tfrecord" if tfrecord_dir else "tf_data"
+    results[key] = batches * batch_size / (time.perf_counter() - start)
+    for name, rate in results.items():
+        print(f"{name:22} {rate:8.1f} images/sec")
+    return results
+
+def train(epochs=12, batch_size=BATCH_SIZE, cache_dir=CACHE_DIR, tfrecord_dir=None):
+    if not tfrecord_dir and not os.path.exists(DATA_DIR):
+        raise FileNotFoundError("Download PlantVillage dataset and put under data/plantvillage/")
+    train_ds, val_ds, indices = datasets(DATA_DIR, batch_size, cache_dir, tfrecord_dir)
+    # the class map is written with the model, so the two can never drift apart
+    write_class_map(indices)
+    print("Saved class mapping to", CLASS_MAP_PATH)
+    num_classes = len(indices)
     model = build_model(num_classes)
     os.makedirs(os.path.dirname(MODEL_PATH), exist_ok=True)
     checkpoint = ModelCheckpoint(MODEL_PATH, monitor='val_accuracy', save_best_only=True, verbose=1)
-    model.fit(train_gen, validation_data=val_gen, epochs=12, callbacks=[checkpoint])
+    model.fit(train_ds, validation_data=val_ds, epochs=epochs, callbacks=[checkpoint])
     print("Saved disease model to", MODEL_PATH)
 
 if __name__ == "__main__":
-    train()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--epochs", type=int, default=12)
+    ap.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    ap.add_argument("--cache", default=CACHE_DIR,
+                    help='decoded-image cache: a directory, "memory", or "none" (clear the directory if the dataset changes)')
+    ap.add_argument("--tfrecords", metavar="DIR", help="train from TFRecord shards written by --export-tfrecords")
+    ap.add_argument("--export-tfrecords", metavar="DIR", help="write pre-resized TFRecord shards and exit")
+    ap.add_argument("--shards", type=int, default=16)
+    ap.add_argument("--benchmark", type=int, metavar="BATCHES", help="measure input pipeline images/sec and exit")
+    args = ap.parse_args()
+    cache = {"none": None, "memory": ""}.get(args.cache, args.cache)
+
+    if args.export_tfrecords:
+        indices = class_indices(DATA_DIR)
+        (tp, tl), (vp, vl) = split_files(DATA_DIR, indices)
+        export_tfrecords(tp, tl, args.export_tfrecords, "train", args.shards)
+        export_tfrecords(vp, vl, args.export_tfrecords, "val", max(1, args.shards // 4))
+        write_class_map(indices, os.path.join(args.export_tfrecords, "class_indices.json"))
+        print("Wrote TFRecords to", args.export_tfrecords)
+    elif args.benchmark:
+        benchmark(args.benchmark, args.batch_size, DATA_DIR, args.tfrecords)
+    else:
+        train(args.epochs, args.batch_size, cache, args.tfrecords)
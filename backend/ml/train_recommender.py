@@ -1,9 +1,21 @@
 import os
-from recommender import train_recommender
+import sys
+import argparse
+
+# recommender is imported as ml.recommender so it resolves the same way as in the app
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from ml.recommender import train_recommender
 
 if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--search", action="store_true",
+                    help="cross-validate RandomForest/XGBoost grids and keep the cheapest model near the best accuracy")
+    ap.add_argument("--jobs", type=int, default=None, help="worker processes for --search (default: all cores)")
+    ap.add_argument("--cv", type=int, default=5)
+    ap.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    args = ap.parse_args()
     csv_path = os.path.join(os.path.dirname(__file__), "..", "..", "data", "npk_dataset.csv")
     if not os.path.exists(csv_path):
         raise FileNotFoundError("Place your dataset as data/npk_dataset.csv")
-    train_recommender(csv_path)
-
+    train_recommender(csv_path, search=args.search, n_jobs=args.jobs, cv=args.cv,
+                      max_accuracy_drop=args.max_accuracy_drop)
@@ -0,0 +1,113 @@
+import glob
+import json
+import logging
+import os
+from collections import namedtuple
+from types import MappingProxyType
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from ml.registry import ModelRegistry
+
+log = logging.getLogger(__name__)
+
+DEFAULT_LANG = "en"
+
+Schedule = namedtuple("Schedule", "crop duration_days watering_weeks fertilizer_days")
+GENERIC_SCHEDULE = Schedule("generic", 120, 6, (30, 60))
+
+
+def _freeze_schedule(crop, d):
+    return Schedule(crop, int(d.get("duration_days") or GENERIC_SCHEDULE.duration_days),
+                    int(d.get("watering_weeks") or 0),
+                    tuple(sorted(int(x) for x in (d.get("fertilizer_days") or ()))))
+
+
+class ReferenceData:
+    """
+    Language strings and crop schedules, loaded once per process into
+    read-only mappings and shared by all requests. Every language is merged
+    over English at load time, so lookups never need a fallback. Files are
+    watched like models (a change is picked up within check_interval seconds);
+    CropSchedule rows override crop_schedules.json and are re-read whenever
+    the file changes or reload_schedules() is called.
+    """
+
+    def __init__(self, check_interval=5.0):
+        self.app = None
+        self.lang_folder = None
+        self.schedules_path = None
+        self.registry = ModelRegistry(check_interval=check_interval)
+
+    def init_app(self, app):
+        self.app = app
+        self.lang_folder = app.config["LANG_FOLDER"]
+        self.schedules_path = app.config["CROP_SCHEDULES_PATH"]
+        self.registry.check_interval = app.config["REFDATA_CHECK_SECONDS"]
+        lang_files = os.path.join(self.lang_folder, "*.json")
+        # the folder itself is watched too, so added or removed languages are noticed
+        self.registry.register("languages", self._load_languages,
+                               watch_paths=lambda: [self.lang_folder] + sorted(glob.glob(lang_files)))
+        self.registry.register("crop_schedules", self._load_schedules, watch_paths=[self.schedules_path])
+
+    def _load_languages(self):
+        raw = {}
+        for path in sorted(glob.glob(os.path.join(self.lang_folder, "*.json"))):
+            code = os.path.splitext(os.path.basename(path))[0]
+            try:
+                with open(path, encoding="utf-8") as f:
+                    raw[code] = json.load(f)
+            except (OSError, ValueError) as e:
+                log.warning("Skipping language file %s: %s", path, e)
+        base = raw.get(DEFAULT_LANG, {})
+        merged = {code: MappingProxyType({**base, **strings}) for code, strings in raw.items()}
+        merged.setdefault(DEFAULT_LANG, MappingProxyType(dict(base)))
+        return MappingProxyType(merged)
+
+    def _load_schedules(self):
+        schedules = {}
+        try:
+            with open(self.schedules_path, encoding="utf-8") as f:
+                for crop, d in json.load(f).items():
+                    schedules[crop.lower()] = _freeze_schedule(crop, d)
+        except (OSError, ValueError) as e:
+            log.warning("Could not read crop schedules from %s: %s", self.schedules_path, e)
+        try:
+            from db import CropSchedule
+            with self.app.app_context():
+                for row in CropSchedule.query.all():
+                    if row.crop:
+                        schedules[row.crop.lower()] = _freeze_schedule(row.crop, {
+                            "duration_days": row.duration_days, "watering_weeks": row.watering_weeks,
+                            "fertilizer_days": row.fertilizer_days})
+        except SQLAlchemyError as e:
+            log.warning("Could not read crop_schedule table: %s", e)
+        return MappingProxyType(schedules)
+
+    def languages(self):
+        return self.registry.get("languages")
+
+    def lang(self, code):
+        """Strings for a language code (unknown codes get English)."""
+        langs = self.languages()
+        return langs.get(code) or langs[DEFAULT_LANG]
+
+    def schedules(self):
+        return self.registry.get("crop_schedules")
+
+    def schedule(self, crop):
+        """Schedule for a crop (case-insensitive), or None when unknown."""
+        return self.schedules().get((crop or "").lower())
+
+    def reload_schedules(self):
+        """Re-reads schedules after CropSchedule rows were changed."""
+        return self.registry.reload("crop_schedules")
+
+    def warm_up(self):
+        return self.registry.warm_up()
+
+    def stats(self):
+        return self.registry.stats()
+
+
+refdata = ReferenceData()
@@ -0,0 +1,319 @@
+import datetime
+import fcntl
+import functools
+import glob
+import hashlib
+import json
+import os
+import pickle
+import threading
+import time
+
+from flask import request, make_response, session
+
+from ml.cache import LRUCache
+from ml.metrics import REGISTRY
+
+CACHE_REQUESTS = REGISTRY.counter("agrinext_response_cache_requests_total",
+                                  "Cached-route lookups by namespace and result (hit, miss, bypass)",
+                                  ["namespace", "result"])
+
+
+class FileCounters:
+    """Generation counters as small files, shared by every process on the host."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                return int(f.read() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def incr(self, key):
+        path = self._path(key)
+        # the lock serializes read-increment-write across processes; readers see the
+        # old or the new file thanks to os.replace, never a partial one
+        with open(path + ".lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            value = self.get(key) + 1
+            tmp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+            with open(tmp, "w") as f:
+                f.write(str(value))
+            os.replace(tmp, path)
+        return value
+
+
+class MemoryBackend:
+    """
+    Per-process LRU. The generation counters are FileCounters, so invalidate()
+    from any worker or script on the host orphans the entries of every worker.
+    """
+
+    def __init__(self, maxsize=512, counter_dir=None):
+        self._cache = LRUCache(maxsize=maxsize)
+        self._counters = FileCounters(counter_dir)
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ttl, generations=()):
+        self._cache.put(key, value, ttl=ttl)
+
+    def get_counter(self, key):
+        return self._counters.get(key)
+
+    def incr(self, key):
+        return self._counters.incr(key)
+
+
+class FileSystemBackend:
+    """
+    Pickled entries in a directory shared by all workers on the host. Each file
+    starts with a small header (expiry and the generations it was built under), so prune()
+    can drop expired and orphaned entries without unpickling their bodies.
+    """
+
+    def __init__(self, directory, prune_interval=60.0):
+        self.directory = directory
+        self.prune_interval = prune_interval
+        self._counters = FileCounters(os.path.join(directory, "generations"))
+        self._last_prune = 0.0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _stale(self, header):
+        expires, generations = header
+        return ((expires is not None and expires < time.time())
+                or any(gen < self._counters.get(key) for key, gen in generations))
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = pickle.load(f)
+                if self._stale(header):
+                    value = None
+                else:
+                    return pickle.load(f)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return None
+        self._remove(path)
+        return value
+
+    def set(self, key, value, ttl, generations=()):
+        """generations: the (counter key, value) pairs the entry was built under, checked by prune()."""
+        path = self._path(key)
+        header = (time.time() + ttl if ttl else None, tuple(generations))
+        tmp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(tmp, "wb") as f:
+            pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    def get_counter(self, key):
+        return self._counters.get(key)
+
+    def incr(self, key):
+        value = self._counters.incr(key)
+        if time.monotonic() - self._last_prune >= self.prune_interval:
+            self.prune()
+        return value
+
+    def prune(self):
+        """Removes expired entries and those of bumped generations; returns how many."""
+        self._last_prune = time.monotonic()
+        removed = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    with open(entry.path, "rb") as f:
+                        stale = self._stale(pickle.load(f))
+                except (EOFError, ValueError, TypeError, pickle.UnpicklingError):
+                    stale = True
+                except OSError:
+                    continue
+                if stale:
+                    self._remove(entry.path)
+                    removed += 1
+        return removed
+
+
+class RedisBackend:
+    """Any Redis-protocol server (redis, KeyDB, Dragonfly ...); needs the redis package."""
+
+    def __init__(self, url, prefix="agrinext:rc:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RESPONSE_CACHE_BACKEND=redis requires the 'redis' package")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl, generations=()):
+        self._client.set(self.prefix + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                         ex=int(ttl) if ttl else None)
+
+    def get_counter(self, key):
+        return int(self._client.get(self.prefix + "counter:" + key) or 0)
+
+    def incr(self, key):
+        return self._client.incr(self.prefix + "counter:" + key)
+
+
+def _files_signature(patterns):
+    sig = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            sig.append((path, st.st_mtime_ns, st.st_size))
+    return tuple(sig)
+
+
+class ResponseCache:
+    """
+    Caches rendered responses of read-mostly views and answers conditional
+    requests (If-None-Match / If-Modified-Since) with 304.
+
+    Entries are keyed on namespace, the namespace's generation counter, the
+    route, normalized query args and JSON body, plus an optional vary() value
+    (e.g. the user id). invalidate(namespace) bumps the generation, which
+    orphans every entry in that namespace at once. Namespaces can also depend
+    on files: when any of them changes the namespace is invalidated.
+    """
+
+    def __init__(self, app=None):
+        self.backend = None
+        self.default_ttl = 300
+        self.enabled = True
+        self._file_deps = {}
+        self._file_check_interval = 2.0
+        self._local = threading.local()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cfg = app.config
+        self.enabled = cfg.get("RESPONSE_CACHE_ENABLED", True)
+        self.default_ttl = cfg.get("RESPONSE_CACHE_TTL", 300)
+        kind = cfg.get("RESPONSE_CACHE_BACKEND", "memory")
+        if kind == "filesystem":
+            self.backend = FileSystemBackend(cfg["RESPONSE_CACHE_DIR"], cfg.get("RESPONSE_CACHE_PRUNE_SECONDS", 60.0))
+        elif kind == "redis":
+            self.backend = RedisBackend(cfg["RESPONSE_CACHE_REDIS_URL"])
+        elif kind == "memory":
+            self.backend = MemoryBackend(cfg.get("RESPONSE_CACHE_MAX_ENTRIES", 512),
+                                         os.path.join(cfg["RESPONSE_CACHE_DIR"], "generations"))
+            REGISTRY.register_cache("responses", self.backend._cache)
+        else:
+            raise ValueError(f"Unknown RESPONSE_CACHE_BACKEND '{kind}'")
+        app.extensions["response_cache"] = self
+
+    def invalidate(self, namespace):
+        if self.backend is not None:
+            self.backend.incr("gen:" + namespace)
+
+    def generation(self, namespace):
+        if self.backend is None:
+            return 0
+        key = "gen:" + namespace
+        gen = self.backend.get_counter(key)
+        # remembered while a cache key is built, vary() may read other namespaces
+        reads = getattr(self._local, "reads", None)
+        if reads is not None:
+            reads.append((key, gen))
+        return gen
+
+    def depends_on_files(self, namespace, *patterns):
+        """Invalidate namespace whenever a file matching any glob pattern changes."""
+        self._file_deps[namespace] = {"patterns": patterns, "signature": _files_signature(patterns), "checked": time.monotonic()}
+
+    def _check_files(self, namespace):
+        dep = self._file_deps.get(namespace)
+        if dep is None or time.monotonic() - dep["checked"] < self._file_check_interval:
+            return
+        dep["checked"] = time.monotonic()
+        sig = _files_signature(dep["patterns"])
+        if sig != dep["signature"]:
+            dep["signature"] = sig
+            self.invalidate(namespace)
+
+    def _key(self, namespace, vary):
+        """The entry key and the generations it depends on."""
+        self._check_files(namespace)
+        self._local.reads = []
+        try:
+            gen = self.generation(namespace)
+            args = sorted((k, tuple(v)) for k, v in request.args.lists())
+            body = request.get_json(silent=True) if request.method != "GET" else None
+            parts = [namespace, gen, request.method, request.path, args,
+                     json.dumps(body, sort_keys=True, default=str), vary() if vary else None]
+            return "resp:" + hashlib.sha1(repr(parts).encode()).hexdigest(), tuple(self._local.reads)
+        finally:
+            self._local.reads = None
+
+    def cached(self, namespace, ttl=None, vary=None, private=False, bypass=None):
+        """
+        Decorator for views. Only 200 responses are stored. bypass() returning
+        True skips the cache for that request (e.g. pending flash messages).
+        """
+        def decorator(view):
+            @functools.wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or self.backend is None or (bypass and bypass()):
+                    CACHE_REQUESTS.labels(namespace, "bypass").inc()
+                    return view(*args, **kwargs)
+                key, generations = self._key(namespace, vary)
+                entry = self.backend.get(key)
+                CACHE_REQUESTS.labels(namespace, "miss" if entry is None else "hit").inc()
+                if entry is None:
+                    resp = make_response(view(*args, **kwargs))
+                    if resp.status_code != 200 or resp.direct_passthrough:
+                        return resp
+                    body = resp.get_data()
+                    entry = {
+                        "body": body,
+                        "mimetype": resp.mimetype,
+                        "etag": hashlib.sha1(body).hexdigest(),
+                        "last_modified": time.time(),
+                    }
+                    self.backend.set(key, entry, ttl or self.default_ttl, generations)
+                else:
+                    resp = make_response(entry["body"])
+                    resp.mimetype = entry["mimetype"]
+                resp.set_etag(entry["etag"])
+                resp.last_modified = datetime.datetime.fromtimestamp(int(entry["last_modified"]), datetime.timezone.utc)
+                # clients may keep a copy but must revalidate; revalidation is a cheap 304
+                resp.headers["Cache-Control"] = ("private" if private else "public") + ", no-cache"
+                return resp.make_conditional(request)
+            return wrapper
+        return decorator
+
+
+def has_pending_flashes():
+    return bool(session.get("_flashes"))
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,360 @@
+import logging
+import os
+import threading
+import time
+import warnings
+
+import numpy as np
+from sqlalchemy import select
+
+from db import db, SoilRecord
+
+log = logging.getLogger(__name__)
+
+# SoilRecord columns the distance is computed over (missing values count as the mean)
+COLUMNS = ("n", "p", "k", "ph", "weather_temp", "weather_humidity", "rainfall")
+# API keys (as in /api/recommend) -> SoilRecord columns
+FIELDS = {"N": "n", "P": "p", "K": "k", "pH": "ph", "temp": "weather_temp",
+          "humidity": "weather_humidity", "rainfall": "rainfall"}
+SYNC_CHUNK = 50000
+
+
+class SoilIndex:
+    """
+    k-nearest-neighbour index over standardized soil features of SoilRecords.
+
+    Rows live in append-only arrays (capacity doubles as records arrive). The
+    first `tree_rows` rows are covered by a KD-tree; rows appended since are
+    searched by brute force, and once they outgrow rebuild_fraction of the
+    tree a new tree (and scaler) is built on a background thread and swapped
+    in. Deleted records are tombstoned, skipped at query time and dropped at
+    the next rebuild.
+    """
+
+    def __init__(self, rebuild_fraction=0.1, min_rebuild_rows=2000):
+        self.rebuild_fraction = rebuild_fraction
+        self.min_rebuild_rows = min_rebuild_rows
+        self.size = 0
+        self.X = np.empty((0, len(COLUMNS)), dtype=np.float32)   # raw values, NaN when missing
+        self.Z = np.empty((0, len(COLUMNS)), dtype=np.float32)   # standardized, missing -> 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.users = np.empty(0, dtype=np.int64)
+        self.crops = np.empty(0, dtype=np.int32)
+        self.alive = np.empty(0, dtype=bool)
+        self.vocab, self._crop_code = [], {}
+        self.mean = np.zeros(len(COLUMNS))
+        self.std = np.ones(len(COLUMNS))
+        self.tree, self.tree_rows = None, 0
+        self.dead = 0
+        self._lock = threading.RLock()
+        self._building = False
+
+    @property
+    def last_id(self):
+        return int(self.ids[self.size - 1]) if self.size else 0
+
+    def _standardize(self, X):
+        Z = (X - self.mean) / self.std
+        return np.nan_to_num(Z, nan=0.0).astype(np.float32)
+
+    def _code(self, crop):
+        if crop not in self._crop_code:
+            self._crop_code[crop] = len(self.vocab)
+            self.vocab.append(crop)
+        return self._crop_code[crop]
+
+    def add(self, ids, users, X, crops):
+        """Appends records (ids ascending, above last_id); X is (n, 7) raw values with NaN for missing."""
+        n = len(ids)
+        if not n:
+            return
+        with self._lock:
+            end = self.size + n
+            if end > len(self.ids):
+                cap = max(end, 2 * len(self.ids), 1024)
+                for name in ("X", "Z", "ids", "users", "crops", "alive"):
+                    old = getattr(self, name)
+                    new = np.empty((cap,) + old.shape[1:], dtype=old.dtype)
+                    new[:self.size] = old[:self.size]
+                    setattr(self, name, new)
+            X = np.asarray(X, dtype=np.float32)
+            self.X[self.size:end] = X
+            self.Z[self.size:end] = self._standardize(X)
+            self.ids[self.size:end] = ids
+            self.users[self.size:end] = [u if u is not None else -1 for u in users]
+            self.crops[self.size:end] = [self._code(c) for c in crops]
+            self.alive[self.size:end] = True
+            self.size = end
+
+    def maybe_rebuild(self):
+        """Builds the first tree in place; later ones in the background once the unindexed tail or the tombstones pile up."""
+        if self.tree is None:
+            if self.size:
+                self.rebuild()
+        else:
+            threshold = max(self.min_rebuild_rows, self.rebuild_fraction * self.tree_rows)
+            if self.size - self.tree_rows >= threshold or self.dead >= threshold:
+                self.rebuild(background=True)
+
+    def remove(self, ids):
+        with self._lock:
+            rows = np.searchsorted(self.ids[:self.size], np.asarray(list(ids), dtype=np.int64))
+            rows = rows[rows < self.size]
+            rows = rows[np.isin(self.ids[rows], list(ids)) & self.alive[rows]]
+            self.alive[rows] = False
+            self.dead += len(rows)
+
+    def rebuild(self, background=False):
+        """Refits the scaler on the live rows and rebuilds the KD-tree over all rows."""
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+            m = self.size
+            X = self.X[:m].copy()
+            live = self.alive[:m].copy()
+        if background:
+            threading.Thread(target=self._build, args=(X, live, m), name="similar-index-build",
+                             daemon=True).start()
+        else:
+            self._build(X, live, m)
+
+    def _build(self, X, live, m):
+        from sklearn.neighbors import KDTree
+        try:
+            start = time.perf_counter()
+            X = X[live]
+            mean, std = np.zeros(len(COLUMNS)), np.ones(len(COLUMNS))
+            if len(X):
+                with warnings.catch_warnings():
+                    # all-NaN columns (e.g. no record has rainfall yet) keep mean 0, std 1
+                    warnings.simplefilter("ignore", RuntimeWarning)
+                    mean = np.nan_to_num(np.nanmean(X, axis=0))
+                    std = np.nan_to_num(np.nanstd(X, axis=0), nan=1.0)
+            std[std < 1e-9] = 1.0
+            Z = np.nan_to_num((X - mean) / std, nan=0.0).astype(np.float32)
+            tree = KDTree(Z) if len(Z) else None
+            with self._lock:
+                # rows dead when the build started are dropped; everything is copied into
+                # new arrays, so queries in flight keep the old tree and the rows it indexes
+                keep = np.concatenate([live, np.ones(self.size - m, dtype=bool)])
+                count, t = int(keep.sum()), len(Z)
+                for name in ("X", "ids", "users", "crops", "alive"):
+                    old = getattr(self, name)
+                    new = np.empty_like(old)
+                    new[:count] = old[:self.size][keep]
+                    setattr(self, name, new)
+                self.mean, self.std = mean, std
+                fresh = np.empty_like(self.Z)
+                fresh[:t] = Z
+                # rows appended while building were scaled with the old scaler
+                fresh[t:count] = self._standardize(self.X[t:count])
+                self.Z, self.tree, self.tree_rows, self.size = fresh, tree, t, count
+                self.dead = int(count - self.alive[:count].sum())
+            log.info("Similar-plots index rebuilt over %d records in %.2fs", t, time.perf_counter() - start)
+        finally:
+            self._building = False
+
+    def query(self, x, k=10, exclude_user=None):
+        """
+        Nearest live records to raw feature vector x (NaN for unknown values,
+        which standardize to the column mean like missing values in records).
+        Returns a list of (record id, distance, crop) nearest first.
+        """
+        with self._lock:
+            tree, m, n = self.tree, self.tree_rows, self.size
+            z = self._standardize(np.asarray(x, dtype=np.float32).reshape(1, -1))[0]
+            Zd = self.Z[m:n]
+            ids, users, crops, alive = self.ids[:n], self.users[:n], self.crops[:n], self.alive[:n]
+
+        def kept(rows):
+            keep = alive[rows]
+            if exclude_user is not None:
+                keep &= users[rows] != exclude_user
+            return keep
+
+        def tree_search(fetch):
+            d, i = tree.query(z[None], k=fetch)
+            return i[0], d[0]
+
+        d2 = ((Zd - z) ** 2).sum(axis=1)
+
+        def tail_search(fetch):
+            top = np.argpartition(d2, fetch - 1)[:fetch] if fetch < len(d2) else np.arange(len(d2))
+            top = top[np.argsort(d2[top], kind="stable")]
+            return top + m, np.sqrt(d2[top])
+
+        # the k nearest kept rows of each source, then the k nearest of those: cutting a
+        # merged window instead could skip kept rows just past one source's window
+        rows, dist = [], []
+        if tree is not None and m:
+            r, d = self._nearest_kept(tree_search, m, k, kept)
+            rows.append(r)
+            dist.append(d)
+        if len(Zd):
+            r, d = self._nearest_kept(tail_search, len(Zd), k, kept)
+            rows.append(r)
+            dist.append(d)
+        if not rows:
+            return []
+        rows, dist = np.concatenate(rows), np.concatenate(dist)
+        order = np.argsort(dist, kind="stable")[:k]
+        return [(int(ids[r]), float(d), self.vocab[crops[r]]) for r, d in zip(rows[order], dist[order])]
+
+    def _nearest_kept(self, search, size, k, kept):
+        """Up to k nearest rows of one source (sorted by distance) that pass kept()."""
+        # ask for extra candidates to make up for dead or excluded rows
+        fetch = min(k + self.dead, size)
+        while True:
+            rows, dist = search(fetch)
+            keep = kept(rows)
+            if keep.sum() >= k or fetch >= size:
+                return rows[keep][:k], dist[keep][:k]
+            fetch = min(fetch * 4, size)
+
+    def state(self):
+        with self._lock:
+            n = self.size
+            return {"X": self.X[:n].copy(), "ids": self.ids[:n].copy(), "users": self.users[:n].copy(),
+                    "crops": self.crops[:n].copy(), "alive": self.alive[:n].copy(), "vocab": list(self.vocab),
+                    "mean": self.mean, "std": self.std, "tree": self.tree, "tree_rows": self.tree_rows}
+
+    @classmethod
+    def from_state(cls, state, **kwargs):
+        index = cls(**kwargs)
+        n = len(state["ids"])
+        index.size = n
+        index.X, index.ids, index.users = state["X"], state["ids"], state["users"]
+        index.crops, index.alive = state["crops"], state["alive"]
+        index.vocab = list(state["vocab"])
+        index._crop_code = {c: i for i, c in enumerate(index.vocab)}
+        index.mean, index.std = state["mean"], state["std"]
+        index.tree, index.tree_rows = state["tree"], state["tree_rows"]
+        index.Z = index._standardize(index.X)
+        index.dead = int(n - index.alive.sum())
+        return index
+
+
+class SimilarPlots:
+    """
+    Per-process SoilIndex kept in step with soil_records: loaded from
+    SIMILAR_INDEX_PATH at first use, then extended with records above its
+    last id at most every SIMILAR_SYNC_SECONDS. The index file is rewritten
+    (atomically) after syncs that added SIMILAR_SAVE_ROWS records or more, so
+    restarts only read the tail from the database.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.index = None
+        self.path = None
+        self.sync_seconds = 5.0
+        self.save_rows = 1000
+        self._synced_at = 0.0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.path = app.config["SIMILAR_INDEX_PATH"]
+        self.sync_seconds = app.config["SIMILAR_SYNC_SECONDS"]
+        self.save_rows = app.config["SIMILAR_SAVE_ROWS"]
+        app.extensions["similar_plots"] = self
+
+    def _load(self):
+        from joblib import load
+        if self.path and os.path.exists(self.path):
+            try:
+                return SoilIndex.from_state(load(self.path))
+            except Exception as e:
+                log.warning("Rebuilding similar-plots index, could not read %s: %s", self.path, e)
+        return SoilIndex()
+
+    def save(self):
+        from joblib import dump
+        if not self.path or self.index is None:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = "%s.%d.tmp" % (self.path, os.getpid())
+        dump(self.index.state(), tmp)
+        os.replace(tmp, self.path)
+        self._unsaved = 0
+
+    def sync(self, force=False):
+        """Adds records inserted since the last sync; returns the number added."""
+        if not force and time.monotonic() - self._synced_at < self.sync_seconds:
+            return 0
+        with self._lock:
+            if self.index is None:
+                self.index = self._load()
+            added = 0
+            while True:
+                rows = db.session.execute(
+                    select(SoilRecord.id, SoilRecord.user_id, SoilRecord.crop_predicted,
+                           *[getattr(SoilRecord, c) for c in COLUMNS])
+                    .where(SoilRecord.id > self.index.last_id).order_by(SoilRecord.id).limit(SYNC_CHUNK)
+                ).all()
+                if not rows:
+                    break
+                X = np.array([r[3:] for r in rows], dtype=np.float64)  # None -> NaN
+                self.index.add([r[0] for r in rows], [r[1] for r in rows], X, [r[2] or "" for r in rows])
+                added += len(rows)
+                if len(rows) < SYNC_CHUNK:
+                    break
+            self._synced_at = time.monotonic()
+            self._unsaved += added
+            self.index.maybe_rebuild()
+            if self._unsaved >= self.save_rows:
+                self.save()
+            return added
+
+    def rebuild(self):
+        """Drops the index and re-reads every record (after bulk deletes or edits)."""
+        with self._lock:
+            self.index = SoilIndex()
+        self.sync(force=True)
+        self.save()
+        return self.index.size
+
+    def remove(self, record_ids):
+        if self.index is not None:
+            self.index.remove(record_ids)
+
+    def similar(self, features, k=10, exclude_user=None):
+        """
+        Records whose soil is closest to `features` (dict of SoilRecord column
+        names) and the crops they were recommended. A missing feature counts as
+        the column mean, so records far from the mean on it still rank lower.
+        """
+        self.sync()
+        x = [np.nan if features.get(c) is None else float(features[c]) for c in COLUMNS]
+        start = time.perf_counter()
+        hits = self.index.query(x, k=k, exclude_user=exclude_user)
+        query_ms = (time.perf_counter() - start) * 1000
+        records = {r.id: r for r in SoilRecord.query.filter(SoilRecord.id.in_([h[0] for h in hits]))}
+        gone = [h[0] for h in hits if h[0] not in records]
+        if gone:
+            # deleted by another process since this one indexed them
+            self.index.remove(gone)
+        neighbours = []
+        crops = {}
+        for rid, dist, _ in hits:
+            rec = records.get(rid)
+            if rec is None:
+                continue
+            neighbours.append({"distance": round(dist, 4), "N": rec.n, "P": rec.p, "K": rec.k, "pH": rec.ph,
+                               "temp": rec.weather_temp, "humidity": rec.weather_humidity,
+                               "rainfall": rec.rainfall, "crop": rec.crop_predicted,
+                               "recorded_at": rec.recorded_at.isoformat() if rec.recorded_at else None})
+            if rec.crop_predicted:
+                crops[rec.crop_predicted] = crops.get(rec.crop_predicted, 0) + 1
+        ranked = sorted(crops.items(), key=lambda kv: (-kv[1], kv[0]))
+        return {
+            "neighbours": neighbours,
+            "crops": [{"crop": c, "count": n, "share": round(n / len(neighbours), 3)} for c, n in ranked],
+            "indexed": self.index.size - self.index.dead,
+            "query_ms": round(query_ms, 3),
+        }
+
+
+similar_plots = SimilarPlots()
@@ -0,0 +1,125 @@
+import datetime
+import os
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+
+from db import db, SoilRecord
+from history import apply_soil_records
+from ml.recommender import FEATURES, FEATURE_DEFAULTS, rank_matrix, get_model
+from response_cache import response_cache
+
+REQUIRED = ["N", "P", "K", "pH"]
+# spreadsheet column -> SoilRecord attribute
+COLUMNS = {"N": "n", "P": "p", "K": "k", "pH": "ph", "temp": "weather_temp",
+           "humidity": "weather_humidity", "rainfall": "rainfall"}
+DATE_COLUMNS = ("recorded_at", "date", "sample_date")
+
+try:
+    # pandas' .xlsx reader; without it only CSV uploads are accepted
+    import openpyxl  # noqa: F401
+    SPREADSHEET_EXTENSIONS = (".csv", ".xlsx")
+except ImportError:
+    SPREADSHEET_EXTENSIONS = (".csv",)
+
+
+def read_chunks(path, chunksize):
+    """DataFrame chunks of a CSV (streamed) or Excel sheet (read once, then sliced)."""
+    if path.lower().endswith(".xlsx"):
+        df = pd.read_excel(path, engine="openpyxl")
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize]
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize)
+
+
+def count_rows(path):
+    """Data rows in a CSV, from a fast newline count (None for Excel files)."""
+    if path.lower().endswith(".xlsx"):
+        return None
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for buf in iter(lambda: f.read(1 << 20), b""):
+            lines += buf.count(b"\n")
+            last = buf[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(0, lines - 1)
+
+
+def prepare_chunk(df):
+    """
+    Coerces a chunk to the model's feature matrix. Returns (X, valid, recorded_at)
+    where rows missing or with non-numeric N, P, K or pH, or with an infinite
+    value in any feature column, are invalid.
+    """
+    cols = {c: pd.to_numeric(df[c], errors="coerce") if c in df.columns else
+            pd.Series(np.nan, index=df.index) for c in FEATURES}
+    valid = np.ones(len(df), dtype=bool)
+    for c in REQUIRED:
+        valid &= cols[c].notna().to_numpy()
+    X = np.column_stack([cols[c].fillna(FEATURE_DEFAULTS[c]).to_numpy(dtype=np.float64) for c in FEATURES])
+    # to_numeric reads "inf"; the model and the database need finite values
+    valid &= np.isfinite(X).all(axis=1)
+    recorded_at = None
+    for c in DATE_COLUMNS:
+        if c in df.columns:
+            recorded_at = pd.to_datetime(df[c], errors="coerce")
+            break
+    return X, valid, recorded_at
+
+
+def import_soil_reports(job, runner, path, user_id, chunksize=5000, top_k=3):
+    """
+    Job body: scores every valid row of the uploaded spreadsheet in
+    vectorized chunks, bulk-inserts SoilRecords for the user and writes the
+    input rows plus predictions to <job id>.results.csv.
+    """
+    job.total = count_rows(path)
+    runner.save(job)
+    model = get_model()
+    out_path = runner.path(job.id, ".results.csv")
+    imported = invalid = 0
+    first = True
+    for df in read_chunks(path, chunksize):
+        X, valid, recorded_at = prepare_chunk(df)
+        out = df.copy()
+        out["status"] = np.where(valid, "ok", "invalid")
+        out["crop_predicted"] = ""
+        out["probability"] = np.nan
+        out["alternatives"] = ""
+        if valid.any():
+            crops, probs = rank_matrix(X[valid], top_k=top_k, model=model)
+            out.loc[valid, "crop_predicted"] = crops[:, 0]
+            out.loc[valid, "probability"] = np.round(probs[:, 0], 4)
+            out.loc[valid, "alternatives"] = [";".join(row[1:]) for row in crops]
+
+            now = datetime.datetime.utcnow()
+            dates = recorded_at[valid] if recorded_at is not None else None
+            values = {attr: X[valid, FEATURES.index(col)] for col, attr in COLUMNS.items()}
+            rows = []
+            for i in range(int(valid.sum())):
+                row = {attr: float(v[i]) for attr, v in values.items()}
+                ts = dates.iloc[i] if dates is not None else None
+                row.update(user_id=user_id, crop_predicted=str(crops[i, 0]),
+                           recorded_at=ts.to_pydatetime() if ts is not None and not pd.isna(ts) else now)
+                rows.append(row)
+            db.session.execute(insert(SoilRecord), rows)
+            apply_soil_records(rows)
+            db.session.commit()
+            response_cache.invalidate("soil:%d" % user_id)
+            imported += len(rows)
+        invalid += int((~valid).sum())
+        out.to_csv(out_path, mode="w" if first else "a", header=first, index=False)
+        first = False
+        job.processed += len(df)
+        job.summary = {"imported": imported, "invalid": invalid}
+        runner.save(job)
+    if job.total is None or job.total != job.processed:
+        job.total = job.processed
+    job.result_file = os.path.basename(out_path)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
@@ -0,0 +1,54 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class UploadStore:
+    """
+    Persists uploaded files under content-addressed names (sha256 of the bytes),
+    writing them on a small background pool so the request thread never blocks
+    on disk. Identical uploads map to the same file and are written once.
+    """
+
+    def __init__(self, folder, enabled=True, max_workers=2):
+        self.folder = folder
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-writer")
+        self._pending = {}
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def filename_for(data, ext):
+        return hashlib.sha256(data).hexdigest()[:32] + ext.lower()
+
+    def _write(self, filename, data):
+        path = os.path.join(self.folder, filename)
+        try:
+            if not os.path.exists(path):
+                # write to a temp name first so readers never see a partial file
+                tmp = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        finally:
+            with self._lock:
+                self._pending.pop(filename, None)
+
+    def save_async(self, data, ext):
+        """Queues data for writing and returns its filename (or None when disabled)."""
+        if not self.enabled:
+            return None
+        filename = self.filename_for(data, ext)
+        with self._lock:
+            if filename not in self._pending:
+                self._pending[filename] = self._executor.submit(self._write, filename, data)
+        return filename
+
+    def wait(self, filename, timeout=5.0):
+        """Blocks until a queued write for filename (if any) has finished."""
+        with self._lock:
+            fut = self._pending.get(filename)
+        if fut is not None:
+            fut.result(timeout=timeout)
@@ -0,0 +1,26 @@
+
+from refdata import refdata
+
+
+def load_lang(code):
+    """Read-only dict of UI strings for a language, English strings filling any gaps."""
+    return refdata.lang(code or "en")
+
+
+def generate_crop_calendar(sow_date, crop, duration_days=None):
+    """
+    Task list from sowing to harvest for a crop: weekly irrigation for the
+    crop's watering weeks, fertilizer applications and harvest. Unknown crops
+    use a generic schedule. duration_days overrides the crop's season length.
+    """
+    from crop_calendar import crop_calendar
+    return crop_calendar(sow_date, crop, duration_days)
+
+
+def fertilizer_advice(n, p, k, ph, crop=None):
+    """
+    Plain-language fertilizer advice from soil N, P, K (kg/ha) and pH, against
+    the crop's targets in ml/fertilizer_targets.json (defaults for unknown crops).
+    """
+    from ml import fertilizer
+    return list(fertilizer.fertilizer_advice(n, p, k, ph, crop))
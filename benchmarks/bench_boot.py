@@ -0,0 +1,137 @@
+"""
+Worker boot time and memory for the backend, lazy imports vs preloading.
+
+In-process: time to import app and serve the first /login in a fresh
+interpreter, with heavy modules left lazy (MODEL_WARMUP=0) and imported up
+front (MODEL_WARMUP=1), plus which heavy libraries ended up loaded.
+
+Gunicorn (when installed): starts gunicorn.conf.py with GUNICORN_PRELOAD=0
+and 1, measures time until /login answers and reports RSS, PSS (shared pages
+divided among the processes sharing them) and USS (private pages) per worker.
+
+    python benchmarks/bench_boot.py [--workers 4] [--skip-gunicorn]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND = os.path.join(ROOT, "backend")
+HEAVY = ["pandas", "sklearn", "tensorflow", "PIL"]
+
+_PROBE = """
+import sys, time, json, resource
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+status = app.app.test_client().get("/login").status_code
+first = time.perf_counter() - start
+print(json.dumps({{"import_seconds": imported, "first_request_seconds": first, "status": status,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "heavy_loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _env(extra):
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(), "boot.db"))
+    env.update(extra)
+    return env
+
+
+def in_process(warmup):
+    out = subprocess.run([sys.executable, "-c", _PROBE.format(backend=BACKEND, heavy=HEAVY)],
+                         capture_output=True, text=True, cwd=BACKEND,
+                         env=_env({"MODEL_WARMUP": "1" if warmup else "0"}))
+    lines = out.stdout.strip().splitlines()
+    if out.returncode or not lines:
+        return {"mode": "eager" if warmup else "lazy", "error": out.stderr.strip().splitlines()[-1:]}
+    res = json.loads(lines[-1])
+    res["mode"] = "eager" if warmup else "lazy"
+    return res
+
+
+def _smaps(pid):
+    mem = {}
+    with open("/proc/%d/smaps_rollup" % pid) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                mem[parts[0][:-1]] = int(parts[1]) / 1024
+    return {"rss_mb": round(mem.get("Rss", 0), 1), "pss_mb": round(mem.get("Pss", 0), 1),
+            "uss_mb": round(mem.get("Private_Clean", 0) + mem.get("Private_Dirty", 0), 1)}
+
+
+def _children(pid):
+    try:
+        with open("/proc/%d/task/%d/children" % (pid, pid)) as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def gunicorn(preload, workers, timeout=120):
+    port = _free_port()
+    env = _env({"GUNICORN_PRELOAD": "1" if preload else "0", "GUNICORN_WORKERS": str(workers),
+                "GUNICORN_BIND": "127.0.0.1:%d" % port})
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"),
+                             "app:app"], cwd=BACKEND, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        boot = None
+        while time.perf_counter() - start < timeout and proc.poll() is None:
+            try:
+                urllib.request.urlopen("http://127.0.0.1:%d/login" % port, timeout=1).read()
+                boot = time.perf_counter() - start
+                break
+            except OSError:
+                time.sleep(0.05)
+        if boot is None:
+            return {"preload": preload, "error": (proc.stderr.read().decode(errors="replace")
+                                                  if proc.poll() is not None else "timed out")[-500:]}
+        # let the remaining workers finish booting before measuring
+        deadline = time.perf_counter() + timeout
+        while len(_children(proc.pid)) < workers and time.perf_counter() < deadline:
+            time.sleep(0.1)
+        time.sleep(1.0)
+        per_worker = [_smaps(pid) for pid in _children(proc.pid)]
+        return {
+            "preload": preload,
+            "workers": len(per_worker),
+            "boot_seconds": round(boot, 3),
+            "master": _smaps(proc.pid),
+            "per_worker": per_worker,
+            "total_pss_mb": round(sum(w["pss_mb"] for w in per_worker) + _smaps(proc.pid)["pss_mb"], 1),
+        }
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--skip-gunicorn", action="store_true")
+    args = ap.parse_args()
+    results = {"in_process": [in_process(False), in_process(True)]}
+    if not args.skip_gunicorn:
+        try:
+            import gunicorn as _  # noqa: F401
+            results["gunicorn"] = [gunicorn(False, args.workers), gunicorn(True, args.workers)]
+        except ImportError:
+            results["gunicorn"] = "gunicorn not installed"
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,139 @@
+"""
+Per-worker memory and cold start of the model loading modes, measured the
+way gunicorn runs them without preload: N independent worker processes load
+the model, serve a batch, and stay alive while RSS, PSS (shared pages split
+among the processes mapping them) and USS (private pages) are read from
+/proc/<pid>/smaps_rollup.
+
+Recommender: the pickled pipeline (RECOMMENDER_RUNTIME=sklearn) against the
+memory-mapped flat forest (RECOMMENDER_RUNTIME=flat). Disease CNN (needs
+TensorFlow): Keras .h5, TFLite, and TFLite with DISEASE_TFLITE_SHARED=1.
+Models are synthetic (benchmarks/synthetic.py) unless --model-dir is given.
+
+    python benchmarks/bench_model_memory.py [--workers 4] [--trees 200] [--model-dir models]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+BACKEND = os.path.join(ROOT, "backend")
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, HERE)
+
+from bench_boot import _smaps  # noqa: E402
+
+# a worker: import, load, serve one batch, report, then wait so all workers coexist
+_WORKER = """
+import sys, time, json
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+if {kind!r} == "recommender":
+    from ml import recommender as m
+    import numpy as np
+    rows = [dict(zip(m.FEATURES, r)) for r in np.random.default_rng(0).uniform(0, 200, (2000, 7))]
+    load = (lambda: m.get_model()) if {load} else (lambda: None)
+    serve = lambda: m.predict_recommendation_batch(rows, top_k=3)
+else:
+    from ml import disease_detector as m
+    sys.path.insert(0, {bench!r})
+    import synthetic
+    images = [synthetic.leaf_image(i) for i in range(16)]
+    load = (lambda: m.get_disease_model()) if {load} else (lambda: None)
+    serve = lambda: m.predict_batch([m.preprocess_image(i) for i in images])
+imported = time.perf_counter()
+load()
+loaded = time.perf_counter()
+if {load}:
+    serve()
+served = time.perf_counter()
+print(json.dumps({{"import_seconds": imported - start, "load_seconds": loaded - imported,
+                  "first_batch_seconds": served - loaded}}), flush=True)
+sys.stdin.read()
+"""
+
+
+def run_mode(kind, env, workers, load=True):
+    code = _WORKER.format(backend=BACKEND, bench=HERE, kind=kind, load=load)
+    procs = [subprocess.Popen([sys.executable, "-c", code], env={**os.environ, **env}, cwd=BACKEND,
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+             for _ in range(workers)]
+    try:
+        timings = [json.loads(p.stdout.readline()) for p in procs]
+        mem = [_smaps(p.pid) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    mean = lambda rows, key: round(sum(r[key] for r in rows) / len(rows), 3)  # noqa: E731
+    return {
+        "workers": workers,
+        "load_seconds": mean(timings, "load_seconds"),
+        "cold_start_seconds": round(mean(timings, "import_seconds") + mean(timings, "load_seconds"), 3),
+        "first_batch_seconds": mean(timings, "first_batch_seconds"),
+        "rss_mb_per_worker": mean(mem, "rss_mb"),
+        "pss_mb_per_worker": mean(mem, "pss_mb"),
+        "uss_mb_per_worker": mean(mem, "uss_mb"),
+        "total_pss_mb": round(sum(m["pss_mb"] for m in mem), 1),
+    }
+
+
+def prepare(model_dir, trees, with_disease):
+    import synthetic
+    from ml import recommender
+    if not os.path.exists(os.path.join(model_dir, "crop_recommender.pkl")):
+        synthetic.train_recommender(model_dir, trees=trees, rows=20000)
+    if not recommender.forest.is_current(recommender.FOREST_DIR, recommender.DEFAULT_MODEL_FILE):
+        from joblib import load
+        pipeline = load(recommender.DEFAULT_MODEL_FILE)
+        recommender.forest.export_forest(pipeline, recommender.FOREST_DIR, recommender.class_names(pipeline),
+                                         source=recommender.DEFAULT_MODEL_FILE)
+    if with_disease:
+        import tensorflow as tf
+        h5 = os.path.join(model_dir, "disease_cnn.h5")
+        if not os.path.exists(h5):
+            synthetic.train_disease_model(model_dir)
+        tflite = os.path.join(model_dir, "disease_cnn.tflite")
+        if not os.path.exists(tflite):
+            converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(h5))
+            with open(tflite, "wb") as f:
+                f.write(converter.convert())
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--trees", type=int, default=200)
+    ap.add_argument("--model-dir", help="serve these models instead of synthetic ones")
+    args = ap.parse_args()
+    try:
+        import tensorflow  # noqa: F401
+        with_disease = True
+    except ImportError:
+        with_disease = False
+
+    model_dir = os.path.abspath(args.model_dir or tempfile.mkdtemp(prefix="agrinext-models-"))
+    os.environ["MODEL_DIR"] = model_dir  # read by the ml modules at import
+    os.environ.setdefault("DISEASE_BATCHING", "0")
+    prepare(model_dir, args.trees, with_disease)
+
+    results = {"model_dir": model_dir, "recommender": {
+        "baseline (no model)": run_mode("recommender", {}, args.workers, load=False),
+        "pickle": run_mode("recommender", {"RECOMMENDER_RUNTIME": "sklearn"}, args.workers),
+        "flat mmap": run_mode("recommender", {"RECOMMENDER_RUNTIME": "flat"}, args.workers),
+    }}
+    if with_disease:
+        results["disease"] = {
+            "baseline (no model)": run_mode("disease", {}, args.workers, load=False),
+            "keras": run_mode("disease", {"DISEASE_MODEL_RUNTIME": "keras"}, args.workers),
+            "tflite": run_mode("disease", {"DISEASE_MODEL_RUNTIME": "tflite"}, args.workers),
+            "tflite shared": run_mode("disease", {"DISEASE_MODEL_RUNTIME": "tflite",
+                                                  "DISEASE_TFLITE_SHARED": "1"}, args.workers),
+        }
+    else:
+        results["disease"] = "skipped: tensorflow not installed"
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,98 @@
+"""
+Rows/sec for crop recommendation scoring: per-call model load (old behaviour),
+cached model scoring one row per call, and cached model scoring whole batches.
+
+    python benchmarks/bench_recommender.py [--rows 5000] [--trees 200]
+
+Uses models/crop_recommender.pkl if it exists, otherwise trains a model on
+synthetic data in a temp dir.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import dump, load
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from ml import recommender  # noqa: E402
+
+
+def synthetic_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "N": rng.uniform(0, 140, n),
+        "P": rng.uniform(5, 145, n),
+        "K": rng.uniform(5, 205, n),
+        "pH": rng.uniform(3.5, 9.9, n),
+        "temp": rng.uniform(8, 43, n),
+        "humidity": rng.uniform(14, 99, n),
+        "rainfall": rng.uniform(20, 300, n),
+    })
+
+
+def synthetic_model(trees, path):
+    X = synthetic_samples(2000, seed=1)
+    crops = np.array(["rice", "wheat", "maize", "cotton", "sugarcane", "soybean"])
+    y = crops[(X["N"] // 25 + X["rainfall"] // 100).astype(int) % len(crops)]
+    clf = recommender.build_pipeline(n_estimators=trees)
+    clf.fit(X, y)
+    dump(clf, path)
+    return clf
+
+
+def rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else None
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=5000)
+    ap.add_argument("--trees", type=int, default=200)
+    ap.add_argument("--legacy-rows", type=int, default=20, help="rows for the load-per-call run")
+    args = ap.parse_args()
+
+    if os.path.exists(recommender.DEFAULT_MODEL_FILE):
+        path = recommender.DEFAULT_MODEL_FILE
+        model = load(path)
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "crop_recommender.pkl")
+        model = synthetic_model(args.trees, path)
+
+    samples = synthetic_samples(args.rows, seed=2)
+    records = samples.to_dict("records")
+    results = {"rows": args.rows, "model": path}
+
+    # old path: joblib.load + one-row DataFrame + predict + predict_proba per call
+    n = min(args.legacy_rows, args.rows)
+    t = time.perf_counter()
+    for r in records[:n]:
+        m = load(path)
+        df = pd.DataFrame([r])
+        m.predict(df)
+        m.predict_proba(df)
+    results["legacy_load_per_call_rows_per_sec"] = rate(n, time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for r in records:
+        recommender.predict_recommendation_batch([r], top_k=3, model=model)
+    results["cached_single_rows_per_sec"] = rate(len(records), time.perf_counter() - t)
+
+    t = time.perf_counter()
+    recommender.predict_recommendation_batch(records, top_k=3, model=model)
+    results["cached_batch_rows_per_sec"] = rate(len(records), time.perf_counter() - t)
+
+    X = recommender.to_feature_matrix(samples)
+    t = time.perf_counter()
+    recommender.score_matrix(X, top_k=3, model=model)
+    results["cached_batch_matrix_rows_per_sec"] = rate(len(X), time.perf_counter() - t)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
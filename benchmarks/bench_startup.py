@@ -0,0 +1,97 @@
+"""
+Boot cost of the backend: wall time to import each module in a fresh
+interpreter (cumulative, so a module's time includes what it pulls in),
+plus reference-data cost per request before (JSON read per load_lang call)
+and after (preloaded read-only mappings).
+
+    python benchmarks/bench_startup.py [--repeat 3] [--modules app,ml.recommender]
+
+Modules that fail to import (e.g. tensorflow not installed) are reported
+with their error instead of a time.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+MODULES = [
+    "flask", "flask_sqlalchemy", "numpy", "pandas", "sklearn.ensemble", "tensorflow",
+    "google.generativeai", "db", "refdata", "ml.recommender", "ml.rainfall",
+    "ml.disease_detector", "app",
+]
+
+_PROBE = """
+import sys, time, json, resource
+sys.path.insert(0, {backend!r})
+start = time.perf_counter()
+try:
+    __import__({module!r})
+    err = None
+except Exception as e:
+    err = "%s: %s" % (type(e).__name__, e)
+print(json.dumps({{"seconds": time.perf_counter() - start, "error": err,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def import_time(module, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _PROBE.format(backend=BACKEND, module=module)],
+                             capture_output=True, text=True, cwd=BACKEND)
+        lines = out.stdout.strip().splitlines()
+        if not lines:
+            return {"module": module, "error": out.stderr.strip().splitlines()[-1:]}
+        runs.append(json.loads(lines[-1]))
+        if runs[-1]["error"]:
+            return {"module": module, "error": runs[-1]["error"]}
+    best = min(runs, key=lambda r: r["seconds"])
+    return {"module": module, "seconds": round(best["seconds"], 4), "max_rss_mb": round(best["max_rss_mb"], 1)}
+
+
+def refdata_cost(calls=20000):
+    sys.path.insert(0, BACKEND)
+    from flask import Flask
+    from config import Config
+    from refdata import ReferenceData
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    lang_path = os.path.join(app.config["LANG_FOLDER"], "en.json")
+
+    def per_call_read(code):
+        # what load_lang did before: open and parse the file on every request
+        with open(lang_path, encoding="utf-8") as f:
+            return json.load(f)
+
+    ref = ReferenceData()
+    from db import db
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    ref.init_app(app)
+    start = time.perf_counter()
+    ref.warm_up()
+    load_seconds = time.perf_counter() - start
+    out = {"refdata_load_ms": round(load_seconds * 1000, 3)}
+    for name, fn in (("lang_json_read_us", per_call_read), ("lang_preloaded_us", ref.lang)):
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn("en")
+        out[name] = round((time.perf_counter() - start) / calls * 1e6, 3)
+    return out
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--modules", help="comma-separated modules (default: the backend's heavy imports)")
+    args = ap.parse_args()
+    modules = args.modules.split(",") if args.modules else MODULES
+    results = {"imports": [import_time(m, args.repeat) for m in modules], "refdata": refdata_cost()}
+    print(json.dumps(results, indent=2))
@@ -0,0 +1,71 @@
+"""
+Randomized check of the similar-plots index against brute force: records
+from several users are added, deleted and re-indexed (so queries mix the
+KD-tree with the unindexed tail and tombstones), and every query, with and
+without an excluded user, must return the same neighbour distances as an
+exhaustive search over the live rows.
+
+    python benchmarks/check_similar.py [--steps 200] [--seed 0]
+
+Exits 1 on the first mismatch.
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from similar import COLUMNS, SoilIndex  # noqa: E402
+
+
+def brute_force(index, x, k, exclude_user):
+    n = index.size
+    z = index._standardize(np.asarray(x, dtype=np.float32).reshape(1, -1))[0]
+    d = np.sqrt(((index.Z[:n] - z) ** 2).sum(axis=1))
+    keep = index.alive[:n].copy()
+    if exclude_user is not None:
+        keep &= index.users[:n] != exclude_user
+    return np.sort(d[keep])[:k]
+
+
+def run(steps, seed):
+    rng = np.random.default_rng(seed)
+    index = SoilIndex(min_rebuild_rows=300)
+    next_id, live = 1, []
+    for step in range(steps):
+        n = int(rng.integers(50, 400))
+        X = rng.normal(size=(n, len(COLUMNS))) * rng.uniform(0.5, 3, len(COLUMNS))
+        X[rng.random(X.shape) < 0.05] = np.nan
+        ids = np.arange(next_id, next_id + n)
+        # a few users own long runs of records, so exclusions wipe out whole windows
+        users = rng.integers(1, 5, n) if step % 3 else np.full(n, step % 5 + 1)
+        index.add(ids, users.tolist(), X, ["crop%d" % c for c in rng.integers(0, 6, n)])
+        next_id += n
+        live.extend(ids.tolist())
+        if live and rng.random() < 0.7:
+            gone = rng.choice(live, size=min(len(live), int(rng.integers(1, 300))), replace=False)
+            index.remove(gone.tolist())
+            live = sorted(set(live) - set(gone.tolist()))
+        if index.tree is None or rng.random() < 0.2:
+            index.rebuild()
+        for _ in range(5):
+            x = rng.normal(size=len(COLUMNS)) * 2
+            k = int(rng.integers(1, 30))
+            exclude = int(rng.integers(1, 6)) if rng.random() < 0.8 else None
+            got = np.array([d for _, d, _ in index.query(x, k=k, exclude_user=exclude)])
+            want = brute_force(index, x, k, exclude)
+            if len(got) != len(want) or not np.allclose(got, want, atol=1e-4):
+                print(f"step {step}: k={k} exclude={exclude} tree={index.tree_rows} size={index.size}\n"
+                      f"  index {np.round(got, 4)}\n  brute {np.round(want, 4)}")
+                return False
+    print(f"{steps} steps, {index.size} rows ({index.tree_rows} in the tree, {index.dead} deleted): ok")
+    return True
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--steps", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+    sys.exit(0 if run(args.steps, args.seed) else 1)
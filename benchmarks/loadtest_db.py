@@ -0,0 +1,113 @@
+"""
+Concurrent SQLite load test: several worker processes (like gunicorn workers)
+mix dashboard-style reads with soil-record inserts against one database file.
+Runs once with the old settings (rollback journal, no busy timeout) and once
+with WAL + busy_timeout, and prints throughput, latency and lock errors.
+
+    python benchmarks/loadtest_db.py [--workers 4] [--seconds 10] [--write-ratio 0.2]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.join(os.path.dirname(__file__), "..", "backend")
+
+MODES = {
+    # sqlite3 default journal, fail fast on locks (what create_all + default engine gave us)
+    "baseline": {"SQLITE_WAL": "0", "SQLITE_BUSY_TIMEOUT_MS": "0"},
+    "wal": {"SQLITE_WAL": "1", "SQLITE_BUSY_TIMEOUT_MS": "5000"},
+}
+
+
+def _worker(db_path, env, seconds, write_ratio, seed, out):
+    os.environ.update(env)
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    sys.path.insert(0, BACKEND)
+    from flask import Flask
+    from sqlalchemy.exc import OperationalError
+    from config import Config
+    from db import db, configure_engine, SoilRecord
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    configure_engine(app)
+    rng = random.Random(seed)
+    latencies, errors, ops = [], 0, 0
+    with app.app_context():
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            uid = rng.randint(1, 50)
+            t = time.perf_counter()
+            try:
+                if rng.random() < write_ratio:
+                    db.session.add(SoilRecord(user_id=uid, n=rng.uniform(0, 140), p=rng.uniform(0, 140),
+                                              k=rng.uniform(0, 200), ph=rng.uniform(4, 9)))
+                    db.session.commit()
+                else:
+                    SoilRecord.query.filter_by(user_id=uid).order_by(SoilRecord.recorded_at.desc()).limit(10).all()
+                    db.session.commit()
+                ops += 1
+                latencies.append(time.perf_counter() - t)
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+    out.put({"ops": ops, "errors": errors, "latencies": latencies})
+
+
+def run(mode, workers, seconds, write_ratio):
+    db_path = os.path.join(tempfile.mkdtemp(), "load.db")
+    env = MODES[mode]
+    # create the schema (and switch the file to WAL when enabled) before the workers start
+    os.environ.update(env)
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    setup = ctx.Process(target=_init_schema, args=(db_path, env))
+    setup.start()
+    setup.join()
+    procs = [ctx.Process(target=_worker, args=(db_path, env, seconds, write_ratio, i, q)) for i in range(workers)]
+    for p in procs:
+        p.start()
+    results = [q.get() for _ in procs]
+    for p in procs:
+        p.join()
+    lat = sorted(x for r in results for x in r["latencies"])
+    ops = sum(r["ops"] for r in results)
+
+    def pct(p):
+        return round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 2) if lat else None
+
+    return {"mode": mode, "workers": workers, "ops": ops, "ops_per_sec": round(ops / seconds, 1),
+            "lock_errors": sum(r["errors"] for r in results), "p50_ms": pct(0.5), "p99_ms": pct(0.99),
+            "max_ms": round(lat[-1] * 1000, 2) if lat else None}
+
+
+def _init_schema(db_path, env):
+    os.environ.update(env)
+    os.environ["DATABASE_URL"] = "sqlite:///" + db_path
+    sys.path.insert(0, BACKEND)
+    from flask import Flask
+    from config import Config
+    from db import db, configure_engine, init_db
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    configure_engine(app)
+    with app.app_context():
+        init_db()
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--seconds", type=float, default=10)
+    ap.add_argument("--write-ratio", type=float, default=0.2)
+    args = ap.parse_args()
+    print(json.dumps([run(m, args.workers, args.seconds, args.write_ratio) for m in MODES], indent=2))
@@ -0,0 +1,421 @@
+"""
+Offline benchmark suite: builds synthetic data and models in a temp
+directory, points the backend at them and measures each subsystem, then
+drives the Flask app with concurrent clients. Results are written as JSON
+(with commit and machine info) so runs can be compared across commits.
+
+    python benchmarks/suite.py                       # full run, writes benchmarks/results/<time>-<commit>.json
+    python benchmarks/suite.py --quick --only recommender,rainfall
+    python benchmarks/suite.py --compare benchmarks/results/baseline.json   # exit 1 on regressions
+    python benchmarks/suite.py --diff old.json new.json
+    python benchmarks/suite.py --only load --url http://127.0.0.1:8000       # load a running server
+
+Metric names ending in _per_sec are better when higher, _ms/_seconds when
+lower; --threshold sets the relative change reported as a regression.
+The disease benchmarks need TensorFlow and are skipped without it.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+sys.path.insert(0, HERE)
+
+import synthetic  # noqa: E402
+
+SECTIONS = ["recommender", "disease", "rainfall", "fertilizer", "market", "similar", "load"]
+RESULTS_DIR = os.path.join(HERE, "results")
+
+
+def summarize(latencies, prefix):
+    lat = np.asarray(latencies) * 1000
+    total = lat.sum() / 1000
+    return {
+        prefix + "p50_ms": round(float(np.percentile(lat, 50)), 4),
+        prefix + "p95_ms": round(float(np.percentile(lat, 95)), 4),
+        prefix + "p99_ms": round(float(np.percentile(lat, 99)), 4),
+        prefix + "ops_per_sec": round(len(lat) / total, 1) if total else None,
+    }
+
+
+def timed_calls(fn, args_list, warmup=3):
+    for a in args_list[:warmup]:
+        fn(a)
+    out = []
+    for a in args_list:
+        t = time.perf_counter()
+        fn(a)
+        out.append(time.perf_counter() - t)
+    return out
+
+
+def setup(workdir, with_disease, trees):
+    """Generates data/models and points the backend at them (must run before importing it)."""
+    env = {
+        "MODEL_DIR": os.path.join(workdir, "models"),
+        "RAINFALL_CSV": os.path.join(workdir, "rainfall.csv"),
+        "RAINFALL_INDEX": os.path.join(workdir, "rainfall_index.npz"),
+        "DATABASE_URL": "sqlite:///" + os.path.join(workdir, "bench.db"),
+        "JOB_FOLDER": os.path.join(workdir, "jobs"),
+        "SIMILAR_INDEX_PATH": os.path.join(workdir, "similar_index.joblib"),
+        "SAVE_UPLOADS": "0",
+        "MODEL_WARMUP": "0",
+        "PROFILE_SLOW_REQUESTS_MS": "0",
+    }
+    os.environ.update(env)
+    info = {"trees": trees}
+    start = time.perf_counter()
+    synthetic.train_recommender(env["MODEL_DIR"], trees=trees)
+    info["recommender_train_seconds"] = round(time.perf_counter() - start, 3)
+    synthetic.imd_rainfall_csv(env["RAINFALL_CSV"])
+    synthetic.market_prices_csv(os.path.join(workdir, "market.csv"))
+    if with_disease:
+        start = time.perf_counter()
+        synthetic.train_disease_model(env["MODEL_DIR"])
+        info["disease_train_seconds"] = round(time.perf_counter() - start, 3)
+    return info
+
+
+def bench_recommender(quick):
+    from ml import recommender
+    n = 200 if quick else 2000
+    records = synthetic.npk_samples(n, seed=10).to_dict("records")
+    start = time.perf_counter()
+    recommender.get_model()
+    out = {"recommender.model_load_seconds": round(time.perf_counter() - start, 4)}
+    out.update(summarize(timed_calls(recommender.predict_recommendation, records), "recommender.single."))
+    batch = synthetic.npk_samples(10000, seed=11).to_dict("records")
+    start = time.perf_counter()
+    recommender.predict_recommendation_batch(batch, top_k=3)
+    out["recommender.batch.rows_per_sec"] = round(len(batch) / (time.perf_counter() - start), 1)
+    return out
+
+
+def bench_disease(quick):
+    from ml import disease_detector
+    n = 30 if quick else 200
+    images = [synthetic.leaf_image(i) for i in range(n)]
+    start = time.perf_counter()
+    disease_detector.get_disease_model()
+    out = {"disease.model_load_seconds": round(time.perf_counter() - start, 4)}
+    out.update(summarize(timed_calls(disease_detector.preprocess_image, images), "disease.preprocess."))
+    out.update(summarize(timed_calls(disease_detector.predict_disease, images, warmup=0), "disease.uncached."))
+    out.update(summarize(timed_calls(disease_detector.predict_disease, images, warmup=0), "disease.cached."))
+    return out
+
+
+def bench_rainfall(quick):
+    from ml import rainfall
+    csv_path = os.environ["RAINFALL_CSV"]
+    start = time.perf_counter()
+    rainfall.build_index(csv_path)
+    out = {"rainfall.index_build_seconds": round(time.perf_counter() - start, 4)}
+    rainfall.load_index(csv_path)  # writes the npz cache
+    start = time.perf_counter()
+    rainfall.load_index(csv_path)
+    out["rainfall.index_load_seconds"] = round(time.perf_counter() - start, 4)
+    regions = ["Region %02d" % (i % 36) for i in range(500 if quick else 5000)]
+    months = [None, 1, 7, None, "JJAS"]
+    calls = [(r, months[i % len(months)]) for i, r in enumerate(regions)]
+
+    def call(a):
+        region, period = a
+        if isinstance(period, str):
+            rainfall.predict_rainfall(region, season=period)
+        else:
+            rainfall.predict_rainfall(region, month=period)
+
+    out.update(summarize(timed_calls(call, calls), "rainfall.lookup."))
+    return out
+
+
+def bench_fertilizer(quick):
+    import bench_fertilizer
+    res = bench_fertilizer.run(20000 if quick else 200000)
+    return {"fertilizer." + k: v for k, v in res.items() if k.endswith("_per_sec")}
+
+
+def bench_market(quick, app):
+    import ingest_market_csv
+    from contextlib import redirect_stdout
+    path = os.path.join(os.path.dirname(os.environ["RAINFALL_CSV"]), "market.csv")
+    out = {}
+    with app.app_context(), open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        for label in ("insert", "upsert"):
+            start = time.perf_counter()
+            rows = ingest_market_csv.ingest_file(path)
+            out["market.ingest_%s.rows_per_sec" % label] = round(rows / (time.perf_counter() - start), 1)
+    client = app.test_client()
+    urls = ["/api/market_trends?limit=8&windows=7,30,90&n=%d" % i for i in range(50 if quick else 300)]
+    # distinct query strings defeat the response cache: this measures the queries
+    out.update(summarize(timed_calls(lambda u: client.get(u), urls), "market.trends_uncached."))
+    out.update(summarize(timed_calls(lambda u: client.get(u), [urls[0]] * len(urls)), "market.trends_cached."))
+    return out
+
+
+def bench_similar(quick, app):
+    from db import db, SoilRecord
+    from similar import SimilarPlots, FIELDS
+    n = 20000 if quick else 200000
+    rows = synthetic.npk_samples(n, seed=30)
+    rows["crop"] = np.array(["rice", "maize", "cotton", "banana", "mango"])[np.arange(n) % 5]
+    out = {}
+    with app.app_context():
+        db.session.execute(SoilRecord.__table__.insert(), [
+            dict({col: r[key] for key, col in FIELDS.items()}, crop_predicted=r["crop"])
+            for r in rows.to_dict("records")])
+        db.session.commit()
+        index = SimilarPlots()
+        index.init_app(app)
+        start = time.perf_counter()
+        index.sync(force=True)
+        out["similar.build.rows_per_sec"] = round(n / (time.perf_counter() - start), 1)
+        index.save()
+        restored = SimilarPlots()
+        restored.init_app(app)
+        start = time.perf_counter()
+        restored.sync(force=True)
+        out["similar.load_seconds"] = round(time.perf_counter() - start, 4)
+    queries = synthetic.npk_samples(500 if quick else 5000, seed=31)
+    queries = [[r[key] for key in FIELDS] for r in queries.to_dict("records")]
+    out.update(summarize(timed_calls(lambda q: restored.index.query(q, k=10), queries), "similar.query."))
+    return out
+
+
+class LoadDriver:
+    """
+    Concurrent closed-loop clients (each sends its next request as soon as
+    the previous one completes) against the in-process app or a live URL.
+    """
+
+    def __init__(self, app=None, url=None, with_disease=False, seed=0):
+        self.app = app
+        self.url = url.rstrip("/") if url else None
+        self.rng = random.Random(seed)
+        samples = synthetic.npk_samples(200, seed=20).to_dict("records")
+        self.routes = [
+            ("recommend", 4, lambda c, r: self._post(c, "/api/recommend", json=r.choice(samples))),
+            ("recommend_batch", 1, lambda c, r: self._post(c, "/api/recommend", json={"samples": samples[:100]})),
+            ("rainfall", 3, lambda c, r: self._post(c, "/api/rainfall",
+                                                    json={"region": "Region %02d" % r.randrange(36)})),
+            ("market_trends", 2, lambda c, r: self._get(c, "/api/market_trends?windows=7,30")),
+            ("login_page", 2, lambda c, r: self._get(c, "/login")),
+        ]
+        if with_disease:
+            images = [synthetic.leaf_image(5000 + i) for i in range(50)]
+            self.routes.append(("detect_disease", 1, lambda c, r: self._post(
+                c, "/api/detect_disease", files={"image": ("leaf.jpg", r.choice(images))})))
+
+    def _client(self):
+        if self.url:
+            import requests
+            return requests.Session()
+        return self.app.test_client()
+
+    def _post(self, client, path, json=None, files=None):
+        if self.url:
+            return client.post(self.url + path, json=json, files=files, timeout=30).status_code
+        if files:
+            import io
+            name, data = files["image"]
+            return client.post(path, data={"image": (io.BytesIO(data), name)},
+                               content_type="multipart/form-data").status_code
+        return client.post(path, json=json).status_code
+
+    def _get(self, client, path):
+        if self.url:
+            return client.get(self.url + path, timeout=30).status_code
+        return client.get(path).status_code
+
+    def run(self, threads, seconds):
+        names = [r[0] for r in self.routes]
+        weights = [r[1] for r in self.routes]
+        fns = {r[0]: r[2] for r in self.routes}
+        results = {n: {"lat": [], "errors": 0} for n in names}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + seconds
+
+        def worker(seed):
+            rng = random.Random(seed)
+            client = self._client()
+            local = {n: {"lat": [], "errors": 0} for n in names}
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                t = time.perf_counter()
+                try:
+                    status = fns[name](client, rng)
+                except Exception:
+                    status = 599
+                local[name]["lat"].append(time.perf_counter() - t)
+                if status >= 400:
+                    local[name]["errors"] += 1
+            with lock:
+                for n in names:
+                    results[n]["lat"] += local[n]["lat"]
+                    results[n]["errors"] += local[n]["errors"]
+
+        pool = [threading.Thread(target=worker, args=(self.rng.random(),)) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in pool:
+            t.start()
+        for t in pool:
+            t.join()
+        elapsed = time.perf_counter() - start
+        out = {"load.threads": threads, "load.total.requests_per_sec":
+               round(sum(len(r["lat"]) for r in results.values()) / elapsed, 1)}
+        for n, r in results.items():
+            if r["lat"]:
+                s = summarize(r["lat"], "load.%s." % n)
+                s.pop("load.%s.ops_per_sec" % n)
+                out.update(s)
+                out["load.%s.requests" % n] = len(r["lat"])
+                out["load.%s.errors" % n] = r["errors"]
+        return out
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "subject": git("log", "-1", "--format=%s"),
+            "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def direction(metric):
+    if metric.endswith("_per_sec"):
+        return 1
+    if metric.endswith("_ms") or metric.endswith("_seconds"):
+        return -1
+    return 0
+
+
+def compare(old, new, threshold):
+    """Prints metric changes; returns the names that got worse by more than threshold."""
+    regressions = []
+    print("%-46s %14s %14s %9s" % ("metric", "baseline", "current", "change"))
+    for name in sorted(set(old) & set(new)):
+        a, b, sign = old[name], new[name], direction(name)
+        if not sign or not isinstance(a, (int, float)) or not isinstance(b, (int, float)) or not a:
+            continue
+        change = (b - a) / abs(a)
+        worse = change * sign < -threshold
+        if worse:
+            regressions.append(name)
+        print("%-46s %14.4g %14.4g %+8.1f%%%s" % (name, a, b, change * 100, "  REGRESSION" if worse else ""))
+    return regressions
+
+
+def load_metrics(path):
+    with open(path) as f:
+        return json.load(f)["metrics"]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--only", help="comma-separated sections: " + ",".join(SECTIONS))
+    ap.add_argument("--quick", action="store_true", help="fewer iterations (smoke run)")
+    ap.add_argument("--trees", type=int, default=50)
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--load-seconds", type=float, default=10)
+    ap.add_argument("--url", help="drive a running server instead of the in-process app (load section)")
+    ap.add_argument("--out", help="results file (default benchmarks/results/<time>-<commit>.json)")
+    ap.add_argument("--compare", metavar="BASELINE", help="compare with a previous results file")
+    ap.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    ap.add_argument("--threshold", type=float, default=0.15)
+    args = ap.parse_args()
+
+    if args.diff:
+        sys.exit(1 if compare(load_metrics(args.diff[0]), load_metrics(args.diff[1]), args.threshold) else 0)
+
+    sections = args.only.split(",") if args.only else SECTIONS
+    try:
+        import tensorflow  # noqa: F401
+        with_disease = True
+    except ImportError:
+        with_disease = False
+
+    workdir = tempfile.mkdtemp(prefix="agrinext-bench-")
+    metrics = {}
+    setup_info = setup(workdir, with_disease and ("disease" in sections or "load" in sections), args.trees)
+    from app import app  # after setup: the backend reads its paths from the environment
+    with app.app_context():
+        from db import init_db
+        init_db()
+
+    skipped = []
+    for section in sections:
+        print("running %s..." % section, file=sys.stderr)
+        if section == "disease" and not with_disease:
+            skipped.append("disease (tensorflow not installed)")
+            continue
+        if section == "recommender":
+            metrics.update(bench_recommender(args.quick))
+        elif section == "disease":
+            metrics.update(bench_disease(args.quick))
+        elif section == "rainfall":
+            metrics.update(bench_rainfall(args.quick))
+        elif section == "fertilizer":
+            metrics.update(bench_fertilizer(args.quick))
+        elif section == "market":
+            metrics.update(bench_market(args.quick, app))
+        elif section == "similar":
+            metrics.update(bench_similar(args.quick, app))
+        elif section == "load":
+            if "market" not in sections:
+                with app.app_context():
+                    import ingest_market_csv
+                    ingest_market_csv.ingest_file(os.path.join(workdir, "market.csv"))
+            driver = LoadDriver(app=app, url=args.url, with_disease=with_disease)
+            metrics.update(driver.run(args.threads, 2 if args.quick else args.load_seconds))
+        else:
+            ap.error("unknown section %r" % section)
+
+    result = {
+        "meta": {
+            "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "git": git_info(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "setup": setup_info,
+            "skipped": skipped,
+        },
+        "metrics": metrics,
+    }
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(RESULTS_DIR, "%s-%s.json" % (stamp, (result["meta"]["git"]["commit"] or "nogit")[:10]))
+    with open(out, "w") as f:
+        json.dump(result, f, indent=2)
+    print(json.dumps(metrics, indent=2))
+    print("results written to", out, file=sys.stderr)
+    if skipped:
+        print("skipped:", ", ".join(skipped), file=sys.stderr)
+    if args.compare:
+        regressions = compare(load_metrics(args.compare), metrics, args.threshold)
+        if regressions:
+            print("%d regression(s) above %.0f%%" % (len(regressions), args.threshold * 100), file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
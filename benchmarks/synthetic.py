@@ -0,0 +1,129 @@
+"""
+Synthetic stand-ins for every dataset and model the backend needs, so the
+benchmark suite runs offline and is repeatable (all generators are seeded).
+"""
+import datetime
+import io
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+CROPS = ["rice", "wheat", "maize", "cotton", "sugarcane", "soybean", "millet", "groundnut"]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+DISEASE_CLASSES = ["Tomato___healthy", "Tomato___Early_blight", "Potato___Late_blight", "Corn___Common_rust"]
+
+
+def npk_samples(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "N": rng.uniform(0, 140, n),
+        "P": rng.uniform(5, 145, n),
+        "K": rng.uniform(5, 205, n),
+        "pH": rng.uniform(3.5, 9.9, n),
+        "temp": rng.uniform(8, 43, n),
+        "humidity": rng.uniform(14, 99, n),
+        "rainfall": rng.uniform(20, 300, n),
+    })
+
+
+def npk_dataset(n=3000, seed=1):
+    """Samples with a best_crop label that depends on the features (so the model has something to learn)."""
+    df = npk_samples(n, seed)
+    idx = (df["N"] // 30 + df["rainfall"] // 80 + (df["pH"] > 7)).astype(int) % len(CROPS)
+    df["best_crop"] = np.array(CROPS)[idx]
+    return df
+
+
+def train_recommender(model_dir, trees=50, rows=3000):
+    """Fits the production pipeline on synthetic data and saves it where the registry looks."""
+    from joblib import dump
+    from ml import recommender
+    df = npk_dataset(rows)
+    clf = recommender.build_pipeline(n_estimators=trees)
+    clf.fit(df[recommender.FEATURES], df["best_crop"])
+    os.makedirs(model_dir, exist_ok=True)
+    path = os.path.join(model_dir, "crop_recommender.pkl")
+    dump(clf, path)
+    return path
+
+
+def imd_rainfall_csv(path, regions=36, years=(1901, 2017), seed=2):
+    """IMD sub-division format: SUBDIVISION, YEAR, JAN..DEC, ANNUAL and the seasonal sums."""
+    rng = np.random.default_rng(seed)
+    # monsoon-shaped climatology per region, with year-to-year noise
+    shape = np.array([15, 20, 25, 40, 80, 180, 300, 280, 190, 90, 40, 20], dtype=float)
+    rows = []
+    for r in range(regions):
+        scale = rng.uniform(0.3, 2.0)
+        for year in range(years[0], years[1] + 1):
+            monthly = np.maximum(0, shape * scale * rng.lognormal(0, 0.35, 12))
+            row = {"SUBDIVISION": "Region %02d" % r, "YEAR": year}
+            row.update({m: round(v, 1) for m, v in zip(MONTHS, monthly)})
+            row["ANNUAL"] = round(monthly.sum(), 1)
+            row["JF"] = round(monthly[0:2].sum(), 1)
+            row["MAM"] = round(monthly[2:5].sum(), 1)
+            row["JJAS"] = round(monthly[5:9].sum(), 1)
+            row["OND"] = round(monthly[9:12].sum(), 1)
+            rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
+
+
+def market_prices_csv(path, crops=CROPS, days=365, sources=("mandi_a", "mandi_b"), seed=3):
+    """Daily prices per crop and source as a random walk, in the ingester's CSV format."""
+    rng = np.random.default_rng(seed)
+    end = datetime.date(2024, 12, 31)
+    dates = [end - datetime.timedelta(days=d) for d in range(days - 1, -1, -1)]
+    frames = []
+    for crop in crops:
+        base = rng.uniform(1000, 6000)
+        for source in sources:
+            walk = base * np.exp(np.cumsum(rng.normal(0, 0.02, days)))
+            frames.append(pd.DataFrame({"crop": crop, "price": walk.round(2), "date": dates, "source": source}))
+    pd.concat(frames).to_csv(path, index=False)
+    return path
+
+
+def leaf_image(seed, size=256):
+    """JPEG bytes of a green leaf-like blob with brown lesions (varies with seed)."""
+    from PIL import Image, ImageDraw
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", (size, size), tuple(int(c) for c in rng.integers(180, 240, 3)))
+    draw = ImageDraw.Draw(img)
+    green = (int(rng.integers(30, 80)), int(rng.integers(110, 180)), int(rng.integers(30, 80)))
+    m = size // 8
+    draw.ellipse([m, m // 2, size - m, size - m // 2], fill=green)
+    for _ in range(int(rng.integers(0, 12))):
+        x, y, r = rng.integers(2 * m, size - 2 * m), rng.integers(2 * m, size - 2 * m), rng.integers(3, m // 2 + 4)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=(int(rng.integers(90, 140)), int(rng.integers(50, 90)), 20))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def train_disease_model(model_dir, images_per_class=16, epochs=1):
+    """
+    Small CNN with the production input shape, fit briefly on generated
+    leaves; saved as disease_cnn.h5 plus class_indices.json. Needs TensorFlow.
+    """
+    import tensorflow as tf
+    from ml.disease_detector import preprocess_image
+    classes = {c: i for i, c in enumerate(DISEASE_CLASSES)}
+    x = np.stack([preprocess_image(leaf_image(1000 + i)) for i in range(images_per_class * len(classes))])
+    y = tf.keras.utils.to_categorical(np.arange(len(x)) % len(classes), len(classes))
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(224, 224, 3)),
+        tf.keras.layers.Conv2D(8, 3, strides=2, activation="relu"),
+        tf.keras.layers.MaxPooling2D(2),
+        tf.keras.layers.Conv2D(16, 3, activation="relu"),
+        tf.keras.layers.GlobalAveragePooling2D(),
+        tf.keras.layers.Dense(len(classes), activation="softmax"),
+    ])
+    model.compile(optimizer="adam", loss="categorical_crossentropy")
+    model.fit(x, y, epochs=epochs, batch_size=16, verbose=0)
+    os.makedirs(model_dir, exist_ok=True)
+    model.save(os.path.join(model_dir, "disease_cnn.h5"))
+    with open(os.path.join(model_dir, "class_indices.json"), "w") as f:
+        json.dump(classes, f)
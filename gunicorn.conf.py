@@ -0,0 +1,45 @@
+"""
+Gunicorn settings for the backend.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+GUNICORN_PRELOAD=1 imports the app, every heavy subsystem and the models once
+in the master, so forked workers share those pages copy-on-write and start
+serving immediately. With it off (default) each worker imports the app
+itself and pandas/scikit-learn/TensorFlow are loaded on first use.
+"""
+import gc
+import multiprocessing
+import os
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", min(4, multiprocessing.cpu_count() * 2 + 1)))
+threads = int(os.environ.get("GUNICORN_THREADS", 4))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 0))
+max_requests_jitter = max_requests // 10
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+if preload_app:
+    # load models in the master too, not just the modules. TensorFlow's thread
+    # pools do not survive fork: keep DISEASE_MODEL_RUNTIME=tflite (or auto with
+    # an exported .tflite) when preloading, or set MODEL_WARMUP=0.
+    os.environ.setdefault("MODEL_WARMUP", "1")
+
+
+def when_ready(server):
+    if preload_app:
+        # objects created while loading the app are never freed: keep the GC
+        # from touching (and so copying) their pages in every worker
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        # connections opened in the master must not be shared with children:
+        # drop them from this worker's pool without closing the master's sockets
+        from app import app
+        from db import db
+        with app.app_context():
+            db.engine.dispose(close=False)
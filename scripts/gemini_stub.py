@@ -0,0 +1,78 @@
+"""
+Local stand-in for the Gemini REST API, for exercising /chat without network
+access or quota.
+
+    python scripts/gemini_stub.py [--port 8765] [--delay 0.5] [--fail-rate 0.1]
+    GEMINI_API_KEY=stub GEMINI_API_URL=http://127.0.0.1:8765/v1beta python backend/app.py
+
+Answers generateContent and streamGenerateContent?alt=sse with a canned reply
+that echoes the question. --delay simulates model latency, --fail-rate returns
+503 for that fraction of requests (to exercise retries).
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(delay, fail_rate, chunks):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply_text(self, body):
+            try:
+                question = body["contents"][0]["parts"][0]["text"]
+            except (KeyError, IndexError, TypeError):
+                question = ""
+            return f"Stub answer to: {question}"
+
+        def _candidate(self, text):
+            return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if random.random() < fail_rate:
+                self.send_response(503)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            text = self._reply_text(body)
+            if ":streamGenerateContent" in self.path:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                size = max(1, len(text) // chunks)
+                for i in range(0, len(text), size):
+                    time.sleep(delay / chunks)
+                    event = ("data: " + json.dumps(self._candidate(text[i:i + size])) + "\r\n\r\n").encode()
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                    self.wfile.flush()
+                self.wfile.write(b"0\r\n\r\n")
+                return
+            time.sleep(delay)
+            out = json.dumps(self._candidate(text)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, fmt, *args):
+            pass
+
+    return Handler
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.5)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--chunks", type=int, default=5)
+    args = ap.parse_args()
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_rate, args.chunks))
+    print(f"Gemini stub on http://127.0.0.1:{args.port}/v1beta")
+    server.serve_forever()
@@ -1,18 +1,173 @@
+"""
+Bulk, idempotent mandi price ingestion.
+
+    python scripts/ingest_market_csv.py [files...] [--chunksize 50000]
+    python scripts/ingest_market_csv.py --watch data/market_incoming [--interval 60]
+    python scripts/ingest_market_csv.py --dedupe
+
+CSVs need crop, price and date columns (source optional, defaults to the
+file's --source). Rows are upserted on (crop, date, source), so re-running a
+file updates prices instead of duplicating them. Databases filled by the
+old append-only ingester can hold repeated keys, which block the unique
+index the upsert relies on: --dedupe deletes them (keeping the newest row)
+and creates the index.
+"""
+import argparse
+import glob
+import json
 import os
+import sys
+import time
+
 import pandas as pd
-from backend.db import db, MarketPrice
-from backend.app import app
+from flask import Flask
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+from config import Config  # noqa: E402
+from db import db, MarketPrice, configure_engine, dedupe_market_prices, init_db  # noqa: E402
+from market import refresh_latest_prices, refresh_market_scores, upsert_statement  # noqa: E402
+from response_cache import response_cache  # noqa: E402
 
 CSV = os.path.join(os.path.dirname(__file__), "..", "data", "market_prices.csv")
+CHUNK_SIZE = 50000
+# processed files in a watched directory, keyed by name -> [mtime_ns, size]
+STATE_FILE = ".ingested.json"
+
+
+def make_app():
+    # only the database is needed; avoids loading the ML models with backend.app
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    configure_engine(app)
+    response_cache.init_app(app)
+    return app
+
+
+def coerce_chunk(df, default_source="csv"):
+    """Vectorized cleaning; returns (clean frame, number of dropped rows)."""
+    out = pd.DataFrame({
+        "crop": df["crop"].astype("string").str.strip(),
+        "price": pd.to_numeric(df["price"], errors="coerce"),
+        "date": pd.to_datetime(df["date"], errors="coerce"),
+        "source": df["source"].astype("string").str.strip() if "source" in df.columns else default_source,
+    })
+    out["source"] = out["source"].fillna(default_source)
+    valid = out["crop"].notna() & (out["crop"] != "") & out["price"].notna() & out["date"].notna()
+    out = out[valid]
+    out["date"] = out["date"].dt.date
+    # last row wins when a chunk repeats a key, like a later upsert would
+    out = out.drop_duplicates(subset=["crop", "date", "source"], keep="last")
+    return out, int((~valid).sum())
+
+
+def ingest_file(path, chunksize=CHUNK_SIZE, source="csv"):
+    stmt = upsert_statement(MarketPrice.__table__, ["crop", "date", "source"], ["price"])
+    rows = dropped = 0
+    crops = set()
+    start = time.perf_counter()
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        clean, bad = coerce_chunk(chunk, source)
+        dropped += bad
+        if len(clean):
+            # one executemany per chunk, committed per chunk to bound transaction size
+            db.session.execute(stmt, clean.to_dict("records"))
+            db.session.commit()
+            crops.update(clean["crop"].unique())
+        rows += len(clean)
+    # keep the latest-price-per-crop summary in step with the rows just written
+    refresh_latest_prices(crops)
+    # and the per-crop market scores used to re-rank recommendations
+    refresh_market_scores(crops)
+    # drop cached /api/market_trends responses (shared filesystem/redis backends)
+    response_cache.invalidate("market")
+    elapsed = time.perf_counter() - start
+    print(f"{os.path.basename(path)}: {rows} rows upserted, {dropped} invalid rows skipped, "
+          f"{elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/sec)")
+    return rows
 
-def ingest():
-    df = pd.read_csv(CSV)
+
+def _load_state(directory):
+    try:
+        with open(os.path.join(directory, STATE_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_state(directory, state):
+    path = os.path.join(directory, STATE_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+
+def ingest_new_files(directory, chunksize=CHUNK_SIZE, source="csv"):
+    """Ingests CSVs in directory that are new or changed since the last run."""
+    state = _load_state(directory)
+    total = 0
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        st = os.stat(path)
+        sig = [st.st_mtime_ns, st.st_size]
+        name = os.path.basename(path)
+        if state.get(name) == sig:
+            continue
+        total += ingest_file(path, chunksize, source)
+        state[name] = sig
+        _save_state(directory, state)
+    return total
+
+
+def watch(directory, interval, chunksize=CHUNK_SIZE, source="csv"):
+    print(f"Watching {directory} every {interval}s")
+    while True:
+        ingest_new_files(directory, chunksize, source)
+        time.sleep(interval)
+
+
+def ingest(paths=None, chunksize=CHUNK_SIZE, source="csv"):
+    app = make_app()
     with app.app_context():
-        for _, row in df.iterrows():
-            m = MarketPrice(crop=row['crop'], price=float(row['price']), date=pd.to_datetime(row['date']).date(), source=row.get('source','csv'))
-            db.session.add(m)
-        db.session.commit()
-        print("Ingested market CSV.")
+        init_db()
+        total, start = 0, time.perf_counter()
+        for path in paths or [CSV]:
+            total += ingest_file(path, chunksize, source)
+        elapsed = time.perf_counter() - start
+        print(f"Ingested market CSV: {total} rows in {elapsed:.2f}s")
+
 
 if __name__ == "__main__":
-    ingest()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="*", help=f"CSV files (default {CSV})")
+    ap.add_argument("--chunksize", type=int, default=CHUNK_SIZE)
+    ap.add_argument("--source", default="csv", help="source for rows without one")
+    ap.add_argument("--watch", metavar="DIR", help="ingest new/changed CSVs in DIR, then keep polling")
+    ap.add_argument("--interval", type=float, default=60.0)
+    ap.add_argument("--dedupe", action="store_true",
+                    help="delete duplicate (crop, date, source) rows, keeping the newest, and exit")
+    ap.add_argument("--rebuild-latest", action="store_true",
+                    help="recompute the latest-price summary and market scores for every crop and exit")
+    args = ap.parse_args()
+    if args.dedupe:
+        app = make_app()
+        with app.app_context():
+            deleted = dedupe_market_prices()
+            db.session.commit()
+            init_db()
+            print(f"Deleted {deleted} duplicate market price rows")
+            print(f"Refreshed latest prices for {refresh_latest_prices()} crops")
+            response_cache.invalidate("market")
+    elif args.rebuild_latest:
+        app = make_app()
+        with app.app_context():
+            init_db()
+            print(f"Refreshed latest prices for {refresh_latest_prices()} crops")
+            print(f"Refreshed market scores for {refresh_market_scores()} crops")
+            response_cache.invalidate("market")
+    elif args.watch:
+        app = make_app()
+        with app.app_context():
+            init_db()
+            watch(args.watch, args.interval, args.chunksize, args.source)
+    else:
+        ingest(args.paths, args.chunksize, args.source)
@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# the app reads its configuration at import time: point everything it writes at a scratch directory
+TMP = tempfile.mkdtemp(prefix="agrinext-tests-")
+os.environ.update({
+    "DATABASE_URL": "sqlite:///" + os.path.join(TMP, "app.db"),
+    "MODEL_DIR": os.path.join(TMP, "models"),
+    "JOB_FOLDER": os.path.join(TMP, "jobs"),
+    "RESPONSE_CACHE_DIR": os.path.join(TMP, "responses"),
+    "SIMILAR_INDEX_PATH": os.path.join(TMP, "similar_index.joblib"),
+    "PROFILE_DIR": os.path.join(TMP, "profiles"),
+    "SAVE_UPLOADS": "0",
+    "GEMINI_API_KEY": "",
+})
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture(scope="session")
+def recommender_model():
+    """A small recommender fitted on random samples, saved where the registry loads it from."""
+    import numpy as np
+    import pandas as pd
+    from joblib import dump
+    from ml import recommender
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(0, 150, (600, len(recommender.FEATURES))), columns=recommender.FEATURES)
+    y = np.array(["rice", "wheat", "maize"])[(X["N"] // 50).astype(int) % 3]
+    os.makedirs(os.environ["MODEL_DIR"], exist_ok=True)
+    dump(recommender.build_pipeline(n_estimators=10).fit(X, y), recommender.DEFAULT_MODEL_FILE)
+    return recommender.get_model()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    """A fresh user; returns its id."""
+    from db import db, User
+    with app.app_context():
+        u = User(username="user-%s" % os.urandom(4).hex(), password_hash="x")
+        db.session.add(u)
+        db.session.commit()
+        return u.id
+
+
+@pytest.fixture
+def login(client, user):
+    with client.session_transaction() as s:
+        s["_user_id"] = str(user)
+    return user
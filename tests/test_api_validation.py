@@ -0,0 +1,20 @@
+import pytest
+
+
+@pytest.mark.parametrize("limit", ["0", "-1"])
+def test_market_trends_limit(client, limit):
+    assert client.get("/api/market_trends?limit=" + limit).status_code == 400
+    assert client.get("/api/market_trends?limit=5").status_code == 200
+
+
+@pytest.mark.parametrize("value", ["nan", "inf", "-Infinity"])
+def test_recommend_rejects_non_finite_inputs(client, value):
+    resp = client.post("/api/recommend", json={"N": 10, "rainfall": value})
+    assert resp.status_code == 400 and "rainfall" in resp.get_json()["details"]
+    resp = client.post("/api/recommend", json=[{"pH": value}])
+    assert resp.status_code == 400
+
+
+@pytest.mark.parametrize("body", [["hi"], {"message": 5}, {"message": ["hi"], "stream": True}, {"message": "  "}])
+def test_chat_rejects_malformed_bodies(client, body):
+    assert client.post("/chat", json=body).status_code == 400
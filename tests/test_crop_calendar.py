@@ -0,0 +1,68 @@
+import datetime
+import re
+
+import pytest
+
+import crop_calendar
+from crop_calendar import InvalidPlan, Plan
+
+SOW = datetime.date(2024, 6, 1)
+
+
+def uids(ics):
+    return re.findall(r"^UID:(.*)\r$", ics, flags=re.M)
+
+
+def test_schedule_dates():
+    tasks = crop_calendar.crop_calendar(SOW, "GenericCrop", 100)
+    assert tasks[0] == {"day": 0, "date": "2024-06-01", "task": "Sowing"}
+    assert tasks[-1] == {"day": 100, "date": "2024-09-09", "task": "Harvest"}
+    assert [t["day"] for t in tasks] == sorted(t["day"] for t in tasks)
+    for t in tasks:
+        assert datetime.date.fromisoformat(t["date"]) - SOW == datetime.timedelta(days=t["day"])
+
+
+@pytest.mark.parametrize("data", [[], {"crop": 5}, {"sowing_date": "June"}, {"duration_days": -5},
+                                  {"duration_days": "long"}, {"sowing_date": "9999-12-01"}])
+def test_invalid_plans(data):
+    with pytest.raises(InvalidPlan):
+        crop_calendar.parse_plan(data)
+
+
+def test_ical_events():
+    plan = Plan("North field", "GenericCrop", SOW, 100)
+    ics = "".join(crop_calendar.ical_chunks([plan], user_id=7))
+    assert ics.startswith("BEGIN:VCALENDAR\r\n") and ics.endswith("END:VCALENDAR\r\n")
+    assert all(len(line.encode()) <= 75 for line in ics.split("\r\n"))
+    events = len(crop_calendar.crop_calendar(SOW, "GenericCrop", 100))
+    assert ics.count("BEGIN:VEVENT") == events and len(set(uids(ics))) == events
+    assert "DTSTART;VALUE=DATE:20240909\r\nDTEND;VALUE=DATE:20240910\r\nSUMMARY:Harvest: GenericCrop (North field)" in ics
+
+
+def test_ical_uids_do_not_collide():
+    unnamed = [Plan(None, "GenericCrop", SOW, 100)] * 2
+    first = uids("".join(crop_calendar.ical_chunks(unnamed, user_id=7)))
+    again = uids("".join(crop_calendar.ical_chunks(unnamed, user_id=7)))
+    # two plots without a name in one export, and the same plans in a second export
+    assert len(set(first)) == len(first) and not set(first) & set(again)
+
+    plot = [Plan("North field", "GenericCrop", SOW, 100)]
+    mine = uids("".join(crop_calendar.ical_chunks(plot, user_id=7)))
+    # re-exporting a plot updates its events; another user's plot of the same name does not
+    assert mine == uids("".join(crop_calendar.ical_chunks(plot, user_id=7)))
+    assert not set(mine) & set(uids("".join(crop_calendar.ical_chunks(plot, user_id=8))))
+    other = [Plan("South field", "GenericCrop", SOW, 100)]
+    assert not set(mine) & set(uids("".join(crop_calendar.ical_chunks(other, user_id=7))))
+
+
+def test_batch_export(client, login):
+    body = {"plots": [{"crop": "GenericCrop", "sowing_date": "2024-06-01", "duration_days": 100, "plot": "A"},
+                      {"crop": "GenericCrop", "sowing_date": "2024-06-01", "duration_days": 100}], "save": False}
+    resp = client.post("/api/calendar/batch?format=ics", json=body)
+    assert resp.status_code == 200 and resp.mimetype == "text/calendar"
+    ics = resp.get_data(as_text=True)
+    assert all(u.startswith("u%d-" % login) for u in uids(ics))
+    resp = client.post("/api/calendar/batch", json=body)
+    calendars = resp.get_json()["calendars"]
+    assert resp.get_json()["saved"] == 0
+    assert [c["harvest_date"] for c in calendars] == ["2024-09-09", "2024-09-09"]
@@ -0,0 +1,36 @@
+import logging
+
+from flask import Flask
+from sqlalchemy import text
+
+from db import db, dedupe_market_prices, init_db
+
+OLD_MARKET_TABLE = "CREATE TABLE market_prices (id INTEGER PRIMARY KEY, crop VARCHAR(200), price FLOAT, date DATE, source VARCHAR(200))"
+
+
+def index_names():
+    return {r[0] for r in db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'index'"))}
+
+
+def test_duplicate_market_prices_are_kept_until_deduped(tmp_path, caplog):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + str(tmp_path / "old.db")
+    db.init_app(app)
+    with app.app_context():
+        # a database written by the old append-only ingester
+        db.session.execute(text(OLD_MARKET_TABLE))
+        db.session.execute(text("INSERT INTO market_prices (crop, price, date, source) VALUES "
+                                "('rice', 10, '2024-01-01', 'csv'), ('rice', 11, '2024-01-01', 'csv')"))
+        db.session.commit()
+
+        with caplog.at_level(logging.ERROR, logger="db"):
+            init_db()
+        assert "dedupe-market-prices" in caplog.text
+        assert db.session.execute(text("SELECT COUNT(*) FROM market_prices")).scalar() == 2
+        assert "uq_market_prices_crop_date_source" not in index_names()
+
+        assert dedupe_market_prices() == 1
+        db.session.commit()
+        init_db()
+        assert db.session.execute(text("SELECT price FROM market_prices")).scalar() == 11
+        assert "uq_market_prices_crop_date_source" in index_names()
@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ml import disease_detector
+
+
+class FakeModel:
+    def predict(self, batch, verbose=0):
+        return np.tile([0.7, 0.2, 0.1], (len(batch), 1))
+
+
+@pytest.fixture
+def saved(app, monkeypatch):
+    """Extensions passed to the upload store."""
+    import app as app_module
+    monkeypatch.setattr(disease_detector, "get_disease_model",
+                        lambda: (FakeModel(), {0: "Tomato___healthy", 1: "Tomato___Early_blight", 2: "x"}))
+    calls = []
+    monkeypatch.setattr(app_module.upload_store, "save_async", lambda data, ext: calls.append(ext) or "leaf" + ext)
+    return calls
+
+
+def png():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), (30, 120, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_undecodable_upload_is_rejected_and_not_stored(client, saved):
+    resp = client.post("/api/detect_disease", data={"image": (io.BytesIO(b"not an image"), "leaf.png")})
+    assert resp.status_code == 400
+    assert saved == []
+
+
+def test_decoded_upload_is_stored(client, saved):
+    resp = client.post("/api/detect_disease", data={"image": (io.BytesIO(png()), "leaf.png")})
+    assert resp.status_code == 200
+    assert resp.get_json()["predictions"][0]["class"] == "Tomato___healthy"
+    assert saved == [".png"]
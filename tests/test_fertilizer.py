@@ -0,0 +1,19 @@
+import numpy as np
+
+from ml import fertilizer
+
+
+def test_single_sample_matches_batch():
+    rules = fertilizer.get_rules()
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.integers(0, 200, 2000), rng.integers(0, 150, 2000),
+                         rng.integers(0, 250, 2000), rng.uniform(4, 9, 2000).round(1)]).astype(float)
+    X[::37, 2] = np.nan
+    crops = rng.choice(["rice", " Wheat", "maize", "no-such-crop", None, ""], len(X)).tolist()
+    advice, _ = rules.advise_matrix(X, crops)
+    assert [rules.advise(*x, c) for x, c in zip(X.tolist(), crops)] == advice
+
+
+def test_unknown_crop_named_in_balanced_advice():
+    assert fertilizer.fertilizer_advice(100, 50, 100, 6.5, "Quinoa") == (
+        "Soil nutrients are balanced for Quinoa: maintain with compost or farmyard manure.",)
@@ -0,0 +1,90 @@
+import datetime
+
+import pytest
+from sqlalchemy import insert
+
+import history
+from db import db, SoilRecord
+
+T0 = datetime.datetime(2024, 3, 1, 8, 0)
+
+
+def add_records(user_id, n, backfill_stats=True):
+    """n records, three per timestamp so pages split ties; returns them as dicts."""
+    rows = [{"user_id": user_id, "n": 10.0 + i, "p": 20.0, "k": 30.0 + 2 * i, "ph": 6.5,
+             "recorded_at": T0 + datetime.timedelta(days=i // 3), "crop_predicted": ("rice", "maize")[i % 2]}
+            for i in range(n)]
+    db.session.execute(insert(SoilRecord), rows)
+    if backfill_stats:
+        history.apply_soil_records(rows)
+    db.session.commit()
+    return rows
+
+
+def test_cursor_round_trip(app, user):
+    with app.app_context():
+        add_records(user, 3)
+        rec = db.session.execute(db.select(SoilRecord).where(SoilRecord.user_id == user)).scalars().first()
+        assert history.decode_cursor(history.encode_cursor(rec)) == (rec.recorded_at, rec.id)
+    for bad in ("", "not-a-cursor", "W10", "WyJ4IiwgMV0"):
+        with pytest.raises(history.InvalidCursor):
+            history.decode_cursor(bad)
+
+
+def test_pages_cover_history_once(app, client, login):
+    with app.app_context():
+        add_records(login, 23)
+        want = [r.id for r in db.session.execute(
+            db.select(SoilRecord).where(SoilRecord.user_id == login)
+            .order_by(SoilRecord.recorded_at.desc(), SoilRecord.id.desc())).scalars()]
+    got, cursor = [], None
+    while True:
+        page = client.get("/api/history?limit=5" + ("&cursor=" + cursor if cursor else "")).get_json()
+        got += [r["id"] for r in page["records"]]
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert got == want
+    assert client.get("/api/history?cursor=garbage").status_code == 400
+
+
+def expected_stats(rows):
+    n = len(rows)
+    return {f: round(sum(r[f] for r in rows) / n, 3) for f in history.FIELDS}
+
+
+def test_stats_backfill_for_records_that_predate_them(app, user):
+    with app.app_context():
+        old = add_records(user, 12, backfill_stats=False)
+        assert history.soil_stats(user)["count"] == 0
+        # the first record written through the aggregates backfills the older ones
+        new = add_records(user, 1)
+        stats = history.soil_stats(user)
+        assert stats["count"] == 13
+        assert stats["mean"] == expected_stats(old + new)
+        assert {c["crop"]: c["count"] for c in stats["crops"]} == {"rice": 7, "maize": 6}
+        assert stats["trend_per_day"]["k"] > 0
+
+        # removing records keeps them in step with a full rebuild
+        gone = db.session.execute(db.select(SoilRecord).where(SoilRecord.user_id == user).limit(4)).scalars().all()
+        history.apply_soil_records(gone, sign=-1)
+        for rec in gone:
+            db.session.delete(rec)
+        db.session.commit()
+        incremental = history.soil_stats(user)
+        history.rebuild_soil_stats([user])
+        rebuilt = history.soil_stats(user)
+        assert incremental["count"] == rebuilt["count"] == 9
+        assert incremental["mean"] == rebuilt["mean"]
+        assert incremental["crops"] == rebuilt["crops"]
+
+
+def test_stats_endpoint_follows_deletes(app, client, login):
+    with app.app_context():
+        add_records(login, 4)
+        rid = db.session.execute(db.select(SoilRecord.id).where(SoilRecord.user_id == login)).scalars().first()
+    first = client.get("/api/history/stats")
+    assert first.get_json()["count"] == 4
+    assert client.get("/api/history/stats", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+    client.post("/delete_history/%d" % rid)
+    assert client.get("/api/history/stats").get_json()["count"] == 3
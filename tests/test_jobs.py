@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import time
+
+import pandas as pd
+
+from jobs import Job, JobRunner
+
+CSV = ("N,P,K,pH,temp,humidity,rainfall,date\n"
+       "90,40,40,6.5,25,80,200,2024-05-01\n"
+       "10,abc,40,6.5,,,,\n"
+       "120,30,60,inf,25,70,100,\n"
+       "60,30,50,7.0,28,-inf,90,\n"
+       "30,60,70,5.5,20,60,150,2024-05-02\n")
+
+
+def wait(client, job_id, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get("/api/jobs/" + job_id).get_json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_soil_import_job(client, login, recommender_model):
+    resp = client.post("/api/soil/import", data={"file": (io.BytesIO(CSV.encode()), "reports.csv")})
+    assert resp.status_code == 202 and resp.get_json()["status"] in ("queued", "running")
+    job = wait(client, resp.get_json()["id"])
+    assert job["status"] == "done", job["error"]
+    assert job["total"] == job["processed"] == 5 and job["progress"] == 1
+    assert job["summary"] == {"imported": 2, "invalid": 3}
+
+    results = pd.read_csv(io.BytesIO(client.get("/api/jobs/%s/results" % job["id"]).data))
+    assert results["status"].tolist() == ["ok", "invalid", "invalid", "invalid", "ok"]
+    assert results.loc[results["status"] == "ok", "crop_predicted"].isin(["rice", "wheat", "maize"]).all()
+    history = client.get("/api/history").get_json()
+    assert sorted(r["N"] for r in history["records"]) == [30, 90]
+
+
+def test_other_users_cannot_see_job(client, login, app, recommender_model):
+    from db import db, User
+    resp = client.post("/api/soil/import", data={"file": (io.BytesIO(CSV.encode()), "reports.csv")})
+    job_id = resp.get_json()["id"]
+    wait(client, job_id)
+    with app.app_context():
+        other = User(username="other-%s" % job_id, password_hash="x")
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    with client.session_transaction() as s:
+        s["_user_id"] = str(other_id)
+    assert client.get("/api/jobs/" + job_id).status_code == 404
+    assert client.get("/api/jobs/%s/results" % job_id).status_code == 404
+
+
+def test_interrupted_jobs_fail_on_start(tmp_path):
+    def write(job):
+        with open(tmp_path / (job.id + ".json"), "w") as f:
+            json.dump(job.to_dict(), f)
+
+    dead, live, finished = Job("soil_import", 1), Job("soil_import", 1), Job("soil_import", 1)
+    dead.status, dead.pid = "running", 2 ** 22 + 1  # above the kernel's pid limit
+    live.status, live.pid = "running", os.getppid()
+    finished.status, finished.pid = "done", dead.pid
+    for job in (dead, live, finished):
+        write(job)
+
+    runner = JobRunner(str(tmp_path))
+    assert runner.get(dead.id).status == "failed" and "Interrupted" in runner.get(dead.id).error
+    assert runner.get(live.id).status == "running"
+    assert runner.get(finished.id).status == "done"
@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+import numpy as np
+import pytest
+
+from market import MarketScores
+from ml import recommender
+
+Row = namedtuple("Row", "crop price_level trend volatility")
+CLASSES = np.array(["rice", "wheat", "maize"])
+
+
+class FixedModel:
+    """predict_proba returns the same row for every sample."""
+    crop_classes_ = CLASSES
+
+    def __init__(self, probs):
+        self.probs = np.asarray(probs)
+
+    def predict_proba(self, frame):
+        return np.tile(self.probs, (len(frame), 1))
+
+
+@pytest.fixture
+def scores():
+    # maize is the most profitable crop, rice the least
+    return MarketScores([Row("rice", 10.0, -1.0, 0.5), Row("wheat", 20.0, 0.0, 0.1), Row("maize", 40.0, 1.0, 0.0)])
+
+
+def test_weight_zero_keeps_probabilities(scores):
+    probs = np.array([[0.5, 0.3, 0.2]])
+    fused, _ = recommender.fuse_market(probs, CLASSES, scores, 0.0)
+    np.testing.assert_allclose(fused, probs)
+    X = np.zeros((2, len(recommender.FEATURES)))
+    res = recommender.score_matrix(X, model=FixedModel(probs[0]), market=scores, market_weight=0.0)
+    assert [r["crop"] for r in res[0]["ranking"]] == ["rice", "wheat", "maize"]
+    assert "market_score" not in res[0]["ranking"][0]
+
+
+def test_weight_one_scales_by_market_score(scores):
+    probs = np.array([[0.4, 0.35, 0.25]])
+    fused, vec = recommender.fuse_market(probs, CLASSES, scores, 1.0)
+    np.testing.assert_allclose(fused, probs * 2 * vec)
+    X = np.zeros((1, len(recommender.FEATURES)))
+    res = recommender.score_matrix(X, model=FixedModel(probs[0]), market=scores, market_weight=1.0)
+    ranking = res[0]["ranking"]
+    assert [r["crop"] for r in ranking] == list(CLASSES[np.argsort(-fused[0])])
+    assert ranking[0]["crop"] == "maize"
+    # the reported probabilities stay the model's own
+    assert {r["crop"]: r["prob"] for r in ranking} == pytest.approx(dict(zip(CLASSES, probs[0])))
+
+
+@pytest.mark.parametrize("weight", ["nan", "inf", "-inf", "heavy"])
+def test_api_rejects_bad_market_weight(client, weight):
+    resp = client.post("/api/recommend?market_weight=" + weight, json={"N": 10})
+    assert resp.status_code == 400
+    resp = client.post("/api/recommend", json={"N": 10, "market_weight": weight})
+    assert resp.status_code == 400
@@ -0,0 +1,64 @@
+from flask import Flask
+
+from response_cache import FileSystemBackend, ResponseCache
+
+
+def make_app(tmp_path, backend="memory"):
+    """A bare app with one cached route, standing in for one worker process."""
+    app = Flask(__name__)
+    app.config.update(RESPONSE_CACHE_BACKEND=backend, RESPONSE_CACHE_DIR=str(tmp_path), RESPONSE_CACHE_TTL=300)
+    cache = ResponseCache(app)
+    calls = []
+
+    @app.route("/page")
+    @cache.cached("page", vary=lambda: cache.generation("user:1"))
+    def page():
+        calls.append(1)
+        return "render %d" % len(calls)
+
+    return app, cache, calls
+
+
+def test_etag_and_304(tmp_path):
+    app, cache, calls = make_app(tmp_path)
+    client = app.test_client()
+    first = client.get("/page")
+    assert first.status_code == 200 and first.headers["ETag"]
+    again = client.get("/page", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert client.get("/page").get_data(as_text=True) == "render 1"
+    assert len(calls) == 1
+
+
+def test_invalidate_reaches_other_workers(tmp_path):
+    for backend in ("memory", "filesystem"):
+        (app1, cache1, _), (app2, _, calls2) = make_app(tmp_path / backend), make_app(tmp_path / backend)
+        c2 = app2.test_client()
+        etag = c2.get("/page").headers["ETag"]
+        cache1.invalidate("page")
+        resp = c2.get("/page", headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and len(calls2) == 2
+        # a namespace read by vary() invalidates too
+        cache1.invalidate("user:1")
+        c2.get("/page")
+        assert len(calls2) == 3
+
+
+def test_filesystem_prunes_invalidated_entries(tmp_path):
+    app, cache, _ = make_app(tmp_path, "filesystem")
+    cache.backend.prune_interval = 0
+    client = app.test_client()
+    client.get("/page")
+    client.get("/page?x=1")
+    entries = lambda: [p for p in tmp_path.iterdir() if p.is_file()]  # noqa: E731
+    assert len(entries()) == 2
+    cache.invalidate("user:1")
+    assert entries() == []
+
+
+def test_filesystem_prunes_expired_entries(tmp_path):
+    backend = FileSystemBackend(str(tmp_path))
+    backend.set("a", "value", ttl=-1)
+    backend.set("b", "value", ttl=60)
+    assert backend.prune() == 1
+    assert backend.get("b") == "value"
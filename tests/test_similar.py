@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from similar import COLUMNS, SoilIndex
+
+
+def exact(index, x, k, exclude_user=None):
+    """Ids of the k nearest live rows by exhaustive search."""
+    n = index.size
+    z = index._standardize(np.asarray(x, dtype=np.float32).reshape(1, -1))[0]
+    d = np.sqrt(((index.Z[:n] - z) ** 2).sum(axis=1))
+    keep = index.alive[:n].copy()
+    if exclude_user is not None:
+        keep &= index.users[:n] != exclude_user
+    rows = np.flatnonzero(keep)
+    return index.ids[rows[np.argsort(d[rows], kind="stable")[:k]]].tolist()
+
+
+@pytest.fixture
+def index():
+    rng = np.random.default_rng(0)
+    index = SoilIndex(min_rebuild_rows=100)
+    X = rng.normal(size=(3000, len(COLUMNS))) * 3
+    X[rng.random(X.shape) < 0.05] = np.nan
+    index.add(np.arange(1, 2001), rng.integers(1, 4, 2000).tolist(), X[:2000], ["rice"] * 2000)
+    index.rebuild()
+    # a tail the tree does not cover yet
+    index.add(np.arange(2001, 3001), rng.integers(1, 4, 1000).tolist(), X[2000:], ["maize"] * 1000)
+    return index
+
+
+@pytest.mark.parametrize("exclude_user", [None, 2])
+def test_exact_neighbours_after_deletes(index, exclude_user):
+    rng = np.random.default_rng(1)
+    for _ in range(3):
+        # delete most of the neighbourhood of the query, in the tree and in the tail
+        x = rng.normal(size=len(COLUMNS))
+        index.remove(exact(index, x, 150)[:120])
+        index.remove(rng.choice(np.arange(1, 3001), 200, replace=False).tolist())
+        for k in (1, 10, 50):
+            got = [rid for rid, _, _ in index.query(x, k=k, exclude_user=exclude_user)]
+            assert got == exact(index, x, k, exclude_user)
+    index.rebuild()
+    got = [rid for rid, _, _ in index.query(x, k=20, exclude_user=exclude_user)]
+    assert got == exact(index, x, 20, exclude_user)
+
+
+def test_missing_feature_counts_as_mean(index):
+    x = np.full(len(COLUMNS), np.nan)
+    x[:3] = [1.0, -2.0, 0.5]
+    at_mean = x.copy()
+    at_mean[3:] = index.mean[3:]
+    assert index.query(x, k=5) == index.query(at_mean, k=5)